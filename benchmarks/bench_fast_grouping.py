@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark for fast-mode metadata grouping on name-collision-heavy trees.
+
+Compares the old pairwise scan of each name group (O(k^2) calls to
+are_duplicates_by_category for k files sharing a name) with the single-pass
+dict grouping in fast_detector.find_metadata_duplicates, and checks that
+both produce the same groups in the same order. No files are created: the
+FileMetadata records are synthetic.
+
+Usage:
+    python benchmarks/bench_fast_grouping.py [--files 200000] [--names 5] [--sizes 1000000]
+"""
+
+import argparse
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from duplicate_finder.fast_detector import (  # noqa: E402
+    DuplicateGroup, FileMetadata, are_duplicates_by_category, categorize_file, find_metadata_duplicates
+)
+from duplicate_finder.file_table import DirectoryTable  # noqa: E402
+
+
+def pairwise_grouping(files):
+    """The previous use_categories=True implementation."""
+    name_groups = defaultdict(list)
+    for file_meta in files:
+        name_groups[file_meta.name_lower].append(file_meta)
+
+    duplicate_groups = []
+    unique_files = []
+    for file_list in name_groups.values():
+        if len(file_list) == 1:
+            unique_files.extend(file_list)
+            continue
+        processed = set()
+        for i, file1 in enumerate(file_list):
+            if i in processed:
+                continue
+            duplicates = [file1]
+            processed.add(i)
+            for j, file2 in enumerate(file_list[i + 1:], i + 1):
+                if j in processed:
+                    continue
+                if are_duplicates_by_category(file1, file2):
+                    duplicates.append(file2)
+                    processed.add(j)
+            if len(duplicates) > 1:
+                duplicate_groups.append(DuplicateGroup(
+                    files=duplicates, match_type='category_match', category=duplicates[0].category
+                ))
+            else:
+                unique_files.append(file1)
+    return duplicate_groups, unique_files
+
+
+def make_files(count: int, names: int, sizes: int, seed: int):
+    """``count`` records spread over ``names`` common filenames and ``sizes`` sizes."""
+    rng = random.Random(seed)
+    common = ["index.html", "IMG_0001.JPG", "README.md", "__init__.py", "thumbs.db", "desktop.ini", "cover.jpg"]
+    directories = DirectoryTable()
+    files = []
+    for i in range(count):
+        name = common[rng.randrange(min(names, len(common)))] if names else f"file{i}.dat"
+        path = Path(f"/data/dir{i // 100}/{name}")
+        files.append(FileMetadata(
+            path=path,
+            size=rng.randrange(sizes) * 1024 + 1,
+            mtime=0.0,
+            name=name,
+            name_lower=name.lower(),
+            category=categorize_file(path),
+            directories=directories
+        ))
+    return files
+
+
+def timed(func, files):
+    start = time.perf_counter()
+    result = func(files)
+    return result, time.perf_counter() - start
+
+
+def summarize(result):
+    groups, unique = result
+    return [[str(f.path) for f in group.files] for group in groups], [str(f.path) for f in unique]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200000, help="Number of files (default: 200000)")
+    parser.add_argument("--names", type=int, default=5, help="Distinct filenames, at most 7 (default: 5)")
+    parser.add_argument("--sizes", type=int, default=1000000,
+                        help="Distinct sizes; many sizes per name is the worst case (default: 1000000)")
+    parser.add_argument("--pairwise-max", type=int, default=20000,
+                        help="Largest file count to run the quadratic scan on (default: 20000)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'files':>9}  {'pairwise':>10}  {'single pass':>11}  speedup")
+    count = 1000
+    while True:
+        count = min(count, args.files)
+        files = make_files(count, args.names, args.sizes, args.seed)
+        grouped, grouped_time = timed(lambda f: find_metadata_duplicates(f, use_categories=True), files)
+        if count <= args.pairwise_max:
+            pairwise, pairwise_time = timed(pairwise_grouping, files)
+            if summarize(pairwise) != summarize(grouped):
+                print("ERROR: groupings differ", file=sys.stderr)
+                sys.exit(1)
+            print(f"{count:>9,}  {pairwise_time:>9.3f}s  {grouped_time:>10.3f}s  {pairwise_time / grouped_time:>6.0f}x")
+        else:
+            print(f"{count:>9,}  {'skipped':>10}  {grouped_time:>10.3f}s")
+        if count == args.files:
+            break
+        count *= 4
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for fast-mode file records.
+
+Builds the same synthetic scan, N files spread over directories of 100,
+once with the previous FileMetadata layout (a dataclass holding a Path, the
+name, the lowercased name and a FileCategory per file) and once with the
+compact fast_detector.FileMetadata, and reports the memory each list of
+records holds according to tracemalloc. Names repeat across directories
+the way camera and build output does. No files are created.
+
+Usage:
+    python benchmarks/bench_fast_records.py [--files 1000000] [--names 1000]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from duplicate_finder.fast_detector import (  # noqa: E402
+    FileCategory, FileMetadata, categorize_file
+)
+from duplicate_finder.file_table import DirectoryTable  # noqa: E402
+
+
+@dataclass
+class DataclassFileMetadata:
+    """The previous FileMetadata."""
+    path: Path
+    size: int
+    mtime: float
+    name: str
+    name_lower: str
+    category: FileCategory = FileCategory.OTHER
+    st_dev: int = 0
+    st_ino: int = 0
+
+
+def scan(count: int, names: int):
+    """Yield (directory, name, size, mtime, inode) as a directory listing would."""
+    for i in range(count):
+        directory = f"/data/archive/{i // 10000:03d}/dir{i // 100:05d}"
+        # Fresh strings, as os.scandir hands out
+        name = "".join(["IMG_", f"{i % names:04d}", ".JPG"])
+        yield directory, name, 4096 + i * 7, 1.6e9 + i, 1000000 + i
+
+
+def build_dataclass(count: int, names: int):
+    records = []
+    current, root_path = None, None
+    for directory, name, size, mtime, inode in scan(count, names):
+        if directory != current:
+            current, root_path = directory, Path(directory)
+        file_path = root_path / name
+        records.append(DataclassFileMetadata(
+            path=file_path, size=size, mtime=mtime, name=name, name_lower=name.lower(),
+            category=categorize_file(file_path), st_dev=2049, st_ino=inode
+        ))
+    return records
+
+
+def build_compact(count: int, names: int):
+    """As the fast-mode scanners do: one directory lookup per listing."""
+    directories = DirectoryTable()
+    records = []
+    current, dir_id = None, None
+    for directory, name, size, mtime, inode in scan(count, names):
+        if directory != current:
+            current, dir_id = directory, directories.intern(Path(directory))
+        stat_result = os.stat_result((0o100644, inode, 2049, 1, 0, 0, size, mtime, mtime, mtime))
+        records.append(FileMetadata._from_scan(directories, dir_id, name, stat_result))
+    return records
+
+
+def measure(build, count: int, names: int):
+    """Bytes held by the built records (and anything they keep alive)."""
+    gc.collect()
+    tracemalloc.start()
+    records = build(count, names)
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Every record must still resolve to its path
+    assert len(records) == count and str(records[-1].path).endswith(records[-1].name)
+    return held
+
+
+def timed(build, count: int, names: int) -> float:
+    """Build time without tracemalloc's overhead."""
+    gc.collect()
+    start = time.perf_counter()
+    build(count, names)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=1000000, help="Number of records (default: 1000000)")
+    parser.add_argument("--names", type=int, default=1000, help="Distinct filenames (default: 1000)")
+    args = parser.parse_args()
+
+    old_bytes = measure(build_dataclass, args.files, args.names)
+    new_bytes = measure(build_compact, args.files, args.names)
+    old_time = timed(build_dataclass, args.files, args.names)
+    new_time = timed(build_compact, args.files, args.names)
+
+    mib = 1024 * 1024
+    print(f"{args.files:,} records, {args.names:,} distinct names")
+    print(f"{'layout':>10}  {'memory':>10}  {'per file':>9}  {'build':>7}")
+    print(f"{'dataclass':>10}  {old_bytes / mib:>7.1f}MiB  {old_bytes / args.files:>8.0f}B  {old_time:>6.2f}s")
+    print(f"{'compact':>10}  {new_bytes / mib:>7.1f}MiB  {new_bytes / args.files:>8.0f}B  {new_time:>6.2f}s")
+    print(f"saved: {(old_bytes - new_bytes) / mib:.1f}MiB ({1 - new_bytes / old_bytes:.0%})")
+
+
+if __name__ == "__main__":
+    main()
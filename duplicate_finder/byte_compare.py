@@ -0,0 +1,222 @@
+"""
+Byte-for-byte comparison of candidate duplicate files.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from .hasher import _log_read_error, new_hash, finish_digest, PartialHashState
+
+_COMPARE_CHUNK_SIZE = 65536
+
+# Groups up to this size are compared directly instead of hashed
+DIRECT_COMPARE_MAX_FILES = 4
+
+
+def _split_lockstep(
+    files: List[Path],
+    chunk_size: int,
+    offset: int = 0,
+    file_hash: Optional[Any] = None
+) -> List[Tuple[List[Path], Optional[Any]]]:
+    """
+    Read files in lock-step from ``offset``, splitting groups as chunks differ.
+
+    When ``file_hash`` is given, each group carries a hash of the bytes its
+    members share; groups that reach end of file together keep it.
+
+    Returns:
+        List of (group, hash object or None) covering all readable files
+    """
+    with ExitStack() as stack:
+        handles = {}
+        for file_path in files:
+            try:
+                handle = stack.enter_context(open(file_path, "rb"))
+                handle.seek(offset)
+                handles[file_path] = handle
+            except Exception as e:
+                _log_read_error(file_path, e)
+
+        finished = []
+        active = [(list(handles), file_hash)] if handles else []
+        while active:
+            next_active = []
+            for group, group_hash in active:
+                by_chunk: Dict[bytes, List[Path]] = {}
+                for file_path in group:
+                    try:
+                        chunk = handles[file_path].read(chunk_size)
+                    except Exception as e:
+                        _log_read_error(file_path, e)
+                        continue
+                    by_chunk.setdefault(chunk, []).append(file_path)
+                for chunk, subgroup in by_chunk.items():
+                    if len(subgroup) < 2:
+                        # Nothing left to compare against
+                        finished.append((subgroup, None))
+                        continue
+                    subgroup_hash = None
+                    if group_hash is not None:
+                        subgroup_hash = group_hash.copy() if len(by_chunk) > 1 else group_hash
+                        subgroup_hash.update(chunk)
+                    if not chunk:
+                        # End of file reached together
+                        finished.append((subgroup, subgroup_hash))
+                    else:
+                        next_active.append((subgroup, subgroup_hash))
+            active = next_active
+
+    return finished
+
+
+def split_identical(files: List[Path], chunk_size: int = _COMPARE_CHUNK_SIZE) -> List[List[Path]]:
+    """
+    Partition files into groups with identical content.
+
+    All files are read in lock-step, one chunk at a time, and a group is
+    split as soon as its members' chunks differ. Reading stops once every
+    group is down to a single file. Unreadable files are left out.
+
+    Args:
+        files: Files believed to be identical (normally of equal size)
+        chunk_size: Bytes compared per step
+
+    Returns:
+        Groups of identical files, including single-file groups
+    """
+    return [group for group, _ in _split_lockstep(files, chunk_size)]
+
+
+def compare_and_hash(
+    files: List[Path],
+    partial_state: Optional[PartialHashState] = None,
+    chunk_size: int = _COMPARE_CHUNK_SIZE
+) -> Tuple[Dict[str, List[Path]], List[Path]]:
+    """
+    Compare a small candidate group directly, stopping at the first mismatch.
+
+    Identical files still get a full digest, computed from the shared bytes
+    while comparing, so results look the same as hashing them. With a
+    ``partial_state`` from Stage 2 (valid for every file in the group, as
+    they share the prefix) comparison starts after the prefix.
+
+    Args:
+        files: Same-size files with matching partial hashes
+        partial_state: Hash state of the shared prefix
+        chunk_size: Bytes compared per step
+
+    Returns:
+        Tuple of (full_hash -> identical files, files matching no other file)
+    """
+    if partial_state is not None:
+        file_hash, offset = partial_state.state.copy(), partial_state.offset
+    else:
+        file_hash, offset = new_hash(), 0
+
+    identical: Dict[str, List[Path]] = {}
+    different: List[Path] = []
+    for group, group_hash in _split_lockstep(files, chunk_size, offset, file_hash):
+        if group_hash is None:
+            different.extend(group)
+        else:
+            identical[finish_digest(group_hash)] = group
+    return identical, different
+
+
+def _compare_keyed_group(
+    group: List[Any],
+    partial_state: Optional[PartialHashState],
+    resolve: Callable[[Any], Path]
+) -> Tuple[Dict[str, List[Any]], List[Any]]:
+    """compare_and_hash on a group of keys, resolving paths only for its duration."""
+    keys = {resolve(key): key for key in group}
+    identical, different = compare_and_hash(list(keys), partial_state)
+    return (
+        {digest: [keys[f] for f in files] for digest, files in identical.items()},
+        [keys[f] for f in different]
+    )
+
+
+def parallel_compare_groups(
+    groups: List[List[Any]],
+    partial_states: Optional[Dict[Any, PartialHashState]] = None,
+    desc: str = "Comparing files",
+    quiet: bool = False,
+    max_workers: Optional[int] = None,
+    resolve: Optional[Callable[[Any], Path]] = None
+) -> Tuple[Dict[str, List[Any]], List[Any]]:
+    """
+    Run compare_and_hash over many small groups on a thread pool.
+
+    With ``resolve``, groups hold opaque keys such as file table IDs; paths
+    are resolved per group while it is compared, and results and partial
+    states are keyed by the original items.
+
+    Returns:
+        Tuple of (full_hash -> identical files, files matching no other file)
+    """
+    identical: Dict[str, List[Path]] = {}
+    different: List[Path] = []
+    if not groups:
+        return identical, different
+
+    partial_states = partial_states or {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            (
+                executor.submit(_compare_keyed_group, group, partial_states.get(group[0]), resolve)
+                if resolve is not None
+                else executor.submit(compare_and_hash, group, partial_states.get(group[0]))
+            ): group
+            for group in groups
+        }
+        with tqdm(total=len(groups), desc=desc, unit=" groups", disable=quiet, leave=False) as pbar:
+            for future in as_completed(futures):
+                group_identical, group_different = future.result()
+                for digest, files in group_identical.items():
+                    identical.setdefault(digest, []).extend(files)
+                different.extend(group_different)
+                pbar.update(1)
+    return identical, different
+
+
+def _split_key(digest, index: int):
+    """Key for the ``index``-th subgroup of a split duplicate group."""
+    if isinstance(digest, bytes):
+        return (digest, index)
+    return f"{digest}#{index}"
+
+
+def verify_duplicate_groups(
+    duplicates: Dict[str, List[Path]],
+    quiet: bool = False
+) -> Tuple[Dict[str, List[Path]], List[Path]]:
+    """
+    Confirm hash-based duplicate groups by comparing file contents.
+
+    Needed for non-cryptographic hashes, where different files can share a
+    digest. A group that turns out to mix contents is split; subgroups after
+    the first get a ``#n`` suffix on the digest key (a (digest, n) tuple
+    key for binary digests).
+
+    Args:
+        duplicates: digest -> files with that digest
+        quiet: Suppress progress output
+
+    Returns:
+        Tuple of (verified duplicates, files that turned out to be unique)
+    """
+    verified = {}
+    unique_files = []
+    for digest, group in tqdm(duplicates.items(), desc="Verifying bytes", unit=" groups", leave=False, disable=quiet):
+        identical_groups = [g for g in split_identical(group) if len(g) > 1]
+        for index, identical in enumerate(identical_groups):
+            verified[digest if index == 0 else _split_key(digest, index)] = identical
+        confirmed = {f for g in identical_groups for f in g}
+        unique_files.extend(f for f in group if f not in confirmed)
+    return verified, unique_files
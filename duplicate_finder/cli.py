@@ -7,13 +7,54 @@ import argparse
 import sys
 import logging
 from pathlib import Path
+from typing import List
 
-from .scanner import scan_directory
+from .scanner import scan_directory_detailed, report_scan_result
 from .detector import find_duplicates
+from .coverage import Coverage
 from .memory_efficient_detector import find_duplicates_memory_efficient
-from .fast_detector import fast_find_duplicates, format_duplicate_report
+from .fast_detector import fast_find_duplicates, format_duplicate_report, MATCH_STRATEGIES, DEFAULT_MATCH_STRATEGIES
+from .sampled_verifier import verify_groups_sampled
+from .media_probe import split_groups_by_media
 from .formatter import format_output, format_json_output
-from .hasher import get_warning_summary
+from .hasher import get_warning_summary, available_hash_algorithms, set_hash_algorithm, get_hash_algorithm, binary_digests, DEFAULT_HASH_ALGORITHM
+from .hash_cache import open_hash_cache
+from .external_grouping import DEFAULT_MAX_MEMORY
+from .scan_filter import ScanFilter, SYMLINK_POLICIES, DEFAULT_SYMLINK_POLICY, SYMLINKS_ALL
+
+_SIZE_SUFFIXES = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(text: str) -> int:
+    """
+    Parse a byte count such as ``4096``, ``512K``, ``256M`` or ``2G``.
+    
+    Suffixes are binary (K = 1024) and case-insensitive; a trailing B
+    (``256MB``) is allowed.
+    """
+    value = text.strip().upper()
+    if value.endswith('B'):
+        value = value[:-1]
+    suffix = value[-1:] if value[-1:] in _SIZE_SUFFIXES else ''
+    number = value[:len(value) - len(suffix)]
+    try:
+        size = float(number) * _SIZE_SUFFIXES[suffix]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {text!r} (use e.g. 4096, 512K, 256M, 2G)")
+    if size < 0:
+        raise argparse.ArgumentTypeError(f"size must not be negative: {text!r}")
+    return int(size)
+
+
+def parse_match_strategies(text: str) -> List[str]:
+    """Parse a comma-separated list of fast-mode key strategies."""
+    strategies = [part.strip() for part in text.split(',') if part.strip()]
+    unknown = [strategy for strategy in strategies if strategy not in MATCH_STRATEGIES]
+    if unknown or not strategies:
+        raise argparse.ArgumentTypeError(
+            f"invalid strategy list: {text!r} (choose from {', '.join(MATCH_STRATEGIES)})"
+        )
+    return strategies
 
 
 def parse_arguments() -> argparse.Namespace:
@@ -55,6 +96,14 @@ def parse_arguments() -> argparse.Namespace:
         default=1000,
         help="Batch size for memory-efficient mode (default: 1000)",
     )
+    parser.add_argument(
+        "--max-memory",
+        type=parse_size,
+        default=DEFAULT_MAX_MEMORY,
+        metavar="SIZE",
+        help="Memory ceiling for size grouping in memory-efficient mode; beyond it paths "
+             "are spilled to sorted runs on disk (e.g. 512M, 2G; default: 256M)",
+    )
     parser.add_argument(
         "--adaptive",
         action="store_true",
@@ -65,11 +114,124 @@ def parse_arguments() -> argparse.Namespace:
         type=int,
         help="Manual override for worker count",
     )
+    parser.add_argument(
+        "--progressive",
+        action="store_true",
+        help="Compare candidates in growing blocks (4K, 64K, 1M, ...) instead of partial + full hash",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Overlap partial and full hashing across size groups and report stage occupancy",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        metavar="N",
+        help="Check size groups largest potential savings first and stop after N confirmed duplicate groups",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        metavar="SECONDS",
+        help="Check size groups largest potential savings first and stop after SECONDS; "
+             "the report shows how many bytes were left unverified",
+    )
+    parser.add_argument(
+        "--hash-algo",
+        choices=available_hash_algorithms(),
+        default=DEFAULT_HASH_ALGORITHM,
+        help=f"Content hash algorithm (default: {DEFAULT_HASH_ALGORITHM}; xxhash/blake3 when installed)",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Confirm duplicate groups byte-for-byte (recommended with non-cryptographic hashes)",
+    )
+    parser.add_argument(
+        "--scan-workers",
+        type=int,
+        help="List directories on N threads during the scan (default: single-threaded)",
+    )
+    parser.add_argument(
+        "--min-size",
+        type=parse_size,
+        metavar="SIZE",
+        help="Skip files smaller than SIZE (e.g. 1M)",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=parse_size,
+        metavar="SIZE",
+        help="Skip files larger than SIZE (e.g. 4G)",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="Skip files matching GLOB, e.g. '*.tmp' (repeatable; globs with '/' match the full path)",
+    )
+    parser.add_argument(
+        "--include",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="Only scan files matching GLOB, e.g. '*.jpg' (repeatable)",
+    )
+    parser.add_argument(
+        "--exclude-dir",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="Do not descend into directories matching GLOB, e.g. node_modules or .git (repeatable)",
+    )
+    parser.add_argument(
+        "--one-file-system",
+        action="store_true",
+        help="Do not descend into directories on other filesystems (mount points under the path)",
+    )
+    parser.add_argument(
+        "--symlinks",
+        choices=SYMLINK_POLICIES,
+        default=DEFAULT_SYMLINK_POLICY,
+        help="Symlink handling: skip them, follow links to files (directory links are not descended), "
+             "follow only links that point inside the path, or follow all (directory links outside the "
+             f"path are descended; not with --fast) (default: {DEFAULT_SYMLINK_POLICY})",
+    )
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        metavar="PATH",
+        help="Hash cache database file (default: per-user cache directory)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the persistent hash cache",
+    )
     parser.add_argument(
         "--fast",
         action="store_true",
         help="Use fast metadata-only mode (no hashing) - optimized for HDDs",
     )
+    parser.add_argument(
+        "--fast-match",
+        type=parse_match_strategies,
+        metavar="STRATEGIES",
+        help="With --fast: comma-separated key strategies, most trusted first: "
+             f"{', '.join(MATCH_STRATEGIES)} (default: {','.join(DEFAULT_MATCH_STRATEGIES)})",
+    )
+    parser.add_argument(
+        "--sample-verify",
+        action="store_true",
+        help="With --fast: confirm each group by hashing head, middle and tail samples (~12KB read per file)",
+    )
+    parser.add_argument(
+        "--probe-media",
+        action="store_true",
+        help="With --fast: also match photos and videos on EXIF/mvhd header fields (~16KB read per media file)",
+    )
     return parser.parse_args()
 
 
@@ -82,10 +244,55 @@ def main():
         print("Error: Cannot use both --verbose and --quiet flags", file=sys.stderr)
         sys.exit(1)
     
+    if args.cache and args.no_cache:
+        print("Error: Cannot use both --cache and --no-cache", file=sys.stderr)
+        sys.exit(1)
+    
     if args.fast and (args.memory_efficient or args.adaptive or args.workers):
         print("Error: --fast mode cannot be combined with --memory-efficient, --adaptive, or --workers", file=sys.stderr)
         sys.exit(1)
     
+    if args.fast and args.symlinks == SYMLINKS_ALL:
+        print("Error: --fast mode does not descend symlinked directories; --symlinks follow-all is not supported", file=sys.stderr)
+        sys.exit(1)
+    
+    if args.pipeline and args.progressive:
+        print("Error: Cannot use both --pipeline and --progressive", file=sys.stderr)
+        sys.exit(1)
+    
+    if args.memory_efficient and (args.pipeline or args.progressive or args.adaptive or args.workers):
+        print("Error: --memory-efficient mode cannot be combined with --pipeline, --progressive, --adaptive, or --workers", file=sys.stderr)
+        sys.exit(1)
+    
+    if (args.sample_verify or args.fast_match or args.probe_media) and not args.fast:
+        print("Error: --sample-verify, --fast-match and --probe-media require --fast", file=sys.stderr)
+        sys.exit(1)
+    
+    if (args.top is not None or args.time_budget is not None) and (args.fast or args.memory_efficient):
+        print("Error: --top and --time-budget cannot be combined with --fast or --memory-efficient", file=sys.stderr)
+        sys.exit(1)
+    
+    if (args.top is not None and args.top < 1) or (args.time_budget is not None and args.time_budget <= 0):
+        print("Error: --top and --time-budget must be positive", file=sys.stderr)
+        sys.exit(1)
+    
+    if args.min_size is not None and args.max_size is not None and args.min_size > args.max_size:
+        print("Error: --min-size cannot be larger than --max-size", file=sys.stderr)
+        sys.exit(1)
+    
+    # Applied during traversal in every mode
+    scan_filter = ScanFilter(
+        min_size=args.min_size,
+        max_size=args.max_size,
+        include=args.include,
+        exclude=args.exclude,
+        exclude_dirs=args.exclude_dir
+    )
+    
+    set_hash_algorithm(args.hash_algo)
+    if not get_hash_algorithm().cryptographic and not args.verify and not args.quiet and not args.fast:
+        print(f"Note: {args.hash_algo} is not collision-resistant; add --verify to confirm matches", file=sys.stderr)
+    
     # Setup logging based on verbosity
     if args.verbose:
         logging.basicConfig(level=logging.DEBUG, format='%(message)s')
@@ -115,9 +322,26 @@ def main():
             duplicate_groups, unique_files = fast_find_duplicates(
                 args.path, 
                 verbose=args.verbose, 
-                quiet=args.quiet
+                quiet=args.quiet,
+                scan_workers=args.scan_workers,
+                scan_filter=scan_filter,
+                one_file_system=args.one_file_system,
+                symlinks=args.symlinks,
+                strategies=args.fast_match or DEFAULT_MATCH_STRATEGIES
             )
             
+            # Different shots of the same name and size differ in their headers
+            if args.probe_media:
+                duplicate_groups, probed_unique = split_groups_by_media(duplicate_groups, quiet=args.quiet)
+                unique_files = unique_files + probed_unique
+            
+            # Same name and size is only a hint; sampling catches most mismatches
+            if args.sample_verify:
+                if args.verbose and not args.quiet:
+                    print(f"Sampling {sum(len(g.files) for g in duplicate_groups):,} files in {len(duplicate_groups):,} groups")
+                duplicate_groups, sampled_unique = verify_groups_sampled(duplicate_groups, quiet=args.quiet)
+                unique_files = unique_files + sampled_unique
+            
             # Output results
             if args.output == "json":
                 # Convert to expected format for JSON output
@@ -193,7 +417,11 @@ def main():
                         "savings_bytes": largest_group_size,
                         "savings": format_size(largest_group_size)
                     } if largest_group_size > 0 else None,
-                    "detection_method": "metadata_only"
+                    "detection_method": (
+                        "metadata_sampled" if args.sample_verify
+                        else "metadata_media" if args.probe_media
+                        else "metadata_only"
+                    )
                 }
                 
                 print(json.dumps(json_output, indent=2))
@@ -208,7 +436,17 @@ def main():
             sys.exit(1)
     
     # Standard modes - scan for files first
-    files = scan_directory(args.path, verbose=args.verbose, quiet=args.quiet)
+    scan_result = scan_directory_detailed(
+        args.path,
+        verbose=args.verbose,
+        quiet=args.quiet,
+        max_workers=args.scan_workers,
+        scan_filter=scan_filter,
+        one_file_system=args.one_file_system,
+        symlinks=args.symlinks
+    )
+    report_scan_result(scan_result, args.quiet)
+    files = scan_result.records
     if not files:
         if not args.quiet:
             print("No files found in the specified directory.")
@@ -217,30 +455,57 @@ def main():
     if not args.quiet:
         print(f"\nFound {len(files)} files.")
     
-    # Find duplicates
-    if args.memory_efficient:
-        if not args.quiet:
-            print(f"Using memory-efficient mode with batch size {args.batch_size}")
-        duplicates, unique_files, duplicate_folders = find_duplicates_memory_efficient(
-            files, 
-            batch_size=args.batch_size,
-            verbose=args.verbose, 
-            quiet=args.quiet
-        )
-    else:
-        duplicates, unique_files, duplicate_folders = find_duplicates(
-            files, 
-            verbose=args.verbose, 
-            quiet=args.quiet,
-            adaptive=args.adaptive,
-            manual_workers=args.workers
-        )
+    # Digests of unchanged files are reused from previous runs
+    hash_cache = None if args.no_cache else open_hash_cache(args.cache)
+    
+    # Filled in by --top / --time-budget runs
+    coverage = Coverage() if args.top is not None or args.time_budget is not None else None
+    
+    # Find duplicates; digests stay raw bytes until the formatter prints them
+    try:
+        with binary_digests():
+            if args.memory_efficient:
+                if not args.quiet:
+                    print(f"Using memory-efficient mode with batch size {args.batch_size}")
+                # Hand the scan lists over; an exhausted iterator drops its
+                # list, so the records are freed once Stage 1 has read them
+                records = iter(files)
+                files = None
+                scan_result.files = []
+                scan_result.records = []
+                duplicates, unique_files, duplicate_folders = find_duplicates_memory_efficient(
+                    records, 
+                    batch_size=args.batch_size,
+                    verbose=args.verbose, 
+                    quiet=args.quiet,
+                    hash_cache=hash_cache,
+                    verify=args.verify,
+                    max_memory=args.max_memory
+                )
+            else:
+                duplicates, unique_files, duplicate_folders = find_duplicates(
+                    files, 
+                    verbose=args.verbose, 
+                    quiet=args.quiet,
+                    adaptive=args.adaptive,
+                    manual_workers=args.workers,
+                    hash_cache=hash_cache,
+                    progressive=args.progressive,
+                    verify=args.verify,
+                    pipelined=args.pipeline,
+                    top=args.top,
+                    time_budget=args.time_budget,
+                    coverage=coverage
+                )
+    finally:
+        if hash_cache is not None:
+            hash_cache.close()
     
     # Output results based on format
     if args.output == "json":
-        format_json_output(duplicates, unique_files, duplicate_folders)
+        format_json_output(duplicates, unique_files, duplicate_folders, linked_files=scan_result.linked, coverage=coverage, linked_sizes=scan_result.linked_sizes)
     else:
-        format_output(duplicates, unique_files, duplicate_folders, quiet=args.quiet)
+        format_output(duplicates, unique_files, duplicate_folders, quiet=args.quiet, linked_files=scan_result.linked, coverage=coverage, linked_sizes=scan_result.linked_sizes)
     
     # Show final warning summary from hashing operations (unless quiet or json)
     if not args.quiet and args.output != "json":
@@ -0,0 +1,59 @@
+"""
+Coverage of budgeted (--top / --time-budget) duplicate detection runs.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence
+
+# Why a budgeted run stopped before checking every size group
+STOP_TOP = 'top'
+STOP_TIME_BUDGET = 'time_budget'
+
+
+@dataclass
+class Coverage:
+    """How much of the candidate set a --top / --time-budget run verified."""
+    stop_reason: Optional[str] = None
+    top: Optional[int] = None
+    time_budget: Optional[float] = None
+    groups_total: int = 0
+    groups_checked: int = 0
+    files_total: int = 0
+    files_checked: int = 0
+    bytes_total: int = 0
+    bytes_checked: int = 0
+    groups_found: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def complete(self) -> bool:
+        """True when every size group was checked."""
+        return self.groups_checked == self.groups_total
+
+    @property
+    def bytes_unverified(self) -> int:
+        """Bytes of candidate files (same size as another file) left unchecked."""
+        return self.bytes_total - self.bytes_checked
+
+    def add_checked(self, size_groups: Dict[int, Sequence[int]]) -> None:
+        """Count ``size_groups`` (size -> file IDs) as checked."""
+        self.groups_checked += len(size_groups)
+        self.files_checked += sum(len(group) for group in size_groups.values())
+        self.bytes_checked += sum(size * len(group) for size, group in size_groups.items())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "complete": self.complete,
+            "stop_reason": self.stop_reason,
+            "top": self.top,
+            "time_budget": self.time_budget,
+            "size_groups_total": self.groups_total,
+            "size_groups_checked": self.groups_checked,
+            "candidate_files_total": self.files_total,
+            "candidate_files_checked": self.files_checked,
+            "candidate_bytes_total": self.bytes_total,
+            "candidate_bytes_checked": self.bytes_checked,
+            "candidate_bytes_unverified": self.bytes_unverified,
+            "duplicate_groups_found": self.groups_found,
+            "elapsed_seconds": round(self.elapsed_seconds, 3)
+        }
@@ -2,19 +2,31 @@
 Duplicate file detection logic with multi-stage optimization.
 """
 
+import time
+from array import array
 from collections import defaultdict
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 from tqdm import tqdm
 
-from .hasher import get_file_size
-from .folder_detector import find_duplicate_folders, get_files_in_duplicate_folders
-from .parallel_hasher import parallel_hash_files, get_optimal_worker_count, parallel_hash_files_adaptive
+from .scanner import FileRecord, to_file_record
+from .folder_detector import FolderGroup, find_duplicate_folders, get_files_in_duplicate_folders, select_files_for_folder_hashing
+from .parallel_hasher import parallel_hash_files, get_optimal_worker_count, parallel_hash_files_adaptive, _lookup_cached, _store_cached
 from .adaptive_optimizer import get_adaptive_config
+from .hash_cache import HashCache
+from .hasher import PARTIAL_HASH_SIZE, PartialHashState, get_hash_algorithm, new_hash
+from .byte_compare import verify_duplicate_groups, parallel_compare_groups, DIRECT_COMPARE_MAX_FILES
+from .progressive_hasher import progressive_hash_groups
+from .file_table import DigestColumn, FileTable, TablePaths
+from .pipeline import pipelined_hash_groups
+from .coverage import Coverage, STOP_TOP, STOP_TIME_BUDGET
 
+# Files per batch and worker when size groups are processed in savings order
+_BUDGET_BATCH_FILES_PER_WORKER = 8
 
-def find_duplicates(files: List[Path], verbose: bool = False, quiet: bool = False, adaptive: bool = False, manual_workers: int = None) -> Tuple[Dict[str, List[Path]], List[Path], List[List[Path]]]:
+
+def find_duplicates(files: List[Union[Path, FileRecord]], verbose: bool = False, quiet: bool = False, adaptive: bool = False, manual_workers: int = None, hash_cache: Optional[HashCache] = None, progressive: bool = False, verify: bool = False, pipelined: bool = False, top: Optional[int] = None, time_budget: Optional[float] = None, coverage: Optional[Coverage] = None) -> Tuple[Dict[str, TablePaths], TablePaths, List[List[Path]]]:
     """
     Find duplicate files and folders using multi-stage comparison.
     
@@ -23,43 +35,388 @@ def find_duplicates(files: List[Path], verbose: bool = False, quiet: bool = Fals
     Stage 3: Full hash only when partial hashes match
     Stage 4: Smart folder duplicate detection
     
+    In progressive mode Stages 2 and 3 are replaced by rounds of
+    geometrically growing blocks (4K, 64K, 1M, ...), regrouping after each
+    round so files that differ early are never read to the end.
+    
+    In pipelined mode Stages 2 and 3 share one worker pool and each size
+    group moves on to full hashing as soon as its own partial hashes are
+    done, so the disk is not idle between stages.
+    
+    Sizes come from the FileRecords produced by the scanner, so each file is
+    stat'ed at most once per run (bare paths are stat'ed once in Stage 1).
+    Files are loaded into a FileTable and every stage passes integer file
+    IDs around; digests for folder detection live in a DigestColumn.
+    
+    With ``top`` or ``time_budget`` size groups are checked in order of
+    potential savings (size * (count - 1)), largest first, and checking
+    stops once ``top`` duplicate groups are confirmed or the budget is spent.
+    Files in unchecked groups are reported as neither duplicate nor unique;
+    ``coverage`` records how much was left unverified. Folder detection
+    runs only if every group was checked.
+    
     Args:
-        files: List of file paths to check
+        files: List of FileRecords or file paths to check
         verbose: Enable verbose output
         quiet: Suppress non-error output
         adaptive: Use adaptive optimization
         manual_workers: Manual override for worker count
+        hash_cache: Persistent digest cache shared across runs
+        progressive: Compare candidates block by block instead of partial + full hash
+        verify: Confirm duplicate groups byte-for-byte (for non-cryptographic hashes)
+        pipelined: Run Stages 2 and 3 as a pipeline instead of one after the other
+        top: Stop after confirming this many duplicate groups; report only the largest
+        time_budget: Stop checking size groups after this many seconds
+        coverage: Filled in with what a top / time-budget run checked
         
     Returns:
         Tuple of (duplicates_dict, unique_files, duplicate_folders)
-        duplicates_dict: hash -> list of duplicate file paths
-        unique_files: list of files with no duplicates
+        duplicates_dict: hash -> duplicate file paths (hashes are bytes
+            inside hasher.binary_digests())
+        unique_files: files with no duplicates
+        Both are TablePaths, which build each path only when it is read.
         duplicate_folders: list of duplicate folder groups
     """
+    start_time = time.monotonic()
+    budgeted = top is not None or time_budget is not None
+    if budgeted and coverage is None:
+        coverage = Coverage()
+    if coverage is not None:
+        coverage.top, coverage.time_budget = top, time_budget
+    
     if not quiet:
         print("\n=== Stage 1: Grouping files by size ===")
     
-    # Stage 1: Group files by size
-    size_to_files = defaultdict(list)
-    for file_path in tqdm(files, desc="Analyzing sizes", unit=" files", leave=False, disable=quiet):
-        size = get_file_size(file_path)
-        if size >= 0:
-            size_to_files[size].append(file_path)
+    # Stage 1: Load files into a compact table and group IDs by size; later
+    # stages pass file IDs around and only build paths for files they open
+    table = FileTable()
+    for item in tqdm(files, desc="Analyzing sizes", unit=" files", leave=False, disable=quiet):
+        record = to_file_record(item)
+        if record is not None:
+            table.add(record)
+    size_groups, unique_ids = table.group_by_size()
     
     # Count files that need further checking
-    files_needing_hash = sum(len(group) for group in size_to_files.values() if len(group) > 1)
-    unique_by_size = sum(1 for group in size_to_files.values() if len(group) == 1)
+    files_needing_hash = sum(len(group) for group in size_groups.values())
     
     if not quiet:
-        print(f"  Found {len(size_to_files)} unique file sizes")
-        print(f"  {unique_by_size} files are unique by size alone")
+        print(f"  Found {len(size_groups) + len(unique_ids)} unique file sizes")
+        print(f"  {len(unique_ids)} files are unique by size alone")
         print(f"  {files_needing_hash} files need content comparison")
+        if verbose:
+            print(f"  File table: {table.nbytes / 1024:.0f} KB for {len(table)} files in {len(table.dirs)} directories")
     
     # Early exit if no potential duplicates
     if files_needing_hash == 0:
-        unique_files = [f for group in size_to_files.values() for f in group]
-        return {}, unique_files, []
+        _report_cache_stats(hash_cache, verbose, quiet)
+        return {}, TablePaths(table), []
+    
+    sample_dir = table.path(0).parent
+    
+    def hash_stages(groups: Dict[int, array], stage_quiet: bool) -> Tuple[Dict[str, List[int]], List[int]]:
+        """Stages 2 and 3 in the selected mode."""
+        if progressive:
+            return _progressive_stages(
+                table, groups, verbose, stage_quiet, manual_workers, hash_cache
+            )
+        if pipelined:
+            return _pipelined_stages(
+                table, groups, sample_dir, stage_quiet, adaptive, manual_workers, hash_cache
+            )
+        return _two_stage_hashing(
+            table, groups, sample_dir, verbose, stage_quiet, adaptive, manual_workers, hash_cache
+        )
+    
+    if budgeted:
+        # Unchecked groups are removed from size_groups
+        full_hash_to_ids, candidates_for_full_hash = _budgeted_stages(
+            size_groups, hash_stages, quiet, manual_workers, top, time_budget, start_time, coverage
+        )
+    else:
+        full_hash_to_ids, candidates_for_full_hash = hash_stages(size_groups, quiet)
+    
+    # Compile final results
+    duplicates = {}
+    
+    # Add files that were unique after partial/full hashing
+    processed_ids = set(candidates_for_full_hash)
+    for file_group in size_groups.values():
+        unique_ids.extend(file_id for file_id in file_group if file_id not in processed_ids)
+    
+    # Add duplicates and remaining unique files from full hash
+    for full_hash, id_list in full_hash_to_ids.items():
+        if len(id_list) > 1:
+            duplicates[full_hash] = id_list
+        else:
+            unique_ids.extend(id_list)
+    
+    if verify and duplicates:
+        duplicates, full_hash_to_ids = _verify_duplicates(
+            table, duplicates, unique_ids, full_hash_to_ids, quiet
+        )
+    
+    if not quiet:
+        print(f"  Optimization complete!")
+    
+    if budgeted and not coverage.complete:
+        # A folder can only match once all of its files are checked
+        if not quiet:
+            print("\n=== Stage 4: Skipped (not every size group was checked) ===")
+        duplicates = _finish_budgeted(table, duplicates, top, start_time, coverage)
+        _report_cache_stats(hash_cache, verbose, quiet)
+        return _table_results(table, duplicates), TablePaths(table, unique_ids), []
     
+    if not quiet:
+        print("\n=== Stage 4: Smart folder duplicate detection ===")
+    
+    # Fixed-width digest column for folder detection, indexed by file ID
+    digests = DigestColumn(len(table), len(new_hash().hexdigest()) // 2)
+    for hash_val, id_list in full_hash_to_ids.items():
+        for file_id in id_list:
+            digests[file_id] = hash_val
+    
+    # Only files in folders whose structure collides with another folder
+    # need a full hash; folders holding a known-unique file are ruled out
+    ids_needing_folder_hash = select_files_for_folder_hashing(table, digests, known_unique=unique_ids)
+    if verbose and not quiet:
+        print(f"  {len(ids_needing_folder_hash)} files need hashing for folder comparison")
+    
+    # Parallel hash remaining files for folder detection
+    if ids_needing_folder_hash:
+        if adaptive:
+            remaining_hashes = parallel_hash_files_adaptive(
+                ids_needing_folder_hash,
+                partial=False,
+                desc="Hashing for folder detection",
+                quiet=quiet,
+                path=sample_dir,
+                hash_cache=hash_cache,
+                resolve=table.record
+            )
+        else:
+            remaining_hashes = parallel_hash_files(
+                ids_needing_folder_hash,
+                partial=False,
+                desc="Hashing for folder detection",
+                quiet=quiet,
+                max_workers=manual_workers,
+                hash_cache=hash_cache,
+                resolve=table.record
+            )
+        for file_id, digest in remaining_hashes.items():
+            if digest:
+                digests[file_id] = digest
+    
+    # Find duplicate folders from the table's sizes and the digest column
+    duplicate_folder_ids = find_duplicate_folders(table, digests)
+    duplicate_folders = [
+        FolderGroup((table.dirs.path(dir_id) for dir_id in group), group.file_count, group.total_size)
+        for group in duplicate_folder_ids
+    ]
+    
+    if duplicate_folders:
+        if not quiet:
+            print(f"  Found {len(duplicate_folders)} groups of duplicate folders")
+        
+        # Remove files that are in duplicate folders from individual file duplicates
+        ids_in_duplicate_folders = get_files_in_duplicate_folders(duplicate_folder_ids, table)
+        
+        # Filter out individual file duplicates that are part of folder duplicates
+        filtered_duplicates = {}
+        for hash_val, id_list in duplicates.items():
+            filtered_ids = [f for f in id_list if f not in ids_in_duplicate_folders]
+            if len(filtered_ids) > 1:
+                filtered_duplicates[hash_val] = filtered_ids
+            elif len(filtered_ids) == 1:
+                # Single file remaining after folder filtering becomes unique
+                unique_ids.extend(filtered_ids)
+        
+        duplicates = filtered_duplicates
+        
+        # Also remove folder-duplicate files from unique files list
+        unique_ids = array('Q', (f for f in unique_ids if f not in ids_in_duplicate_folders))
+    else:
+        if not quiet:
+            print("  No duplicate folders found")
+    
+    _report_cache_stats(hash_cache, verbose, quiet)
+    
+    if budgeted:
+        duplicates = _finish_budgeted(table, duplicates, top, start_time, coverage)
+    return _table_results(table, duplicates), TablePaths(table, unique_ids), duplicate_folders
+
+
+def _report_cache_stats(hash_cache: Optional[HashCache], verbose: bool, quiet: bool) -> None:
+    """Print the run's cache hit rate (verbose mode)."""
+    if hash_cache is not None and verbose and not quiet:
+        stats = hash_cache.get_stats()
+        print(f"  Hash cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1f}% hit rate)")
+
+
+def _table_results(table: FileTable, duplicates: Dict[str, List[int]]) -> Dict[str, TablePaths]:
+    """Wrap ID groups as lazily materialized path sequences for the formatter."""
+    return {digest: TablePaths(table, id_list) for digest, id_list in duplicates.items()}
+
+
+def _group_savings(size: int, file_count: int) -> int:
+    """Bytes freed by keeping one of ``file_count`` files of ``size`` bytes."""
+    return size * (file_count - 1)
+
+
+def _budgeted_stages(
+    size_to_files: Dict[int, array],
+    hash_stages: Callable[[Dict[int, array], bool], Tuple[Dict[str, List[int]], List[int]]],
+    quiet: bool,
+    manual_workers: Optional[int],
+    top: Optional[int],
+    time_budget: Optional[float],
+    start_time: float,
+    coverage: Coverage
+) -> Tuple[Dict[str, List[int]], List[int]]:
+    """
+    Stages 2 and 3 on size groups in order of potential savings, until stopped.
+    
+    Groups are hashed in batches of roughly equal file count; the budget and
+    the number of confirmed groups are checked between batches. Groups that
+    were never reached are removed from ``size_to_files`` (size -> file IDs).
+    
+    Returns:
+        Tuple of (full_hash -> file IDs, IDs that were full-hashed)
+    """
+    order = sorted(size_to_files, key=lambda size: _group_savings(size, len(size_to_files[size])), reverse=True)
+    coverage.groups_total = len(order)
+    coverage.files_total = sum(len(group) for group in size_to_files.values())
+    coverage.bytes_total = sum(size * len(group) for size, group in size_to_files.items())
+    
+    if not quiet:
+        limits = []
+        if top is not None:
+            limits.append(f"top {top} groups")
+        if time_budget is not None:
+            limits.append(f"{time_budget:g}s budget")
+        print(f"\n=== Stages 2-3: Largest potential savings first ({', '.join(limits)}) ===")
+    
+    batch_files = (manual_workers or get_optimal_worker_count()) * _BUDGET_BATCH_FILES_PER_WORKER
+    batches = []
+    batch, batch_count = {}, 0
+    for size in order:
+        batch[size] = size_to_files[size]
+        batch_count += len(batch[size])
+        if batch_count >= batch_files:
+            batches.append(batch)
+            batch, batch_count = {}, 0
+    if batch:
+        batches.append(batch)
+    
+    full_hash_to_files: Dict[str, List[int]] = defaultdict(list)
+    candidates_for_full_hash: List[int] = []
+    confirmed = 0
+    for batch in tqdm(batches, desc="Size groups by savings", unit=" batches", leave=False, disable=quiet):
+        if top is not None and confirmed >= top:
+            coverage.stop_reason = STOP_TOP
+            break
+        if time_budget is not None and time.monotonic() - start_time >= time_budget:
+            coverage.stop_reason = STOP_TIME_BUDGET
+            break
+        batch_hashes, batch_candidates = hash_stages(batch, True)
+        for digest, file_list in batch_hashes.items():
+            full_hash_to_files[digest].extend(file_list)
+            if len(file_list) > 1:
+                confirmed += 1
+        candidates_for_full_hash.extend(batch_candidates)
+        coverage.add_checked(batch)
+    
+    for size in order[coverage.groups_checked:]:
+        del size_to_files[size]
+    
+    if not quiet:
+        print(f"  Checked {coverage.groups_checked:,} of {coverage.groups_total:,} size groups, "
+              f"{confirmed:,} duplicate groups found")
+    
+    return dict(full_hash_to_files), candidates_for_full_hash
+
+
+def _finish_budgeted(
+    table: FileTable,
+    duplicates: Dict[str, List[int]],
+    top: Optional[int],
+    start_time: float,
+    coverage: Coverage
+) -> Dict[str, List[int]]:
+    """Keep the ``top`` duplicate groups with the largest savings and close the coverage record."""
+    coverage.groups_found = len(duplicates)
+    if top is not None and len(duplicates) > top:
+        ranked = sorted(
+            duplicates.items(),
+            key=lambda item: _group_savings(table.sizes[item[1][0]], len(item[1])),
+            reverse=True
+        )
+        duplicates = dict(ranked[:top])
+    coverage.elapsed_seconds = time.monotonic() - start_time
+    return duplicates
+
+
+def _verify_duplicates(
+    table: FileTable,
+    duplicates: Dict[str, List[int]],
+    unique_ids: array,
+    full_hash_to_ids: Dict[str, List[int]],
+    quiet: bool
+) -> Tuple[Dict[str, List[int]], Dict[str, List[int]]]:
+    """
+    Byte-compare duplicate groups and drop files that only matched by digest.
+    
+    Files that turn out to be unique are appended to ``unique_ids``. Paths
+    are built only for the duplicate groups being compared.
+    
+    Returns:
+        Tuple of (verified duplicates, digests for folder detection)
+    """
+    if not quiet:
+        print(f"  Verifying {len(duplicates)} groups byte-for-byte ({get_hash_algorithm().name})")
+    
+    ids_by_path = {}
+    path_groups = {}
+    for digest, id_list in duplicates.items():
+        path_groups[digest] = table.paths(id_list)
+        ids_by_path.update(zip(path_groups[digest], id_list))
+    verified_paths, mismatched = verify_duplicate_groups(path_groups, quiet)
+    if mismatched and not quiet:
+        print(f"  {len(mismatched)} files only matched by hash collision")
+    
+    verified = {key: [ids_by_path[f] for f in group] for key, group in verified_paths.items()}
+    unique_ids.extend(ids_by_path[f] for f in mismatched)
+    
+    # Mismatched files get no digest, so no folder containing them can match;
+    # neither do split-off groups, whose keys do not fit the digest column
+    folder_hashes = {h: ids for h, ids in full_hash_to_ids.items() if len(ids) == 1}
+    folder_hashes.update((key, ids) for key, ids in verified.items() if key in duplicates)
+    return verified, folder_hashes
+
+
+def _two_stage_hashing(
+    table: FileTable,
+    size_to_files: Dict[int, array],
+    sample_dir: Optional[Path],
+    verbose: bool,
+    quiet: bool,
+    adaptive: bool,
+    manual_workers: Optional[int],
+    hash_cache: Optional[HashCache]
+) -> Tuple[Dict[str, List[int]], List[int]]:
+    """
+    Stages 2 and 3: partial hash of the first 4KB, then full hash of matches.
+    
+    Stage 2 keeps each file's hash state so Stage 3 resumes after the
+    prefix instead of re-reading it. Files no larger than the prefix are
+    already fully hashed by Stage 2 and skip Stage 3.
+    
+    Files are file table IDs throughout; the hashers resolve each ID to its
+    record (path plus cache key) only while the file is being read.
+    
+    Returns:
+        Tuple of (full_hash -> file IDs, IDs that were full-hashed)
+    """
     if not quiet:
         print("\n=== Stage 2: Partial hash comparison ===")
     
@@ -74,19 +431,23 @@ def find_duplicates(files: List[Path], verbose: bool = False, quiet: bool = Fals
     
     if verbose and not quiet:
         if adaptive:
-            config = get_adaptive_config(files[0].parent if files else None, len(files), manual_workers)
+            config = get_adaptive_config(sample_dir, len(table), manual_workers)
             print(f"  Using adaptive optimization: {config['io_workers']} I/O workers")
         else:
             print(f"  Using {get_optimal_worker_count()} parallel workers for hashing")
     
-    # Parallel partial hashing
+    # Parallel partial hashing, keeping resumable state for Stage 3
+    partial_states = {}
     if adaptive:
         partial_hashes = parallel_hash_files_adaptive(
             files_to_partial_hash,
             partial=True,
             desc="Partial hashing",
             quiet=quiet,
-            path=files[0].parent if files else None
+            path=sample_dir,
+            hash_cache=hash_cache,
+            partial_states=partial_states,
+            resolve=table.record
         )
     else:
         partial_hashes = parallel_hash_files(
@@ -94,46 +455,85 @@ def find_duplicates(files: List[Path], verbose: bool = False, quiet: bool = Fals
             partial=True,
             desc="Partial hashing",
             quiet=quiet,
-            max_workers=manual_workers
+            max_workers=manual_workers,
+            hash_cache=hash_cache,
+            partial_states=partial_states,
+            resolve=table.record
         )
     
     # Group files by size and partial hash
     size_partial_groups = defaultdict(list)
-    for file_path, partial_hash in partial_hashes.items():
-        if partial_hash:
-            size = get_file_size(file_path)
-            key = f"{size}:{partial_hash}"
-            size_partial_groups[key].append(file_path)
+    for size, file_group in size_to_files.items():
+        if len(file_group) > 1:
+            for file_path in file_group:
+                partial_hash = partial_hashes.get(file_path)
+                if partial_hash:
+                    size_partial_groups[(size, partial_hash)].append(file_path)
     
     # Find candidates for full hashing
-    for group_key, group_files in size_partial_groups.items():
+    full_hash_to_files = defaultdict(list)
+    files_to_full_hash = []
+    groups_to_compare = []
+    for (size, partial_hash), group_files in size_partial_groups.items():
         if len(group_files) > 1:
             candidates_for_full_hash.extend(group_files)
+            if size <= PARTIAL_HASH_SIZE:
+                # The partial hash already covered the whole file
+                full_hash_to_files[partial_hash].extend(group_files)
+            elif len(group_files) <= DIRECT_COMPARE_MAX_FILES:
+                groups_to_compare.append(group_files)
+            else:
+                files_to_full_hash.extend(group_files)
+    
+    # Only Stage 3 files need their hash state
+    partial_states = {
+        f: partial_states[f]
+        for f in files_to_full_hash + [f for group in groups_to_compare for f in group]
+        if f in partial_states
+    }
     
     if not quiet:
         print(f"  {len(candidates_for_full_hash)} files need full content comparison")
+        if len(files_to_full_hash) < len(candidates_for_full_hash):
+            print(f"  {len(candidates_for_full_hash) - len(files_to_full_hash)} small files already fully hashed")
         print("\n=== Stage 3: Full hash comparison ===")
     
-    # Stage 3: Full hash only for files with matching partial hashes
-    full_hash_to_files = defaultdict(list)
+    # Stage 3a: Small groups are compared directly, stopping at the first difference
+    if groups_to_compare:
+        if verbose and not quiet:
+            print(f"  Comparing {len(groups_to_compare)} groups of 2-{DIRECT_COMPARE_MAX_FILES} files byte-for-byte")
+        identical, different = _compare_small_groups(
+            table, groups_to_compare, partial_states, quiet, manual_workers, hash_cache
+        )
+        for full_hash, file_list in identical.items():
+            full_hash_to_files[full_hash].extend(file_list)
+        # Files that differ from every other file were never fully hashed
+        different = set(different)
+        candidates_for_full_hash = [f for f in candidates_for_full_hash if f not in different]
     
-    # Parallel full hashing
-    if candidates_for_full_hash:
+    # Stage 3b: Full hash only for files with matching partial hashes
+    if files_to_full_hash:
         if adaptive:
             full_hashes = parallel_hash_files_adaptive(
-                candidates_for_full_hash,
+                files_to_full_hash,
                 partial=False,
                 desc="Full hashing",
                 quiet=quiet,
-                path=files[0].parent if files else None
+                path=sample_dir,
+                hash_cache=hash_cache,
+                partial_states=partial_states,
+                resolve=table.record
             )
         else:
             full_hashes = parallel_hash_files(
-                candidates_for_full_hash,
+                files_to_full_hash,
                 partial=False,
                 desc="Full hashing",
                 quiet=quiet,
-                max_workers=manual_workers
+                max_workers=manual_workers,
+                hash_cache=hash_cache,
+                partial_states=partial_states,
+                resolve=table.record
             )
         
         # Group by full hash
@@ -141,94 +541,128 @@ def find_duplicates(files: List[Path], verbose: bool = False, quiet: bool = Fals
             if full_hash:
                 full_hash_to_files[full_hash].append(file_path)
     
-    # Compile final results
-    duplicates = {}
-    unique_files = []
+    return full_hash_to_files, candidates_for_full_hash
+
+
+def _compare_small_groups(
+    table: FileTable,
+    groups: List[List[int]],
+    partial_states: Dict[int, PartialHashState],
+    quiet: bool,
+    manual_workers: Optional[int],
+    hash_cache: Optional[HashCache]
+) -> Tuple[Dict[str, List[int]], List[int]]:
+    """
+    Resolve small candidate groups of file IDs by direct comparison.
     
-    # Add unique-by-size files
-    for size, file_group in size_to_files.items():
-        if len(file_group) == 1:
-            unique_files.extend(file_group)
+    Groups whose files all have cached full digests are not read at all;
+    digests of files found identical are stored back in the cache.
     
-    # Add files that were unique after partial/full hashing
-    processed_files = set(candidates_for_full_hash)
-    for size, file_group in size_to_files.items():
-        if len(file_group) > 1:
-            for file_path in file_group:
-                if file_path not in processed_files:
-                    unique_files.append(file_path)
+    Returns:
+        Tuple of (full_hash -> file IDs, IDs matching no other file)
+    """
+    resolved = defaultdict(list)
+    cache_keys = {}
+    if hash_cache is not None:
+        uncached_groups = []
+        for group in groups:
+            cached, to_hash, keys = _lookup_cached(group, False, hash_cache, None, resolve=table.record)
+            if to_hash:
+                uncached_groups.append(group)
+                cache_keys.update(keys)
+            else:
+                for file_path, digest in cached.items():
+                    resolved[digest].append(file_path)
+        groups = uncached_groups
     
-    # Add duplicates and remaining unique files from full hash
-    for full_hash, file_list in full_hash_to_files.items():
-        if len(file_list) > 1:
-            duplicates[full_hash] = file_list
-        else:
-            unique_files.extend(file_list)
+    identical, different = parallel_compare_groups(
+        groups,
+        partial_states,
+        desc="Comparing files",
+        quiet=quiet,
+        max_workers=manual_workers or get_optimal_worker_count(),
+        resolve=table.path
+    )
+    for digest, file_list in identical.items():
+        resolved[digest].extend(file_list)
+    
+    if hash_cache is not None:
+        digests = {f: digest for digest, file_list in identical.items() for f in file_list}
+        _store_cached(digests, cache_keys, False, hash_cache)
+    
+    return resolved, different
+
+
+def _progressive_stages(
+    table: FileTable,
+    size_to_files: Dict[int, array],
+    verbose: bool,
+    quiet: bool,
+    manual_workers: Optional[int],
+    hash_cache: Optional[HashCache]
+) -> Tuple[Dict[str, List[int]], List[int]]:
+    """
+    Stages 2 and 3 combined: split size groups with progressively larger blocks.
     
+    Returns:
+        Tuple of (full_hash -> file IDs, IDs that were fully hashed)
+    """
     if not quiet:
-        print(f"  Optimization complete!")
-        print("\n=== Stage 4: Smart folder duplicate detection ===")
+        print("\n=== Stages 2-3: Progressive block comparison ===")
     
-    # Create a dictionary of file hashes for folder detection
-    all_file_hashes = {}
-    for hash_val, file_list in full_hash_to_files.items():
-        for file_path in file_list:
-            all_file_hashes[file_path] = hash_val
+    size_groups = {size: group for size, group in size_to_files.items() if len(group) > 1}
+    full_hash_to_ids, _, stats = progressive_hash_groups(
+        size_groups,
+        quiet=quiet,
+        max_workers=manual_workers,
+        hash_cache=hash_cache,
+        resolve=table.record
+    )
+    fully_hashed = [f for group in full_hash_to_ids.values() for f in group]
     
-    # Add files that were unique by size or partial hash
-    # Collect files that need hashing for folder detection
-    files_needing_folder_hash = []
-    for size, file_group in size_to_files.items():
-        for file_path in file_group:
-            if file_path not in all_file_hashes:
-                files_needing_folder_hash.append(file_path)
+    if not quiet:
+        print(f"  {len(fully_hashed)} files compared to the last byte")
+        if verbose:
+            print(f"  {stats.summary()}")
     
-    # Parallel hash remaining files for folder detection
-    if files_needing_folder_hash:
-        if adaptive:
-            remaining_hashes = parallel_hash_files_adaptive(
-                files_needing_folder_hash,
-                partial=False,
-                desc="Hashing for folder detection",
-                quiet=quiet,
-                path=files[0].parent if files else None
-            )
-        else:
-            remaining_hashes = parallel_hash_files(
-                files_needing_folder_hash,
-                partial=False,
-                desc="Hashing for folder detection",
-                quiet=quiet,
-                max_workers=manual_workers
-            )
-        all_file_hashes.update(remaining_hashes)
+    return full_hash_to_ids, fully_hashed
+
+
+def _pipelined_stages(
+    table: FileTable,
+    size_to_files: Dict[int, array],
+    sample_dir: Optional[Path],
+    quiet: bool,
+    adaptive: bool,
+    manual_workers: Optional[int],
+    hash_cache: Optional[HashCache]
+) -> Tuple[Dict[str, List[int]], List[int]]:
+    """
+    Stages 2 and 3 as a pipeline, followed by a per-stage occupancy report.
     
-    # Find duplicate folders
-    duplicate_folders = find_duplicate_folders(files, all_file_hashes)
+    Returns:
+        Tuple of (full_hash -> file IDs, IDs that were full-hashed)
+    """
+    if not quiet:
+        print("\n=== Stages 2-3: Pipelined partial and full hashing ===")
     
-    if duplicate_folders:
-        if not quiet:
-            print(f"  Found {len(duplicate_folders)} groups of duplicate folders")
-        
-        # Remove files that are in duplicate folders from individual file duplicates
-        files_in_duplicate_folders = get_files_in_duplicate_folders(duplicate_folders, files)
-        
-        # Filter out individual file duplicates that are part of folder duplicates
-        filtered_duplicates = {}
-        for hash_val, file_list in duplicates.items():
-            filtered_files = [f for f in file_list if f not in files_in_duplicate_folders]
-            if len(filtered_files) > 1:
-                filtered_duplicates[hash_val] = filtered_files
-            elif len(filtered_files) == 1:
-                # Single file remaining after folder filtering becomes unique
-                unique_files.extend(filtered_files)
-        
-        duplicates = filtered_duplicates
-        
-        # Also remove folder-duplicate files from unique files list
-        unique_files = [f for f in unique_files if f not in files_in_duplicate_folders]
-    else:
-        if not quiet:
-            print("  No duplicate folders found")
+    workers = manual_workers
+    if workers is None and adaptive:
+        workers = get_adaptive_config(sample_dir, len(table))['io_workers']
+    
+    size_groups = {size: group for size, group in size_to_files.items() if len(group) > 1}
+    full_hash_to_ids, candidates_for_full_hash, stats = pipelined_hash_groups(
+        size_groups,
+        quiet=quiet,
+        max_workers=workers,
+        hash_cache=hash_cache,
+        resolve=table.record
+    )
+    
+    if not quiet:
+        print(f"  {len(candidates_for_full_hash)} files needed full content comparison")
+        print(f"  Stage occupancy ({stats.workers} workers, {stats.wall_seconds:.2f}s):")
+        for line in stats.summary():
+            print(f"    {line}")
     
-    return duplicates, unique_files, duplicate_folders
\ No newline at end of file
+    return full_hash_to_ids, candidates_for_full_hash
@@ -0,0 +1,271 @@
+"""
+External-memory grouping of files by size.
+"""
+
+import heapq
+import os
+import struct
+import sys
+import tempfile
+from itertools import groupby
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from .scanner import FileRecord
+
+# Default ceiling for the in-memory run buffer
+DEFAULT_MAX_MEMORY = 256 * 1024 * 1024
+
+# Approximate cost of one buffered entry beyond its path bytes:
+# tuple (88) + 5 ints (160) + list slot (8)
+_ENTRY_OVERHEAD = 256
+
+# Run file record: size (u64), path length (u32), mtime_ns (i64),
+# st_dev (u64), st_ino (u64), ctime_ns (i64), then the encoded path
+_RECORD_HEADER = struct.Struct(">QIqQQq")
+
+# (size, path bytes, mtime_ns, st_dev, st_ino, ctime_ns)
+_Entry = Tuple[int, bytes, int, int, int, int]
+
+
+def _encode(item: Union[Path, FileRecord]) -> _Entry:
+    """Entry for a record, or for a bare path with zeroed stat data."""
+    if isinstance(item, FileRecord):
+        return (
+            item.size, os.fsencode(item.path),
+            item.mtime_ns, item.st_dev, item.st_ino, item.ctime_ns
+        )
+    return (0, os.fsencode(item), 0, 0, 0, 0)
+
+
+def _decode(entry: _Entry, keep_records: bool) -> Union[Path, FileRecord]:
+    """Path (or FileRecord) for an entry."""
+    size, path_bytes, mtime_ns, st_dev, st_ino, ctime_ns = entry
+    path = Path(os.fsdecode(path_bytes))
+    if not keep_records:
+        return path
+    return FileRecord(path, size, mtime_ns, st_dev, st_ino, ctime_ns)
+
+
+def _write_entry(f: BinaryIO, entry: _Entry) -> None:
+    size, path_bytes, mtime_ns, st_dev, st_ino, ctime_ns = entry
+    f.write(_RECORD_HEADER.pack(size, len(path_bytes), mtime_ns, st_dev, st_ino, ctime_ns))
+    f.write(path_bytes)
+
+
+def _write_run(entries: List[_Entry], directory: str) -> str:
+    """Sort ``entries`` and write them to a new run file."""
+    entries.sort()
+    fd, run_path = tempfile.mkstemp(prefix="sizes-", suffix=".run", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        for entry in entries:
+            _write_entry(f, entry)
+    return run_path
+
+
+def _read_entry(f: BinaryIO) -> Optional[_Entry]:
+    """Read the entry at the current position, or None at the end of the file."""
+    header = f.read(_RECORD_HEADER.size)
+    if len(header) < _RECORD_HEADER.size:
+        return None
+    size, length, mtime_ns, st_dev, st_ino, ctime_ns = _RECORD_HEADER.unpack(header)
+    return size, f.read(length), mtime_ns, st_dev, st_ino, ctime_ns
+
+
+def _read_run(f: BinaryIO) -> Iterator[_Entry]:
+    """Stream entries back from a run file."""
+    while True:
+        entry = _read_entry(f)
+        if entry is None:
+            return
+        yield entry
+
+
+class SizeGrouper:
+    """
+    Group (size, path) pairs by size with bounded memory.
+
+    Pairs are buffered until the buffer's estimated footprint reaches
+    ``max_memory``; the buffer is then sorted and spilled to a temporary
+    run file. finish() merge-joins the sorted runs, so only size classes
+    with two or more members are ever held in memory as groups.
+
+    Files added with add_record() keep their scan-time stat data through
+    the runs; with ``keep_records`` the groups hold FileRecords, so later
+    stages can key digest caches without stat'ing again.
+    """
+
+    def __init__(
+        self,
+        max_memory: int = DEFAULT_MAX_MEMORY,
+        temp_dir: Optional[Path] = None,
+        keep_records: bool = False
+    ):
+        """
+        Args:
+            max_memory: Buffer ceiling in bytes before spilling a run
+            temp_dir: Where to create run files (None for the system default)
+            keep_records: Return groups of FileRecords instead of paths
+        """
+        self.max_memory = max_memory
+        self.temp_dir = temp_dir
+        self.keep_records = keep_records
+        self.runs: List[str] = []
+        self.files_added = 0
+        self._buffer: List[_Entry] = []
+        self._buffer_bytes = 0
+        self._run_dir: Optional[tempfile.TemporaryDirectory] = None
+
+    def add(self, size: int, path: Path) -> None:
+        """Add one file without stat data."""
+        self._append((size, os.fsencode(path), 0, 0, 0, 0))
+
+    def add_record(self, record: FileRecord) -> None:
+        """Add one file with its scan-time stat data."""
+        self._append(_encode(record))
+
+    def _append(self, entry: _Entry) -> None:
+        path_bytes = entry[1]
+        self._buffer.append(entry)
+        self._buffer_bytes += len(path_bytes) + _ENTRY_OVERHEAD
+        self.files_added += 1
+        if self._buffer_bytes >= self.max_memory:
+            self._spill()
+
+    def _spill(self) -> None:
+        if not self._buffer:
+            return
+        if self._run_dir is None:
+            self._run_dir = tempfile.TemporaryDirectory(prefix="duplicate-finder-", dir=self.temp_dir)
+        self.runs.append(_write_run(self._buffer, self._run_dir.name))
+        self._buffer = []
+        self._buffer_bytes = 0
+
+    def finish(
+        self,
+        on_unique: Optional[Callable[[Union[Path, FileRecord]], None]] = None
+    ) -> Tuple[Dict[int, List[Union[Path, FileRecord]]], List[Path]]:
+        """
+        Merge all runs and group by size.
+
+        Args:
+            on_unique: Called with each size-unique file (a FileRecord when
+                ``keep_records`` is set) as the merge reaches it; such files
+                are then not collected into the returned list
+
+        Returns:
+            Tuple of (size -> files for sizes shared by 2+ files, unique
+            files); grouped files are FileRecords when ``keep_records`` is
+            set, unique files are always paths
+        """
+        size_groups: Dict[int, List[Union[Path, FileRecord]]] = {}
+        unique_files: List[Path] = []
+        try:
+            if self.runs:
+                # Everything goes to disk so the merge holds one record per run
+                self._spill()
+            else:
+                self._buffer.sort()
+            run_files = [open(run_path, "rb") for run_path in self.runs]
+            try:
+                merged = heapq.merge(*(_read_run(f) for f in run_files)) if run_files else iter(self._buffer)
+                for size, entries in groupby(merged, key=lambda entry: entry[0]):
+                    group = list(entries)
+                    if len(group) > 1:
+                        size_groups[size] = [_decode(entry, self.keep_records) for entry in group]
+                    elif on_unique is not None:
+                        on_unique(_decode(group[0], self.keep_records))
+                    else:
+                        unique_files.append(_decode(group[0], False))
+            finally:
+                for f in run_files:
+                    f.close()
+        finally:
+            self.close()
+        return size_groups, unique_files
+
+    def close(self) -> None:
+        """Drop buffered entries and delete run files."""
+        self._buffer = []
+        self._buffer_bytes = 0
+        if self._run_dir is not None:
+            try:
+                self._run_dir.cleanup()
+            except OSError as e:
+                print(f"⚠️  Could not remove temporary size runs in {self._run_dir.name}: {e}", file=sys.stderr)
+            self._run_dir = None
+
+
+class FileSpool:
+    """
+    Append-only list of files kept in a temporary file instead of memory.
+
+    Files are written in the size-run record format as they are appended;
+    iterating reads them back in order, and can be repeated. Only the count
+    is held in memory. The backing file is deleted on close() or when the
+    spool is garbage collected.
+    """
+
+    def __init__(self, keep_records: bool = False, temp_dir: Optional[Path] = None):
+        """
+        Args:
+            keep_records: Yield FileRecords instead of paths
+            temp_dir: Where to create the backing file (None for the system default)
+        """
+        self.keep_records = keep_records
+        self._file = tempfile.TemporaryFile(prefix="duplicate-finder-", suffix=".spool", dir=temp_dir)
+        self._count = 0
+        # False once a bare path (no stat data) has been appended
+        self._sized = True
+        # Whoever last moved the file offset (the spool itself when
+        # appending, or an iterator); only a change of hands needs a seek
+        self._offset_owner = self
+
+    def append(self, item: Union[Path, FileRecord]) -> None:
+        """Add one file; paths are stored without stat data."""
+        if not isinstance(item, FileRecord):
+            self._sized = False
+        if self._offset_owner is not self:
+            self._file.seek(0, os.SEEK_END)
+            self._offset_owner = self
+        _write_entry(self._file, _encode(item))
+        self._count += 1
+
+    def extend(self, items) -> None:
+        """Add every file from an iterable."""
+        for item in items:
+            self.append(item)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Union[Path, FileRecord]]:
+        for entry in self._entries():
+            yield _decode(entry, self.keep_records)
+
+    def records(self) -> Iterator[FileRecord]:
+        """Yield every file as a FileRecord (zeroed stat data for bare paths)."""
+        for entry in self._entries():
+            yield _decode(entry, True)
+
+    def with_sizes(self) -> Iterator[Tuple[Path, Optional[int]]]:
+        """Yield (path, size) per file; size is None unless every file was appended as a FileRecord."""
+        for record in self.records():
+            yield record.path, record.size if self._sized else None
+
+    def _entries(self) -> Iterator[_Entry]:
+        # Read sequentially through the buffer; the position is only
+        # restored after an append or another iterator moved the offset
+        reader = object()
+        position = 0
+        for _ in range(self._count):
+            if self._offset_owner is not reader:
+                self._file.seek(position)
+                self._offset_owner = reader
+            entry = _read_entry(self._file)
+            position += _RECORD_HEADER.size + len(entry[1])
+            yield entry
+
+    def close(self) -> None:
+        """Delete the backing file."""
+        self._file.close()
@@ -3,15 +3,24 @@ Fast metadata-based duplicate detection optimized for HDDs.
 """
 
 import os
+import re
+import stat
 import sys
 import platform
+import threading
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional, Set
-from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple, Optional, Sequence, Set
 from collections import defaultdict
 import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
+from tqdm import tqdm
+
+from .file_table import DirectoryTable
+from .parallel_walker import walk_parallel
+from .scan_filter import ScanFilter, TraversalGuard, DEFAULT_SYMLINK_POLICY, SYMLINKS_SKIP, SYMLINKS_ALL
+
 
 class FileCategory(Enum):
     """File categories for specialized duplicate detection."""
@@ -29,24 +38,177 @@ VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm',
 DOCUMENT_EXTENSIONS = {'.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
                       '.txt', '.rtf', '.odt', '.ods', '.odp', '.csv'}
 
+# Key strategies for fast mode, tried in the order given
+STRATEGY_NAME = 'name'
+STRATEGY_NORMALIZED_NAME = 'normalized-name'
+STRATEGY_SIZE_EXT = 'size-ext'
+STRATEGY_SIZE_MTIME = 'size-mtime'
+MATCH_STRATEGIES = (STRATEGY_NAME, STRATEGY_NORMALIZED_NAME, STRATEGY_SIZE_EXT, STRATEGY_SIZE_MTIME)
+DEFAULT_MATCH_STRATEGIES = (STRATEGY_NAME,)
+
+# Threads reading file contents in fast mode. Few threads: on HDDs more
+# concurrent seeks only add head movement
+DEFAULT_READ_WORKERS = 4
+
+# Copy markers added by file managers, stripped from the end of a name's stem:
+# "photo (1)", "photo - Copy", "photo - Copy (2)", "photo_copy2", "photo copy"
+_COPY_SUFFIXES = re.compile(r'(\s*\(\d+\)|\s*-\s*copy(\s*\(\d+\)|\s+\d+)?|[\s_.]copy\d*)$')
+# "Copy of photo", "Copy (2) of photo"
+_COPY_PREFIX = re.compile(r'^copy(\s*\(\d+\))?\s+of\s+')
+
+
+# Categories are stored in records as their index in this tuple
+_CATEGORIES = tuple(FileCategory)
+_CATEGORY_CODES = {category: code for code, category in enumerate(_CATEGORIES)}
+_EXTENSION_CODES = {
+    **{extension: _CATEGORY_CODES[FileCategory.PHOTO] for extension in PHOTO_EXTENSIONS},
+    **{extension: _CATEGORY_CODES[FileCategory.VIDEO] for extension in VIDEO_EXTENSIONS},
+    **{extension: _CATEGORY_CODES[FileCategory.DOCUMENT] for extension in DOCUMENT_EXTENSIONS},
+}
+_OTHER_CODE = _CATEGORY_CODES[FileCategory.OTHER]
+
+def _locked_interner(directories: DirectoryTable) -> Callable[[Path], int]:
+    """``directories.intern`` for a table shared by several listing threads."""
+    lock = threading.Lock()
+    
+    def intern(directory: Path) -> int:
+        with lock:
+            return directories.intern(directory)
+    
+    return intern
+
+
+# Table for records built one at a time (outside a scan)
+_DEFAULT_DIRECTORIES = DirectoryTable()
+_default_intern = _locked_interner(_DEFAULT_DIRECTORIES)
+
+
+def _category_code(name_lower: str) -> int:
+    return _EXTENSION_CODES.get(os.path.splitext(name_lower)[1], _OTHER_CODE)
+
 
-@dataclass
 class FileMetadata:
-    """Metadata for a file used in duplicate detection."""
-    path: Path
-    size: int
-    mtime: float
-    name: str
-    name_lower: str
-    category: FileCategory = FileCategory.OTHER
+    """
+    Metadata for a file used in duplicate detection.
+    
+    Fast mode holds one record per scanned file, so records are compact:
+    slotted, with the parent directory kept as an ID into the
+    DirectoryTable of the scan that produced the record, interned names
+    (files with the same name share one string) and the category kept as a
+    small int. ``path`` and ``category`` are rebuilt on access. Records
+    keep their scan's table alive, so it is freed along with them.
+    """
+    __slots__ = ('_directories', 'dir_id', 'name', 'name_lower', 'size', 'mtime', '_category', 'st_dev', 'st_ino')
+    
+    def __init__(
+        self,
+        path: Path,
+        size: int,
+        mtime: float,
+        name: str,
+        name_lower: str,
+        category: FileCategory = FileCategory.OTHER,
+        st_dev: int = 0,
+        st_ino: int = 0,
+        directories: Optional[DirectoryTable] = None
+    ):
+        """
+        ``directories`` is the table to intern the parent directory in;
+        records built together should share one (a module-wide table if None).
+        """
+        if directories is None:
+            directories, dir_id = _DEFAULT_DIRECTORIES, _default_intern(path.parent)
+        else:
+            dir_id = directories.intern(path.parent)
+        self._set(directories, dir_id, name, name_lower, size, mtime,
+                  _CATEGORY_CODES[category], st_dev, st_ino)
+    
+    @classmethod
+    def _from_scan(cls, directories: DirectoryTable, dir_id: int, name: str, stat_result: os.stat_result) -> 'FileMetadata':
+        """Build a record from a directory listing, categorizing by extension."""
+        file_meta = cls.__new__(cls)
+        name_lower = name.lower()  # Case-insensitive on Windows
+        file_meta._set(directories, dir_id, name, name_lower, stat_result.st_size, stat_result.st_mtime,
+                       _category_code(name_lower), stat_result.st_dev, stat_result.st_ino)
+        return file_meta
+    
+    def _set(self, directories, dir_id, name, name_lower, size, mtime, category_code, st_dev, st_ino):
+        self._directories = directories
+        self.dir_id = dir_id
+        self.name = sys.intern(name)
+        self.name_lower = self.name if name_lower == name else sys.intern(name_lower)
+        self.size = size
+        self.mtime = mtime
+        self._category = category_code
+        self.st_dev = st_dev
+        self.st_ino = st_ino
+    
+    @property
+    def path(self) -> Path:
+        return self._directories.path(self.dir_id) / self.name
+    
+    @property
+    def category(self) -> FileCategory:
+        return _CATEGORIES[self._category]
+    
+    @category.setter
+    def category(self, category: FileCategory) -> None:
+        self._category = _CATEGORY_CODES[category]
+    
+    def __eq__(self, other):
+        if not isinstance(other, FileMetadata):
+            return NotImplemented
+        # Directory IDs only mean something within one scan's table
+        return self.path == other.path and all(
+            getattr(self, slot) == getattr(other, slot) for slot in self.__slots__[2:]
+        )
+    
+    __hash__ = None
+    
+    def __repr__(self) -> str:
+        return (f"FileMetadata(path={self.path!r}, size={self.size!r}, mtime={self.mtime!r}, "
+                f"category={self.category})")
 
 
-@dataclass
 class DuplicateGroup:
     """A group of files that are potential duplicates."""
-    files: List[FileMetadata]
-    match_type: str  # 'exact', 'category_match', 'name_only'
-    category: FileCategory = FileCategory.OTHER
+    __slots__ = ('files', 'match_type', '_category')
+    
+    def __init__(self, files: List[FileMetadata], match_type: str, category: FileCategory = FileCategory.OTHER):
+        self.files = files
+        # 'exact', 'category_match', 'normalized_name', 'size_ext', 'size_mtime', 'media_match', 'sampled_verified'
+        self.match_type = match_type
+        self._category = _CATEGORY_CODES[category]
+    
+    @property
+    def category(self) -> FileCategory:
+        return _CATEGORIES[self._category]
+    
+    @category.setter
+    def category(self, category: FileCategory) -> None:
+        self._category = _CATEGORY_CODES[category]
+    
+    def __repr__(self) -> str:
+        return f"DuplicateGroup(files={self.files!r}, match_type={self.match_type!r}, category={self.category})"
+
+
+def read_files_concurrently(
+    read: Callable[[Path, int], object],
+    files: Sequence[FileMetadata],
+    max_workers: int = DEFAULT_READ_WORKERS,
+    desc: str = "Reading files",
+    quiet: bool = False
+) -> List[object]:
+    """
+    Call ``read(path, size)`` for each file on a few threads.
+
+    Returns:
+        Results in the order of ``files``
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Records rebuild their path on access, so look it up once per file
+        results = executor.map(lambda file_meta: read(file_meta.path, file_meta.size), files)
+        return list(tqdm(results, total=len(files), desc=desc, unit=" files", leave=False, disable=quiet))
 
 
 def is_windows() -> bool:
@@ -145,22 +307,153 @@ def categorize_file(file_path: Path) -> FileCategory:
         return FileCategory.OTHER
 
 
-def scan_files_metadata(directory: Path, verbose: bool = False, skip_system_files: bool = True) -> List[FileMetadata]:
+def _keeps_symlink(file_path: Path, guard: TraversalGuard) -> bool:
+    """Whether a symlinked file passes the guard's symlink policy."""
+    if guard.symlinks == SYMLINKS_SKIP:
+        return False
+    try:
+        resolved = file_path.resolve()
+        return guard.follows_link(resolved, resolved.stat())
+    except (OSError, RuntimeError):
+        # Broken links are reported when the file itself is stat'ed
+        return True
+
+
+def normalize_copy_name(name_lower: str) -> str:
+    """
+    Strip copy markers from a lowercase filename.
+    
+    ``photo (1).jpg``, ``photo - copy.jpg``, ``photo_copy2.jpg`` and
+    ``copy of photo.jpg`` all become ``photo.jpg``. Markers are stripped
+    repeatedly (``photo (1) - copy.jpg``) but never down to an empty stem.
+    """
+    stem, dot, extension = name_lower.rpartition('.')
+    if not stem:
+        # No extension, or a dotfile such as .bashrc
+        stem, dot, extension = name_lower, '', ''
+    while True:
+        stripped = _COPY_PREFIX.sub('', _COPY_SUFFIXES.sub('', stem))
+        if stripped == stem or not stripped:
+            break
+        stem = stripped
+    return stem + dot + extension
+
+
+def _collect_file_metadata(
+    file_path: Path,
+    filename: str,
+    directories: DirectoryTable,
+    intern: Callable[[Path], int],
+    scan_filter: Optional[ScanFilter] = None,
+    guard: Optional[TraversalGuard] = None,
+    dir_id: Optional[int] = None
+) -> Optional[FileMetadata]:
+    """
+    Stat a file once and build its FileMetadata.
+    
+    ``directories`` is the scan's DirectoryTable and ``intern`` adds a
+    directory to it. ``dir_id`` is the interned ID of the file's directory,
+    looked up once per listing by the scanners (computed here when None).
+    
+    Returns:
+        FileMetadata, or None if the file is outside the filter's size
+        limits or a symlink the guard turns away
+    
+    Raises:
+        OSError: If the file cannot be stat'ed
+    """
+    if guard is None:
+        # Get file stats in one call
+        stat_result = file_path.stat()
+    else:
+        # lstat tells symlinks apart at no extra cost for regular files
+        stat_result = os.lstat(file_path)
+        if stat.S_ISLNK(stat_result.st_mode):
+            if not _keeps_symlink(file_path, guard):
+                return None
+            stat_result = file_path.stat()
+    if scan_filter is not None and not scan_filter.allows_size(stat_result.st_size):
+        return None
+    
+    # On Windows, normalize the path for consistent comparison
+    if is_windows():
+        file_path = normalize_windows_path(file_path)
+        dir_id, filename = None, file_path.name
+    
+    if dir_id is None:
+        dir_id = intern(file_path.parent)
+    return FileMetadata._from_scan(directories, dir_id, filename, stat_result)
+
+
+def _collapse_hardlinks(files: List[FileMetadata], verbose: bool = False) -> List[FileMetadata]:
+    """
+    Keep the first path to each physical file, identified by (st_dev, st_ino).
+    
+    Hardlinks and symlinks to scanned files would otherwise be reported as
+    duplicates that free no space. Files without an inode number are kept.
+    """
+    seen: Set[Tuple[int, int]] = set()
+    kept = []
+    for file_meta in files:
+        if file_meta.st_ino:
+            identity = (file_meta.st_dev, file_meta.st_ino)
+            if identity in seen:
+                continue
+            seen.add(identity)
+        kept.append(file_meta)
+    
+    if verbose and len(kept) < len(files):
+        print(f"  Skipped {len(files) - len(kept)} paths linked to an already scanned file")
+    return kept
+
+
+def scan_files_metadata(
+    directory: Path,
+    verbose: bool = False,
+    skip_system_files: bool = True,
+    max_workers: Optional[int] = None,
+    scan_filter: Optional[ScanFilter] = None,
+    one_file_system: bool = False,
+    symlinks: str = DEFAULT_SYMLINK_POLICY
+) -> List[FileMetadata]:
     """
     Scan directory and collect file metadata efficiently.
     
+    Symlinked directories are never descended here; ``symlinks`` decides
+    which symlinked files are kept. follow-all, which would descend them,
+    is rejected rather than quietly applied to files only. Each scan
+    interns its directories in its own DirectoryTable, which the returned
+    records reference.
+    
     Args:
         directory: Directory to scan
         verbose: Enable verbose output
         skip_system_files: Skip Windows system/temp files
+        max_workers: List directories on this many threads (None for single-threaded)
+        scan_filter: Size limits and globs applied during traversal (optional)
+        one_file_system: Do not descend into directories on other devices
+        symlinks: Symlink policy: 'skip', 'follow-files' or 'follow-within-root'
         
     Returns:
         List of FileMetadata objects
+    
+    Raises:
+        ValueError: If ``symlinks`` is 'follow-all'
     """
+    if symlinks == SYMLINKS_ALL:
+        raise ValueError("Fast mode does not descend symlinked directories; use another symlink policy")
+    if scan_filter is not None and not scan_filter.active:
+        scan_filter = None
+    guard = TraversalGuard(directory, one_file_system, symlinks)
+    if max_workers is not None and max_workers > 1:
+        return _scan_files_metadata_parallel(directory, verbose, skip_system_files, max_workers, scan_filter, guard)
+    
+    directories = DirectoryTable()
     files = []
     start_time = time.time()
     file_count = 0
     skipped_count = 0
+    filtered_count = 0
     
     # Normalize directory path for Windows
     directory = normalize_windows_path(directory)
@@ -174,34 +467,40 @@ def scan_files_metadata(directory: Path, verbose: bool = False, skip_system_file
         # Use os.walk for better Windows performance
         for root, dirs, filenames in os.walk(directory):
             root_path = Path(root)
+            dir_id = directories.intern(root_path)
             
-            for filename in filenames:
+            if scan_filter is not None:
+                # Pruned in place so os.walk never lists them
+                kept_dirs = [d for d in dirs if scan_filter.allows_dir(d, os.path.join(root, d))]
+                filtered_count += len(dirs) - len(kept_dirs)
+                dirs[:] = kept_dirs
+            if one_file_system:
+                kept_dirs = [d for d in dirs if _enters_directory(os.path.join(root, d), guard)]
+                filtered_count += len(dirs) - len(kept_dirs)
+                dirs[:] = kept_dirs
+            # Name order, as in the parallel scan, so the same hardlink is kept
+            dirs.sort()
+            
+            for filename in sorted(filenames):
                 file_path = root_path / filename
                 
+                if scan_filter is not None and not scan_filter.allows_name(filename, str(file_path)):
+                    filtered_count += 1
+                    continue
+                
                 # Skip Windows system/temp files if requested
                 if skip_system_files and should_skip_windows_file(file_path):
                     skipped_count += 1
                     continue
                 
                 try:
-                    # Get file stats in one call
-                    stat_result = file_path.stat()
-                    
-                    # Categorize the file
-                    category = categorize_file(file_path)
-                    
-                    # On Windows, normalize the path for consistent comparison
-                    if is_windows():
-                        file_path = normalize_windows_path(file_path)
-                    
-                    files.append(FileMetadata(
-                        path=file_path,
-                        size=stat_result.st_size,
-                        mtime=stat_result.st_mtime,
-                        name=filename,
-                        name_lower=filename.lower(),  # Case-insensitive on Windows
-                        category=category
-                    ))
+                    file_meta = _collect_file_metadata(
+                        file_path, filename, directories, directories.intern, scan_filter, guard, dir_id
+                    )
+                    if file_meta is None:
+                        filtered_count += 1
+                        continue
+                    files.append(file_meta)
                     
                     file_count += 1
                     
@@ -221,11 +520,119 @@ def scan_files_metadata(directory: Path, verbose: bool = False, skip_system_file
     
     elapsed = time.time() - start_time
     if verbose:
-        print(f"Completed scan: {file_count} files in {elapsed:.1f}s")
+        rate = file_count / elapsed if elapsed > 0 else 0.0
+        print(f"Completed scan: {file_count} files in {elapsed:.1f}s ({rate:,.0f} files/sec)")
         if skipped_count > 0:
             print(f"  Skipped {skipped_count} system/temporary files")
+        if filtered_count > 0:
+            print(f"  Filtered out {filtered_count} files and directories")
     
-    return files
+    return _collapse_hardlinks(files, verbose)
+
+
+def _enters_directory(path: str, guard: TraversalGuard) -> bool:
+    """Whether the guard lets the scan descend into a (non-symlink) directory."""
+    try:
+        return guard.enter_directory(os.lstat(path)) is None
+    except OSError:
+        # Listing it will report the error
+        return True
+
+
+def _scan_files_metadata_parallel(
+    directory: Path,
+    verbose: bool,
+    skip_system_files: bool,
+    max_workers: int,
+    scan_filter: Optional[ScanFilter] = None,
+    guard: Optional[TraversalGuard] = None
+) -> List[FileMetadata]:
+    """
+    Collect file metadata with directories listed concurrently.
+    
+    Matches os.walk semantics (symlinked directories are not descended) and
+    returns files depth-first with entries sorted by name. Listing threads
+    share the scan's DirectoryTable, locking it once per directory.
+    """
+    directory = normalize_windows_path(directory)
+    directories = DirectoryTable()
+    intern = _locked_interner(directories)
+    
+    if verbose:
+        print(f"Scanning directory: {directory} ({max_workers} parallel listers)")
+        if is_windows():
+            print("  Windows optimizations enabled")
+    
+    def visit(current_dir: str):
+        local_files = []
+        skipped = 0
+        filtered = 0
+        subdirs = []
+        try:
+            with os.scandir(current_dir) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except (OSError, PermissionError) as e:
+            if verbose:
+                print(f"  Warning: Cannot list {current_dir}: {e}")
+            return (local_files, skipped, filtered), subdirs
+        
+        dir_id = intern(Path(current_dir))
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        if scan_filter is not None and not scan_filter.allows_dir(entry.name, entry.path):
+                            filtered += 1
+                        elif guard is not None and guard.one_file_system and not _enters_directory(entry.path, guard):
+                            filtered += 1
+                        else:
+                            subdirs.append(entry.path)
+                    continue
+            except OSError:
+                pass
+            
+            if scan_filter is not None and not scan_filter.allows_name(entry.name, entry.path):
+                filtered += 1
+                continue
+            
+            file_path = Path(entry.path)
+            if skip_system_files and should_skip_windows_file(file_path):
+                skipped += 1
+                continue
+            
+            try:
+                file_meta = _collect_file_metadata(
+                    file_path, entry.name, directories, intern, scan_filter, guard, dir_id
+                )
+                if file_meta is None:
+                    filtered += 1
+                else:
+                    local_files.append(file_meta)
+            except (OSError, PermissionError) as e:
+                if verbose:
+                    print(f"  Warning: Cannot access {file_path}: {e}")
+        
+        return (local_files, skipped, filtered), subdirs
+    
+    partials, stats = walk_parallel(str(directory), visit, max_workers)
+    
+    files = []
+    skipped_count = 0
+    filtered_count = 0
+    for local_files, skipped, filtered in partials:
+        files.extend(local_files)
+        skipped_count += skipped
+        filtered_count += filtered
+    
+    stats.files = len(files)
+    if verbose:
+        print(f"Completed scan: {stats.summary()}")
+        if skipped_count > 0:
+            print(f"  Skipped {skipped_count} system/temporary files")
+        if filtered_count > 0:
+            print(f"  Filtered out {filtered_count} files and directories")
+    
+    return _collapse_hardlinks(files, verbose)
 
 
 def are_duplicates_by_category(file1: FileMetadata, file2: FileMetadata) -> bool:
@@ -251,22 +658,64 @@ def are_duplicates_by_category(file1: FileMetadata, file2: FileMetadata) -> bool
             file1.size == file2.size)
 
 
+# Strategy -> (key function returning (primary, secondary), match_type)
+_STRATEGY_KEYS: Dict[str, Tuple[Callable[[FileMetadata], Tuple], str]] = {
+    STRATEGY_NORMALIZED_NAME: (lambda f: (normalize_copy_name(f.name_lower), f.size), 'normalized_name'),
+    STRATEGY_SIZE_EXT: (lambda f: (os.path.splitext(f.name_lower)[1], f.size), 'size_ext'),
+    STRATEGY_SIZE_MTIME: (lambda f: (f.size, round(f.mtime)), 'size_mtime'),
+}
+
+
 def find_metadata_duplicates(
     files: List[FileMetadata], 
     verbose: bool = False,
-    use_categories: bool = True
+    use_categories: bool = True,
+    strategies: Sequence[str] = DEFAULT_MATCH_STRATEGIES
 ) -> Tuple[List[DuplicateGroup], List[FileMetadata]]:
     """
     Find duplicate files based on metadata with category-specific rules.
     
+    Each strategy buckets files by its own key:
+    
+    - ``name``: filename (case-insensitive) and size; size and mtime when
+      ``use_categories`` is False (match_type 'category_match' / 'exact')
+    - ``normalized-name``: filename without copy markers, and size
+      ('normalized_name')
+    - ``size-ext``: extension and size, for renamed copies ('size_ext')
+    - ``size-mtime``: size and modification time ('size_mtime')
+    
+    All keys are computed in a single pass over the files, so the cost is
+    O(n) however many files share a key. Files that share a bucket under
+    any strategy end up in one group (every strategy includes the size, so
+    groups never mix sizes); a group's match_type is that of the last, i.e.
+    least trusted, strategy that was needed to join it.
+    
     Args:
         files: List of file metadata
         verbose: Enable verbose output
         use_categories: Use category-specific duplicate detection
+        strategies: Key strategies from MATCH_STRATEGIES, most trusted first
         
     Returns:
         Tuple of (duplicate_groups, unique_files)
+    
+    Raises:
+        ValueError: If a strategy is unknown or none is given
     """
+    key_funcs = []
+    for strategy in strategies:
+        if strategy == STRATEGY_NAME:
+            if use_categories:
+                key_funcs.append((lambda f: (f.name_lower, f.size), 'category_match'))
+            else:
+                key_funcs.append((lambda f: (f.name_lower, (f.size, round(f.mtime))), 'exact'))
+        elif strategy in _STRATEGY_KEYS:
+            key_funcs.append(_STRATEGY_KEYS[strategy])
+        else:
+            raise ValueError(f"Unknown match strategy: {strategy!r} (choose from {', '.join(MATCH_STRATEGIES)})")
+    if not key_funcs:
+        raise ValueError("At least one match strategy is required")
+    
     start_time = time.time()
     
     if verbose:
@@ -280,70 +729,66 @@ def find_metadata_duplicates(
             for cat, count in category_counts.items():
                 print(f"  {cat.value}: {count} files")
     
-    # Group by filename (case-insensitive)
-    name_groups = defaultdict(list)
-    for file_meta in files:
-        name_groups[file_meta.name_lower].append(file_meta)
+    # One pass: every file goes into one bucket per strategy. Buckets are
+    # two-level (e.g. name, then size) and keep first-seen order, so with
+    # the name strategy alone groups come out in the order a pairwise scan
+    # of each name group with are_duplicates_by_category would produce.
+    buckets: List[Dict[object, Dict[object, List[int]]]] = [defaultdict(dict) for _ in key_funcs]
+    for index, file_meta in enumerate(files):
+        for (key_func, _), strategy_buckets in zip(key_funcs, buckets):
+            primary, secondary = key_func(file_meta)
+            strategy_buckets[primary].setdefault(secondary, []).append(index)
+    
+    # Union-find over file indices; each root remembers the last strategy
+    # that merged anything into its group
+    parent = list(range(len(files)))
+    strategy_of = [0] * len(files)
+    
+    def find(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+    
+    for strategy_index, strategy_buckets in enumerate(buckets):
+        for matches in strategy_buckets.values():
+            for indices in matches.values():
+                root = find(indices[0])
+                for index in indices[1:]:
+                    other = find(index)
+                    if other != root:
+                        parent[other] = root
+                        strategy_of[root] = strategy_index
+    
+    # Groups and unique files in the first strategy's bucket order
+    components: Dict[int, List[FileMetadata]] = {}
+    for matches in buckets[0].values():
+        for indices in matches.values():
+            for index in indices:
+                components.setdefault(find(index), []).append(files[index])
     
     duplicate_groups = []
     unique_files = []
-    
-    for name, file_list in name_groups.items():
-        if len(file_list) == 1:
-            # Unique filename
-            unique_files.extend(file_list)
-            continue
-        
-        if use_categories:
-            # Category-specific duplicate detection
-            processed = set()
-            
-            for i, file1 in enumerate(file_list):
-                if i in processed:
-                    continue
-                    
-                duplicates = [file1]
-                processed.add(i)
-                
-                for j, file2 in enumerate(file_list[i+1:], i+1):
-                    if j in processed:
-                        continue
-                    
-                    if are_duplicates_by_category(file1, file2):
-                        duplicates.append(file2)
-                        processed.add(j)
-                
-                if len(duplicates) > 1:
-                    duplicate_groups.append(DuplicateGroup(
-                        files=duplicates,
-                        match_type='category_match',
-                        category=duplicates[0].category
-                    ))
-                else:
-                    unique_files.append(file1)
+    for root, matching_files in components.items():
+        if len(matching_files) > 1:
+            duplicate_groups.append(DuplicateGroup(
+                files=matching_files,
+                match_type=key_funcs[strategy_of[root]][1],
+                category=matching_files[0].category
+            ))
         else:
-            # Original exact matching logic
-            size_time_groups = defaultdict(list)
-            
-            for file_meta in file_list:
-                # Create key from size and rounded mtime
-                key = (file_meta.size, round(file_meta.mtime))
-                size_time_groups[key].append(file_meta)
-            
-            for key, matching_files in size_time_groups.items():
-                if len(matching_files) > 1:
-                    duplicate_groups.append(DuplicateGroup(
-                        files=matching_files,
-                        match_type='exact',
-                        category=matching_files[0].category
-                    ))
-                else:
-                    unique_files.extend(matching_files)
+            unique_files.extend(matching_files)
     
     elapsed = time.time() - start_time
     if verbose:
         print(f"Analysis completed in {elapsed:.1f}s")
         print(f"Found {len(duplicate_groups)} duplicate groups")
+        if len(key_funcs) > 1:
+            match_counts = defaultdict(int)
+            for group in duplicate_groups:
+                match_counts[group.match_type] += 1
+            for match_type, count in match_counts.items():
+                print(f"  {match_type}: {count} groups")
     
     return duplicate_groups, unique_files
 
@@ -474,8 +919,15 @@ def format_duplicate_report(
         lines.append("")
         lines.append("⚡ PERFORMANCE")
         lines.append("-" * 20)
-        lines.append(f"   Detection method: Metadata only (name + size)")
-        lines.append(f"   No content hashing required")
+        if any(group.match_type == 'sampled_verified' for group in duplicate_groups):
+            lines.append(f"   Detection method: Metadata (name + size) + sampled content")
+            lines.append(f"   Head, middle and tail samples hashed per candidate")
+        elif any(group.match_type == 'media_match' for group in duplicate_groups):
+            lines.append(f"   Detection method: Metadata (name + size) + media headers")
+            lines.append(f"   EXIF and mvhd fields read from the first KB of photos and videos")
+        else:
+            lines.append(f"   Detection method: Metadata only (name + size)")
+            lines.append(f"   No content hashing required")
         if duplicate_groups:
             avg_group_size = duplicate_files / len(duplicate_groups)
             lines.append(f"   Average duplicates per group: {avg_group_size:.1f}")
@@ -487,7 +939,12 @@ def fast_find_duplicates(
     directory: Path,
     verbose: bool = False,
     quiet: bool = False,
-    use_categories: bool = True
+    use_categories: bool = True,
+    scan_workers: Optional[int] = None,
+    scan_filter: Optional[ScanFilter] = None,
+    one_file_system: bool = False,
+    symlinks: str = DEFAULT_SYMLINK_POLICY,
+    strategies: Sequence[str] = DEFAULT_MATCH_STRATEGIES
 ) -> Tuple[List[DuplicateGroup], List[FileMetadata]]:
     """
     Fast duplicate detection using metadata only with category-specific rules.
@@ -497,6 +954,11 @@ def fast_find_duplicates(
         verbose: Enable verbose output
         quiet: Suppress non-essential output
         use_categories: Use category-specific duplicate detection
+        scan_workers: List directories on this many threads (None for single-threaded)
+        scan_filter: Size limits and globs applied during traversal (optional)
+        one_file_system: Do not descend into directories on other devices
+        symlinks: Symlink policy for files: 'skip', 'follow-files' or 'follow-within-root'
+        strategies: Key strategies from MATCH_STRATEGIES, most trusted first
         
     Returns:
         Tuple of (duplicate_groups, unique_files)
@@ -508,7 +970,14 @@ def fast_find_duplicates(
         raise NotADirectoryError(f"Path is not a directory: {directory}")
     
     # Scan files
-    files = scan_files_metadata(directory, verbose and not quiet)
+    files = scan_files_metadata(
+        directory,
+        verbose and not quiet,
+        max_workers=scan_workers,
+        scan_filter=scan_filter,
+        one_file_system=one_file_system,
+        symlinks=symlinks
+    )
     
     if not files:
         if not quiet:
@@ -519,7 +988,8 @@ def fast_find_duplicates(
     duplicate_groups, unique_files = find_metadata_duplicates(
         files, 
         verbose and not quiet,
-        use_categories=use_categories
+        use_categories=use_categories,
+        strategies=strategies
     )
     
     return duplicate_groups, unique_files
\ No newline at end of file
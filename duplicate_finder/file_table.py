@@ -0,0 +1,285 @@
+"""
+Compact, array-backed storage for scanned files.
+"""
+
+import sys
+from array import array
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .scanner import FileRecord, to_file_record
+
+# Directory ID of the (virtual) parent of root directories
+NO_PARENT = -1
+
+
+class DirectoryTable:
+    """
+    Interned directory paths.
+
+    Each directory is stored once as (parent directory ID, name), so a tree
+    of millions of files costs one small entry per directory rather than a
+    full path per file.
+    """
+
+    def __init__(self):
+        self._parents = array('q')
+        self._names: List[str] = []
+        self._ids: Dict[Tuple[int, str], int] = {}
+        # Most files arrive grouped by directory
+        self._last: Optional[Tuple[Path, int]] = None
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def intern(self, directory: Path) -> int:
+        """Return the ID of ``directory``, adding it and its ancestors as needed."""
+        if self._last is not None and self._last[0] == directory:
+            return self._last[1]
+        parent_id = NO_PARENT
+        if directory.parent != directory:
+            parent_id = self.intern(directory.parent)
+            name = directory.name
+        else:
+            name = str(directory)
+        key = (parent_id, name)
+        dir_id = self._ids.get(key)
+        if dir_id is None:
+            dir_id = len(self._names)
+            self._ids[key] = dir_id
+            self._parents.append(parent_id)
+            self._names.append(name)
+        self._last = (directory, dir_id)
+        return dir_id
+
+    def parent(self, dir_id: int) -> int:
+        """ID of a directory's parent, or NO_PARENT for a root."""
+        return self._parents[dir_id]
+
+    def name(self, dir_id: int) -> str:
+        """Last component of a directory (the full path for a root)."""
+        return self._names[dir_id]
+
+    def depth(self, dir_id: int) -> int:
+        """Number of ancestors of a directory."""
+        depth = 0
+        while self._parents[dir_id] != NO_PARENT:
+            dir_id = self._parents[dir_id]
+            depth += 1
+        return depth
+
+    def ancestors(self, dir_id: int) -> Iterator[int]:
+        """Yield ``dir_id`` and then each of its ancestors up to the root."""
+        while dir_id != NO_PARENT:
+            yield dir_id
+            dir_id = self._parents[dir_id]
+
+    def path(self, dir_id: int) -> Path:
+        """Materialize the path of a directory."""
+        parts = []
+        while dir_id != NO_PARENT:
+            parts.append(self._names[dir_id])
+            dir_id = self._parents[dir_id]
+        return Path(*reversed(parts))
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used, in bytes."""
+        return (
+            self._parents.itemsize * len(self._parents)
+            + sum(sys.getsizeof(name) for name in self._names)
+            # Intern dict: entry plus key tuple
+            + len(self._ids) * (sys.getsizeof((0, '')) + 24)
+        )
+
+
+class FileTable:
+    """
+    Scanned files as parallel arrays indexed by integer file ID.
+
+    Size, device, inode and timestamps live in ``array`` columns and each
+    path is stored as (directory ID, name) against an interned
+    DirectoryTable. Detection stages pass file IDs around and materialize
+    Path objects only for the files they actually open or report.
+    """
+
+    def __init__(self):
+        self.dirs = DirectoryTable()
+        self.dir_ids = array('Q')
+        self.names: List[str] = []
+        self.sizes = array('Q')
+        self.st_dev = array('Q')
+        self.st_ino = array('Q')
+        # Timestamps can predate the epoch
+        self.mtime_ns = array('q')
+        self.ctime_ns = array('q')
+
+    @classmethod
+    def from_items(cls, items: Iterable[Union[Path, FileRecord]]) -> 'FileTable':
+        """Build a table from FileRecords or paths (bare paths are stat'ed once)."""
+        table = cls()
+        for item in items:
+            record = to_file_record(item)
+            if record is not None:
+                table.add(record)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, record: FileRecord) -> int:
+        """Append a file and return its ID."""
+        file_id = len(self.names)
+        self.dir_ids.append(self.dirs.intern(record.path.parent))
+        self.names.append(record.path.name)
+        self.sizes.append(record.size)
+        self.st_dev.append(record.st_dev)
+        self.st_ino.append(record.st_ino)
+        self.mtime_ns.append(record.mtime_ns)
+        self.ctime_ns.append(record.ctime_ns)
+        return file_id
+
+    def path(self, file_id: int) -> Path:
+        """Materialize the path of a file."""
+        return self.dirs.path(self.dir_ids[file_id]) / self.names[file_id]
+
+    def paths(self, file_ids: Optional[Iterable[int]] = None) -> List[Path]:
+        """Materialize paths for ``file_ids`` (all files when None)."""
+        if file_ids is None:
+            file_ids = range(len(self))
+        return [self.path(file_id) for file_id in file_ids]
+
+    def record(self, file_id: int) -> FileRecord:
+        """Rebuild the FileRecord of a file, e.g. as a hash cache key."""
+        return FileRecord(
+            path=self.path(file_id),
+            size=self.sizes[file_id],
+            mtime_ns=self.mtime_ns[file_id],
+            st_dev=self.st_dev[file_id],
+            st_ino=self.st_ino[file_id],
+            ctime_ns=self.ctime_ns[file_id]
+        )
+
+    def group_by_size(self) -> Tuple[Dict[int, array], array]:
+        """
+        Split file IDs by size.
+
+        Returns:
+            Tuple of (size -> IDs for sizes shared by 2+ files, IDs unique by size)
+        """
+        order = sorted(range(len(self)), key=self.sizes.__getitem__)
+        groups: Dict[int, array] = {}
+        unique = array('Q')
+        start = 0
+        while start < len(order):
+            size = self.sizes[order[start]]
+            end = start + 1
+            while end < len(order) and self.sizes[order[end]] == size:
+                end += 1
+            if end - start > 1:
+                # Keep scan order within a group
+                groups[size] = array('Q', sorted(order[start:end]))
+            else:
+                unique.append(order[start])
+            start = end
+        return groups, unique
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used, in bytes."""
+        columns = (self.dir_ids, self.sizes, self.st_dev, self.st_ino, self.mtime_ns, self.ctime_ns)
+        return (
+            sum(column.itemsize * len(column) for column in columns)
+            + sum(sys.getsizeof(name) + 8 for name in self.names)
+            + self.dirs.nbytes
+        )
+
+
+class DigestColumn:
+    """
+    Fixed-width digests indexed by file ID.
+
+    All digests share one bytearray, ``width`` raw bytes per file, plus a
+    presence flag per file. Hex digests are packed to raw bytes on the way
+    in, so the column costs the same whatever the digest representation.
+    """
+
+    def __init__(self, file_count: int, width: int):
+        """
+        Args:
+            file_count: Number of files in the table
+            width: Raw digest size in bytes
+        """
+        self.width = width
+        self._data = bytearray(file_count * width)
+        self._present = bytearray(file_count)
+
+    def __setitem__(self, file_id: int, digest: Union[bytes, str]) -> None:
+        raw = digest if isinstance(digest, bytes) else bytes.fromhex(digest)
+        if len(raw) != self.width:
+            raise ValueError(f"Digest of {len(raw)} bytes in a {self.width}-byte column")
+        start = file_id * self.width
+        self._data[start:start + self.width] = raw
+        self._present[file_id] = 1
+
+    def __contains__(self, file_id: int) -> bool:
+        return bool(self._present[file_id])
+
+    def get(self, file_id: int) -> Optional[bytes]:
+        """Raw digest of a file, or None if it has none."""
+        if not self._present[file_id]:
+            return None
+        start = file_id * self.width
+        return bytes(self._data[start:start + self.width])
+
+    def discard(self, file_id: int) -> None:
+        """Forget a file's digest."""
+        self._present[file_id] = 0
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used, in bytes."""
+        return len(self._data) + len(self._present)
+
+
+class TablePaths(Sequence):
+    """
+    Read-only sequence of file IDs that materializes each path on access.
+
+    Detection results hold these instead of path lists, so paths are only
+    built when the report is printed. Compares equal to any sequence with
+    the same paths.
+    """
+
+    def __init__(self, table: FileTable, file_ids: Optional[Iterable[int]] = None):
+        self.table = table
+        self.ids = range(len(table)) if file_ids is None else file_ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return TablePaths(self.table, self.ids[index])
+        return self.table.path(self.ids[index])
+
+    def __iter__(self) -> Iterator[Path]:
+        for file_id in self.ids:
+            yield self.table.path(file_id)
+
+    def with_sizes(self) -> Iterator[Tuple[Path, int]]:
+        """Yield (path, size) per file, sizes from the table's column."""
+        sizes = self.table.sizes
+        for file_id in self.ids:
+            yield self.table.path(file_id), sizes[file_id]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Sequence) and not isinstance(other, (str, bytes)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"TablePaths({list(self)!r})"
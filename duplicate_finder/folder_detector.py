@@ -2,9 +2,13 @@
 
 import hashlib
 from pathlib import Path
-from typing import Dict, List, Set, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 from collections import defaultdict
 
+from .hasher import DigestKey, digest_bytes, digest_hex
+from .scanner import FileRecord
+from .file_table import NO_PARENT, DigestColumn, FileTable
+
 
 class FolderFingerprint:
     """Represents a folder's fingerprint for duplicate detection."""
@@ -21,6 +25,15 @@ class FolderFingerprint:
         return f"FolderFingerprint({self.folder_path}, files={self.file_count}, size={self.total_size})"
 
 
+class FolderGroup(list):
+    """A group of duplicate folders, with the file count and size of each one."""
+    
+    def __init__(self, folders: Iterable[Any] = (), file_count: int = 0, total_size: int = 0):
+        super().__init__(folders)
+        self.file_count = file_count
+        self.total_size = total_size
+
+
 def create_folder_fingerprint(folder_path: Path, all_files: List[Path]) -> FolderFingerprint:
     """Create a fingerprint for a folder based on its files."""
     fingerprint = FolderFingerprint(folder_path)
@@ -59,50 +72,330 @@ def create_folder_fingerprint(folder_path: Path, all_files: List[Path]) -> Folde
     return fingerprint
 
 
-def find_duplicate_folders(all_files: List[Path], file_hashes: Dict[Path, str]) -> List[List[Path]]:
-    """Find folders that are complete duplicates of each other."""
-    
-    # Get all directories from the file list
-    directories = set()
-    for file_path in all_files:
+def _item_path(item: Union[Path, FileRecord]) -> Path:
+    """Path of a scanned file given as a path or a FileRecord."""
+    return item.path if isinstance(item, FileRecord) else item
+
+
+def _stat_size(file_path: Path) -> Optional[int]:
+    """Size of a regular file, or None if it is not one (fallback when sizes are not supplied)."""
+    try:
         if file_path.is_file():
-            # Add all parent directories
-            current = file_path.parent
-            while current != current.parent:  # Stop at filesystem root
-                directories.add(current)
-                current = current.parent
-    
-    directories = list(directories)
-    
-    # Create fingerprints for all directories
-    fingerprints = []
-    for directory in directories:
-        fingerprint = create_folder_fingerprint(directory, all_files)
-        if fingerprint.file_count > 0:  # Only consider non-empty folders
-            fingerprints.append(fingerprint)
-    
-    # Group by structure hash first (quick elimination)
-    structure_groups = defaultdict(list)
-    for fingerprint in fingerprints:
-        structure_groups[fingerprint.structure_hash].append(fingerprint)
+            return file_path.stat().st_size
+    except OSError:
+        pass
+    return None
+
+
+class _PathTree:
+    """Folders of scanned paths or FileRecords, keyed by path."""
+    
+    def __init__(self, all_files, file_hashes, file_sizes=None):
+        self.all_files = all_files
+        self.file_hashes = file_hashes or {}
+        self.file_sizes = file_sizes
+    
+    def files(self) -> Iterator[Tuple[Any, Path, str, int, Optional[DigestKey]]]:
+        """Yield (item, folder, name, size, digest or None) per file with a known size."""
+        for item in self.all_files:
+            if isinstance(item, FileRecord):
+                file_path, size = item.path, item.size
+            else:
+                file_path = item
+                size = self.file_sizes.get(file_path) if self.file_sizes is not None else _stat_size(file_path)
+            if size is not None:
+                yield item, file_path.parent, file_path.name, size, self.file_hashes.get(file_path)
+    
+    def items(self) -> Iterable[Union[Path, FileRecord]]:
+        return self.all_files
+    
+    def key(self, item) -> Path:
+        return _item_path(item)
+    
+    def folder_of(self, item) -> Path:
+        return _item_path(item).parent
+    
+    def parent(self, folder: Path) -> Optional[Path]:
+        return None if folder == folder.parent else folder.parent
+    
+    def depth(self, folder: Path) -> int:
+        return len(folder.parts)
+    
+    def name(self, folder: Path) -> str:
+        return folder.name
+    
+    def path(self, folder: Path) -> Path:
+        return folder
+
+
+class _TableTree:
+    """Folders of a FileTable, keyed by interned directory ID; files are file IDs."""
+    
+    def __init__(self, table: FileTable, digests: Optional[DigestColumn] = None):
+        self.table = table
+        self.dirs = table.dirs
+        self.file_hashes = digests
+    
+    def files(self) -> Iterator[Tuple[int, int, str, int, Optional[bytes]]]:
+        table, digests = self.table, self.file_hashes
+        for file_id in range(len(table)):
+            digest = digests.get(file_id) if digests is not None else None
+            yield file_id, table.dir_ids[file_id], table.names[file_id], table.sizes[file_id], digest
+    
+    def items(self) -> Iterable[int]:
+        return range(len(self.table))
+    
+    def key(self, file_id: int) -> int:
+        return file_id
+    
+    def folder_of(self, file_id: int) -> int:
+        return self.table.dir_ids[file_id]
+    
+    def parent(self, dir_id: int) -> Optional[int]:
+        parent = self.dirs.parent(dir_id)
+        return None if parent == NO_PARENT else parent
+    
+    def depth(self, dir_id: int) -> int:
+        return self.dirs.depth(dir_id)
+    
+    def name(self, dir_id: int) -> str:
+        return self.dirs.name(dir_id)
+    
+    def path(self, dir_id: int) -> Path:
+        return self.dirs.path(dir_id)
+
+
+def _folder_tree(all_files, file_hashes=None, file_sizes=None):
+    """
+    View of the scanned files as a folder tree.
+    
+    A FileTable (with a DigestColumn for digests) is read through its
+    columns and interned directories, so folders are directory IDs and
+    files are file IDs; anything else is a collection of paths or
+    FileRecords keyed by path.
+    """
+    if isinstance(all_files, FileTable):
+        return _TableTree(all_files, file_hashes)
+    return _PathTree(all_files, file_hashes, file_sizes)
+
+
+def _ancestors(tree, folder) -> Iterator[Any]:
+    """Yield ``folder`` and then each of its ancestors up to the root."""
+    while folder is not None:
+        yield folder
+        folder = tree.parent(folder)
+
+
+def build_folder_fingerprints(
+    all_files: Union[Iterable[Union[Path, FileRecord]], FileTable],
+    file_hashes: Union[Dict[Path, str], DigestColumn, None],
+    file_sizes: Optional[Dict[Path, int]] = None
+) -> Dict[Any, FolderFingerprint]:
+    """
+    Fingerprint every folder in a single bottom-up (Merkle) pass.
+    
+    Each folder's structure hash is derived from its files' names and sizes
+    and its subfolders' structure hashes; the content hash likewise from file
+    digests and subfolder content hashes. Two folders therefore get equal
+    hashes exactly when their recursive (relative path, size/digest) sets
+    match, without ever listing a folder's descendants.
+    
+    A folder whose subtree contains a file without a digest gets
+    content_hash None and cannot be matched.
+    
+    Args:
+        all_files: All scanned files (FileRecords carry their own size), or
+            a FileTable, in which case folders are keyed by directory ID
+        file_hashes: Full digest per file (a DigestColumn for a FileTable)
+        file_sizes: Size per file from earlier stages; when given, no
+            filesystem calls are made
+        
+    Returns:
+        Dictionary mapping folder (path or directory ID) to its fingerprint
+    """
+    return _fingerprint_tree(_folder_tree(all_files, file_hashes, file_sizes))
+
+
+def _fingerprint_tree(tree) -> Dict[Any, FolderFingerprint]:
+    folder_files: Dict[Any, List[Tuple[str, int, Optional[DigestKey]]]] = defaultdict(list)
+    folder_subdirs: Dict[Any, Set[Any]] = defaultdict(set)
+    
+    for _, parent, name, size, digest in tree.files():
+        folder_files[parent].append((name, size, digest))
+        
+        # Link the ancestor chain until it joins an already-known branch
+        child = parent
+        grandparent = tree.parent(child)
+        while grandparent is not None:
+            if child in folder_subdirs[grandparent]:
+                break
+            folder_subdirs[grandparent].add(child)
+            child, grandparent = grandparent, tree.parent(grandparent)
+    
+    all_folders = set(folder_files) | set(folder_subdirs)
+    fingerprints: Dict[Any, FolderFingerprint] = {}
     
-    # For each structure group, verify content is identical
-    duplicate_groups = []
-    for structure_hash, group in structure_groups.items():
-        if len(group) < 2:
+    # Deepest folders first so children are always fingerprinted before parents
+    for folder in sorted(all_folders, key=tree.depth, reverse=True):
+        entries = []
+        for name, size, digest in folder_files.pop(folder, ()):
+            entries.append((name, 'f', size, digest, 1, None))
+        for subdir in folder_subdirs.get(folder, ()):
+            child_fp = fingerprints[subdir]
+            entries.append((tree.name(subdir), 'd', child_fp.structure_hash, child_fp.content_hash, child_fp.file_count, subdir))
+        # Names are unique within a folder, so the sort never compares keys
+        entries.sort(key=lambda entry: entry[:2])
+        
+        fingerprint = FolderFingerprint(folder)
+        structure = hashlib.sha256()
+        content = hashlib.sha256()
+        content_complete = True
+        for name, kind, structure_part, content_part, count, subdir in entries:
+            structure.update(f"{kind}\0{name}\0{structure_part}\0".encode('utf-8', 'surrogateescape'))
+            if content_part is None:
+                content_complete = False
+            else:
+                content.update(f"{kind}\0{name}\0".encode('utf-8', 'surrogateescape'))
+                # File digests may be raw bytes; feed them in without formatting
+                content.update(digest_bytes(content_part))
+                content.update(b"\0")
+            fingerprint.file_count += count
+            if kind == 'f':
+                fingerprint.total_size += structure_part
+            else:
+                fingerprint.total_size += fingerprints[subdir].total_size
+        
+        fingerprint.structure_hash = structure.hexdigest()
+        fingerprint.content_hash = content.hexdigest() if content_complete else None
+        fingerprints[folder] = fingerprint
+    
+    return fingerprints
+
+
+def find_duplicate_folders(
+    all_files: Union[Iterable[Union[Path, FileRecord]], FileTable],
+    file_hashes: Union[Dict[Path, str], DigestColumn],
+    file_sizes: Optional[Dict[Path, int]] = None
+) -> List[FolderGroup]:
+    """
+    Find folders that are complete duplicates of each other.
+    
+    Args:
+        all_files: All scanned files, or a FileTable
+        file_hashes: Full digest per file (a DigestColumn for a FileTable)
+        file_sizes: Size per file from earlier stages (avoids re-stating)
+        
+    Returns:
+        Groups of duplicate folders, each sorted by path, ordered by first
+        path; folders are directory IDs for a FileTable. Each group carries
+        the file count and total size of one of its folders.
+    """
+    tree = _folder_tree(all_files, file_hashes, file_sizes)
+    fingerprints = _fingerprint_tree(tree)
+    
+    # Group by structure first, then verify content matches
+    groups = defaultdict(list)
+    for folder, fingerprint in fingerprints.items():
+        if tree.parent(folder) is None:
+            # The filesystem root is never reported
             continue
+        if fingerprint.file_count > 0 and fingerprint.content_hash is not None:
+            groups[(fingerprint.structure_hash, fingerprint.content_hash)].append(folder)
+    
+    # Only the reported folders need their paths, to order them
+    path_groups = [
+        sorted((tree.path(folder), folder) for folder in group)
+        for group in groups.values() if len(group) >= 2
+    ]
+    return [
+        FolderGroup(
+            (folder for _, folder in group),
+            fingerprints[group[0][1]].file_count,
+            fingerprints[group[0][1]].total_size
+        )
+        for group in sorted(path_groups)
+    ]
+
+
+def find_structure_collisions(
+    all_files: Union[Iterable[Union[Path, FileRecord]], FileTable],
+    file_sizes: Optional[Dict[Path, int]] = None,
+    known_unique: Optional[Iterable[Any]] = None
+) -> Set[Any]:
+    """
+    Find folders that could still be duplicates, using metadata only.
+    
+    A folder qualifies if its structure hash (relative paths + sizes)
+    matches at least one other folder and none of its files is already
+    known to be unique. A size-unique file can never have a counterpart in
+    a structurally identical folder, so such folders drop out here too.
+    
+    Args:
+        all_files: All scanned files, or a FileTable
+        file_sizes: Size per file from earlier stages (avoids re-stating)
+        known_unique: Files (file IDs for a FileTable) proven to have no
+            duplicate anywhere in the tree
         
-        # Verify that all files in these folders have identical content
-        verified_groups = verify_folder_content_identical(group, file_hashes)
-        duplicate_groups.extend(verified_groups)
+    Returns:
+        Set of candidate folders (directory IDs for a FileTable)
+    """
+    tree = _folder_tree(all_files, None, file_sizes)
+    return _structure_collisions(tree, known_unique)
+
+
+def _structure_collisions(tree, known_unique: Optional[Iterable[Any]]) -> Set[Any]:
+    fingerprints = _fingerprint_tree(tree)
+    
+    # A unique file rules out every folder that contains it
+    excluded: Set[Any] = set()
+    for item in known_unique or ():
+        for ancestor in _ancestors(tree, tree.folder_of(item)):
+            if ancestor in excluded:
+                break
+            excluded.add(ancestor)
+    
+    structure_groups = defaultdict(list)
+    for folder, fingerprint in fingerprints.items():
+        if tree.parent(folder) is None or folder in excluded:
+            continue
+        structure_groups[fingerprint.structure_hash].append(folder)
     
-    # Convert fingerprints back to folder paths
-    result = []
-    for group in duplicate_groups:
-        folder_paths = [fp.folder_path for fp in group]
-        result.append(folder_paths)
+    return {folder for group in structure_groups.values() if len(group) >= 2 for folder in group}
+
+
+def select_files_for_folder_hashing(
+    all_files: Union[Iterable[Union[Path, FileRecord]], FileTable],
+    file_hashes: Union[Dict[Path, str], DigestColumn],
+    file_sizes: Optional[Dict[Path, int]] = None,
+    known_unique: Optional[Iterable[Any]] = None
+) -> List[Any]:
+    """
+    Select the files that must be full-hashed before folders can be compared.
     
-    return result
+    Only files inside structurally colliding candidate folders (see
+    find_structure_collisions) that do not have a digest yet are returned,
+    as the same items (paths or FileRecords, or file IDs for a FileTable)
+    they were given as.
+    
+    Args:
+        all_files: All scanned files, or a FileTable
+        file_hashes: Digests already computed (a DigestColumn for a FileTable)
+        file_sizes: Size per file from earlier stages (avoids re-stating)
+        known_unique: Files proven to have no duplicate anywhere in the tree
+        
+    Returns:
+        List of files to hash
+    """
+    tree = _folder_tree(all_files, None, file_sizes)
+    candidates = _structure_collisions(tree, known_unique)
+    if not candidates:
+        return []
+    
+    return [
+        item for item in tree.items()
+        if tree.key(item) not in file_hashes
+        and any(ancestor in candidates for ancestor in _ancestors(tree, tree.folder_of(item)))
+    ]
 
 
 def verify_folder_content_identical(fingerprints: List[FolderFingerprint], file_hashes: Dict[Path, str]) -> List[List[FolderFingerprint]]:
@@ -134,7 +427,7 @@ def calculate_folder_content_hash(fingerprint: FolderFingerprint, file_hashes: D
         full_path = fingerprint.folder_path / rel_path_str
         file_hash = file_hashes.get(full_path)
         if file_hash:
-            file_content_pairs.append(f"{rel_path_str}:{file_hash}")
+            file_content_pairs.append(f"{rel_path_str}:{digest_hex(file_hash)}")
         else:
             # If we don't have a hash for this file, we can't reliably compare
             return None
@@ -155,19 +448,25 @@ def is_folder_duplicate(folder_path: Path, duplicate_folders: List[List[Path]])
     return False
 
 
-def get_files_in_duplicate_folders(duplicate_folders: List[List[Path]], all_files: List[Path]) -> Set[Path]:
-    """Get all files that are contained within duplicate folders."""
+def get_files_in_duplicate_folders(
+    duplicate_folders: List[List[Any]],
+    all_files: Union[Iterable[Union[Path, FileRecord]], FileTable]
+) -> Set[Any]:
+    """Get all files (paths, or file IDs for a FileTable) contained within duplicate folders."""
     duplicate_folder_set = set()
     for group in duplicate_folders:
         duplicate_folder_set.update(group)
     
     files_in_duplicate_folders = set()
-    for file_path in all_files:
-        if file_path.is_file():
-            # Check if this file is within any duplicate folder
-            for duplicate_folder in duplicate_folder_set:
-                if file_path.is_relative_to(duplicate_folder):
-                    files_in_duplicate_folders.add(file_path)
-                    break
+    if not duplicate_folder_set:
+        return files_in_duplicate_folders
+    
+    tree = _folder_tree(all_files)
+    for item in tree.items():
+        # Check if any ancestor of this file is a duplicate folder
+        for ancestor in _ancestors(tree, tree.folder_of(item)):
+            if ancestor in duplicate_folder_set:
+                files_in_duplicate_folders.add(tree.key(item))
+                break
     
-    return files_in_duplicate_folders
\ No newline at end of file
+    return files_in_duplicate_folders
@@ -2,9 +2,14 @@
 Output formatting for duplicate detection results.
 """
 
+import heapq
 import json
 from pathlib import Path
-from typing import Dict, List
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .hasher import digest_hex
+from .coverage import Coverage, STOP_TOP, STOP_TIME_BUDGET
 
 
 def _format_file_size(size: int) -> str:
@@ -19,13 +24,73 @@ def _format_file_size(size: int) -> str:
         return f"{size / (1024 * 1024 * 1024):.1f} GB"
 
 
-def _get_file_info(file_path: Path) -> tuple[int, str]:
-    """Get file size and formatted size string."""
-    try:
-        size = file_path.stat().st_size
-        return size, _format_file_size(size)
-    except OSError:
-        return 0, "unknown size"
+def _get_file_info(file_path: Path, size: Optional[int] = None) -> tuple[int, str]:
+    """Get file size and formatted size string; stats only when size is not known."""
+    if size is None:
+        try:
+            size = file_path.stat().st_size
+        except OSError:
+            return 0, "unknown size"
+    return size, _format_file_size(size)
+
+
+def _with_sizes(files: Iterable[Path]) -> Iterator[Tuple[Path, Optional[int]]]:
+    """Pair each file with the size recorded at scan time, or None if unknown."""
+    # Detector results (TablePaths, FileSpool) carry the scanned sizes
+    with_sizes = getattr(files, 'with_sizes', None)
+    if with_sizes is not None:
+        return with_sizes()
+    return ((file_path, None) for file_path in files)
+
+
+def _first_file_info(file_list: Sequence[Path]) -> tuple[int, str]:
+    """Size of the first file of a group (all duplicates have the same size)."""
+    for file_path, size in _with_sizes(file_list[:1]):
+        return _get_file_info(file_path, size)
+    return 0, "unknown size"
+
+
+def _file_entry(file_path: Path, size: Optional[int]) -> dict:
+    """JSON entry of one file; stats only when size is not known."""
+    if size is None:
+        try:
+            size = file_path.stat().st_size
+        except OSError:
+            return {
+                "path": str(file_path),
+                "size": 0,
+                "size_formatted": "unknown"
+            }
+    return {
+        "path": str(file_path),
+        "size": size,
+        "size_formatted": _format_file_size(size)
+    }
+
+
+def _folder_info(folder_group: List[Path]) -> tuple[int, int]:
+    """File count and total size of one folder of a duplicate folder group."""
+    # Groups from the detector carry the totals of their fingerprints
+    if hasattr(folder_group, 'total_size'):
+        return folder_group.file_count, folder_group.total_size
+    
+    for folder_path in folder_group:
+        folder_size = 0
+        folder_files = 0
+        try:
+            for item in folder_path.rglob("*"):
+                try:
+                    if item.is_file():
+                        folder_size += item.stat().st_size
+                        folder_files += 1
+                except (PermissionError, FileNotFoundError, OSError):
+                    # Skip files we can't access but continue counting others
+                    continue
+            # We only need to calculate once since all folders are identical
+            return folder_files, folder_size
+        except (PermissionError, OSError):
+            continue
+    return 0, 0
 
 
 def _calculate_space_savings(duplicates: Dict[str, List[Path]]) -> tuple[int, int]:
@@ -35,18 +100,52 @@ def _calculate_space_savings(duplicates: Dict[str, List[Path]]) -> tuple[int, in
     
     for file_list in duplicates.values():
         if len(file_list) > 1:
-            # Get size of first file (all duplicates have same size)
-            try:
-                file_size = file_list[0].stat().st_size
-                total_duplicate_size += file_size * len(file_list)
-                potential_savings += file_size * (len(file_list) - 1)
-            except OSError:
-                pass
+            # Get size of first file (all duplicates have same size);
+            # hardlinks were collapsed at scan time, so every path is a copy
+            file_size, _ = _first_file_info(file_list)
+            total_duplicate_size += file_size * len(file_list)
+            potential_savings += file_size * (len(file_list) - 1)
     
     return total_duplicate_size, potential_savings
 
 
-def format_output(duplicates: Dict[str, List[Path]], unique_files: List[Path], duplicate_folders: List[List[Path]] = None, quiet: bool = False) -> None:
+def _linked_groups(
+    linked_files: Optional[Dict[Path, List[Path]]],
+    linked_sizes: Optional[Dict[Path, int]] = None
+) -> List[Tuple[List[Path], Optional[int]]]:
+    """Turn canonical path -> other names into sorted groups of all names, with the scanned size."""
+    if not linked_files:
+        return []
+    linked_sizes = linked_sizes or {}
+    return sorted(
+        (sorted([canonical] + others), linked_sizes.get(canonical))
+        for canonical, others in linked_files.items()
+    )
+
+
+def _format_coverage(coverage: Coverage) -> List[str]:
+    """Lines of the coverage section of a --top / --time-budget run."""
+    if coverage.stop_reason == STOP_TOP:
+        status = f"Stopped after confirming the top {coverage.top:,} duplicate groups"
+    elif coverage.stop_reason == STOP_TIME_BUDGET:
+        status = f"Stopped when the {coverage.time_budget:g}s time budget ran out"
+    else:
+        status = "All candidate size groups were checked"
+    lines = [
+        f"{status} ({coverage.elapsed_seconds:.1f}s)",
+        f"Size groups checked: {coverage.groups_checked:,} of {coverage.groups_total:,} "
+        f"({coverage.files_checked:,} of {coverage.files_total:,} files)",
+        f"Candidate bytes verified: {_format_file_size(coverage.bytes_checked)} of {_format_file_size(coverage.bytes_total)}",
+        f"Candidate bytes left unverified: {_format_file_size(coverage.bytes_unverified)}"
+    ]
+    if coverage.top is not None and coverage.groups_found > coverage.top:
+        lines.append(f"Showing the top {coverage.top:,} of {coverage.groups_found:,} duplicate groups found")
+    if not coverage.complete:
+        lines.append("Files in unchecked size groups are listed neither as duplicates nor as unique")
+    return lines
+
+
+def format_output(duplicates: Dict[str, List[Path]], unique_files: List[Path], duplicate_folders: List[List[Path]] = None, quiet: bool = False, linked_files: Optional[Dict[Path, List[Path]]] = None, coverage: Optional[Coverage] = None, linked_sizes: Optional[Dict[Path, int]] = None) -> None:
     """
     Format and print the results with enhanced grouping and statistics.
     
@@ -54,7 +153,14 @@ def format_output(duplicates: Dict[str, List[Path]], unique_files: List[Path], d
         duplicates: Dictionary mapping hash to list of duplicate files
         unique_files: List of unique files
         duplicate_folders: List of duplicate folder groups (optional)
+        linked_files: Scanned path -> hardlinks to the same file (optional)
+        coverage: What a --top / --time-budget run checked (optional)
+        linked_sizes: Size per linked_files key, from the scan (optional)
+    
+    Sizes come from the scan records the detector results carry; files
+    are only stat'ed when handed over as plain paths.
     """
+    linked_groups = _linked_groups(linked_files, linked_sizes)
     if duplicate_folders is None:
         duplicate_folders = []
     
@@ -65,28 +171,7 @@ def format_output(duplicates: Dict[str, List[Path]], unique_files: List[Path], d
         print("=" * 60)
         
         for group_num, folder_group in enumerate(duplicate_folders, 1):
-            # Calculate total size of folder
-            total_size = 0
-            file_count = 0
-            
-            for folder_path in folder_group:
-                folder_size = 0
-                folder_files = 0
-                try:
-                    for item in folder_path.rglob("*"):
-                        try:
-                            if item.is_file():
-                                size = item.stat().st_size
-                                folder_size += size
-                                folder_files += 1
-                        except (PermissionError, FileNotFoundError, OSError):
-                            # Skip files we can't access but continue counting others
-                            continue
-                    total_size = folder_size  # All folders should have same size
-                    file_count = folder_files  # All folders should have same file count
-                    break  # We only need to calculate once since all folders are identical
-                except (PermissionError, OSError):
-                    continue
+            file_count, total_size = _folder_info(folder_group)
             
             print(f"\n📂 GROUP {group_num}: {len(folder_group)} identical folders")
             print(f"   Files per folder: {file_count:,}")
@@ -108,28 +193,42 @@ def format_output(duplicates: Dict[str, List[Path]], unique_files: List[Path], d
         
         # Sort duplicate groups by size (largest first) for better visibility
         sorted_duplicates = sorted(
-            duplicates.items(),
-            key=lambda x: _get_file_info(x[1][0])[0],
+            ((hash_value, file_list, _first_file_info(file_list)) for hash_value, file_list in duplicates.items()),
+            key=lambda x: x[2][0],
             reverse=True
         )
         
-        for group_num, (hash_value, file_list) in enumerate(sorted_duplicates, 1):
-            file_size, size_str = _get_file_info(file_list[0])
+        for group_num, (hash_value, file_list, (file_size, size_str)) in enumerate(sorted_duplicates, 1):
             
             print(f"\n📁 GROUP {group_num}: {len(file_list)} identical files ({size_str} each)")
-            print(f"   Hash: {hash_value[:16]}...")
+            print(f"   Hash: {digest_hex(hash_value)[:16]}...")
             
             # Sort files by path for consistent display
             for file_path in sorted(file_list):
                 print(f"   • {file_path}")
             
             # Show space that could be saved for this group
-            if file_size > 0 and len(file_list) > 1:
+            if file_size > 0:
                 savings = file_size * (len(file_list) - 1)
                 print(f"   💾 Potential space savings: {_format_file_size(savings)}")
     else:
         print("\n✅ No duplicate files found.")
     
+    # Hardlinks are not duplicates: they already share one copy on disk
+    if linked_groups:
+        print("\n" + "=" * 60)
+        print("🔗 ALREADY LINKED FILES")
+        print("=" * 60)
+        print(f"{len(linked_groups):,} files are reachable through more than one path (no space to reclaim)")
+        
+        for group_num, (link_group, size) in enumerate(linked_groups[:20], 1):
+            size, size_str = _get_file_info(link_group[0], size)
+            print(f"\n🔗 LINK {group_num}: {len(link_group)} paths to one file ({size_str})")
+            for file_path in link_group:
+                print(f"   • {file_path}")
+        if len(linked_groups) > 20:
+            print(f"\n   ... and {len(linked_groups) - 20:,} more linked files")
+    
     # Unique files section (condensed)
     print(f"\n" + "=" * 60)
     print("📄 UNIQUE FILES")
@@ -140,19 +239,28 @@ def format_output(duplicates: Dict[str, List[Path]], unique_files: List[Path], d
         
         if len(unique_files) <= 20:
             # Show all files if not too many
-            for file_path in sorted(unique_files):
-                size, size_str = _get_file_info(file_path)
+            for file_path, size in sorted(_with_sizes(unique_files), key=itemgetter(0)):
+                size, size_str = _get_file_info(file_path, size)
                 print(f"   • {file_path} ({size_str})")
         else:
             # Show sample of unique files
             print("Sample of unique files:")
-            for file_path in sorted(unique_files)[:10]:
-                size, size_str = _get_file_info(file_path)
+            # Only the first few are needed, so avoid sorting every path
+            for file_path, size in heapq.nsmallest(10, _with_sizes(unique_files), key=itemgetter(0)):
+                size, size_str = _get_file_info(file_path, size)
                 print(f"   • {file_path} ({size_str})")
             print(f"   ... and {len(unique_files) - 10:,} more unique files")
     else:
         print("No unique files found.")
     
+    # Budgeted runs say how much they left unchecked
+    if coverage is not None:
+        print(f"\n" + "=" * 60)
+        print("📏 COVERAGE")
+        print("=" * 60)
+        for line in _format_coverage(coverage):
+            print(line)
+    
     # Enhanced summary with space analysis
     print(f"\n" + "=" * 60)
     print("📊 SUMMARY STATISTICS")
@@ -167,19 +275,8 @@ def format_output(duplicates: Dict[str, List[Path]], unique_files: List[Path], d
     folder_savings = 0
     for folder_group in duplicate_folders:
         if len(folder_group) > 1:
-            # Calculate size of one folder
-            try:
-                folder_size = 0
-                for item in folder_group[0].rglob("*"):
-                    try:
-                        if item.is_file():
-                            folder_size += item.stat().st_size
-                    except (PermissionError, FileNotFoundError, OSError):
-                        # Skip files we can't access but continue counting others
-                        continue
-                folder_savings += folder_size * (len(folder_group) - 1)
-            except (PermissionError, OSError):
-                pass
+            _, folder_size = _folder_info(folder_group)
+            folder_savings += folder_size * (len(folder_group) - 1)
     
     print(f"📁 Total files scanned: {total_files:,}")
     print(f"👥 Duplicate files: {duplicate_count:,}")
@@ -187,6 +284,8 @@ def format_output(duplicates: Dict[str, List[Path]], unique_files: List[Path], d
     print(f"🔗 Duplicate file groups: {len(duplicates):,}")
     print(f"📂 Duplicate folders: {folder_duplicate_count:,}")
     print(f"🗂️  Duplicate folder groups: {len(duplicate_folders):,}")
+    if linked_groups:
+        print(f"🔗 Already linked files: {len(linked_groups):,} ({sum(len(g) for g, _ in linked_groups):,} paths)")
     
     if duplicates or duplicate_folders:
         print(f"\n💾 Space Analysis:")
@@ -210,7 +309,7 @@ def format_output(duplicates: Dict[str, List[Path]], unique_files: List[Path], d
     print("=" * 60)
 
 
-def format_json_output(duplicates: Dict[str, List[Path]], unique_files: List[Path], duplicate_folders: List[List[Path]] = None) -> None:
+def format_json_output(duplicates: Dict[str, List[Path]], unique_files: List[Path], duplicate_folders: List[List[Path]] = None, linked_files: Optional[Dict[Path, List[Path]]] = None, coverage: Optional[Coverage] = None, linked_sizes: Optional[Dict[Path, int]] = None) -> None:
     """
     Format and print the results as JSON for scripting and programmatic access.
     
@@ -218,30 +317,30 @@ def format_json_output(duplicates: Dict[str, List[Path]], unique_files: List[Pat
         duplicates: Dictionary mapping hash to list of duplicate files
         unique_files: List of unique files
         duplicate_folders: List of lists containing duplicate folder paths
+        linked_files: Scanned path -> hardlinks to the same file (optional)
+        coverage: What a --top / --time-budget run checked (optional)
+        linked_sizes: Size per linked_files key, from the scan (optional)
     """
     duplicate_folders = duplicate_folders or []
     
+    # Convert hardlink groups
+    json_linked_files = []
+    for link_group, size in _linked_groups(linked_files, linked_sizes):
+        size, size_str = _get_file_info(link_group[0], size)
+        json_linked_files.append({
+            "paths": [str(file_path) for file_path in link_group],
+            "size": size,
+            "size_formatted": size_str,
+            "count": len(link_group)
+        })
+    
     # Convert Path objects to strings for JSON serialization
     json_duplicates = []
     for hash_val, file_list in duplicates.items():
-        group = []
-        for file_path in file_list:
-            try:
-                size = file_path.stat().st_size
-                group.append({
-                    "path": str(file_path),
-                    "size": size,
-                    "size_formatted": _format_file_size(size)
-                })
-            except OSError:
-                group.append({
-                    "path": str(file_path),
-                    "size": 0,
-                    "size_formatted": "unknown"
-                })
+        group = [_file_entry(file_path, size) for file_path, size in _with_sizes(file_list)]
         if group:
             json_duplicates.append({
-                "hash": hash_val,
+                "hash": digest_hex(hash_val),
                 "files": group,
                 "count": len(group)
             })
@@ -249,33 +348,17 @@ def format_json_output(duplicates: Dict[str, List[Path]], unique_files: List[Pat
     # Convert duplicate folders
     json_duplicate_folders = []
     for folder_group in duplicate_folders:
-        group = []
-        for folder_path in folder_group:
-            try:
-                # Calculate folder size
-                folder_size = 0
-                file_count = 0
-                for item in folder_path.rglob("*"):
-                    try:
-                        if item.is_file():
-                            folder_size += item.stat().st_size
-                            file_count += 1
-                    except (PermissionError, FileNotFoundError, OSError):
-                        continue
-                
-                group.append({
-                    "path": str(folder_path),
-                    "size": folder_size,
-                    "size_formatted": _format_file_size(folder_size),
-                    "file_count": file_count
-                })
-            except (PermissionError, OSError):
-                group.append({
-                    "path": str(folder_path),
-                    "size": 0,
-                    "size_formatted": "unknown",
-                    "file_count": 0
-                })
+        # All folders of a group are identical
+        file_count, folder_size = _folder_info(folder_group)
+        group = [
+            {
+                "path": str(folder_path),
+                "size": folder_size,
+                "size_formatted": _format_file_size(folder_size),
+                "file_count": file_count
+            }
+            for folder_path in folder_group
+        ]
         
         if group:
             json_duplicate_folders.append({
@@ -284,21 +367,7 @@ def format_json_output(duplicates: Dict[str, List[Path]], unique_files: List[Pat
             })
     
     # Convert unique files
-    json_unique_files = []
-    for file_path in unique_files:
-        try:
-            size = file_path.stat().st_size
-            json_unique_files.append({
-                "path": str(file_path),
-                "size": size,
-                "size_formatted": _format_file_size(size)
-            })
-        except OSError:
-            json_unique_files.append({
-                "path": str(file_path),
-                "size": 0,
-                "size_formatted": "unknown"
-            })
+    json_unique_files = [_file_entry(file_path, size) for file_path, size in _with_sizes(unique_files)]
     
     # Calculate statistics
     total_duplicate_size, potential_savings = _calculate_space_savings(duplicates)
@@ -307,23 +376,15 @@ def format_json_output(duplicates: Dict[str, List[Path]], unique_files: List[Pat
     folder_savings = 0
     for folder_group in duplicate_folders:
         if len(folder_group) > 1:
-            try:
-                folder_size = 0
-                for item in folder_group[0].rglob("*"):
-                    try:
-                        if item.is_file():
-                            folder_size += item.stat().st_size
-                    except (PermissionError, FileNotFoundError, OSError):
-                        continue
-                folder_savings += folder_size * (len(folder_group) - 1)
-            except (PermissionError, OSError):
-                pass
+            _, folder_size = _folder_info(folder_group)
+            folder_savings += folder_size * (len(folder_group) - 1)
     
     # Create output dictionary
     output = {
         "duplicate_files": json_duplicates,
         "duplicate_folders": json_duplicate_folders,
         "unique_files": json_unique_files,
+        "linked_files": json_linked_files,
         "statistics": {
             "total_files": sum(len(files) for files in duplicates.values()) + len(unique_files),
             "duplicate_files_count": sum(len(files) for files in duplicates.values()),
@@ -334,9 +395,12 @@ def format_json_output(duplicates: Dict[str, List[Path]], unique_files: List[Pat
             "total_duplicate_size": total_duplicate_size,
             "potential_file_savings": potential_savings,
             "potential_folder_savings": folder_savings,
-            "total_potential_savings": potential_savings + folder_savings
+            "total_potential_savings": potential_savings + folder_savings,
+            "linked_files_count": len(json_linked_files)
         }
     }
+    if coverage is not None:
+        output["coverage"] = coverage.to_dict()
     
     # Print as formatted JSON
     print(json.dumps(output, indent=2))
\ No newline at end of file
@@ -0,0 +1,198 @@
+"""
+Persistent on-disk cache of file digests.
+"""
+
+import os
+import platform
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .hasher import get_hash_algorithm, binary_digests_enabled, Digest
+from .scanner import FileRecord
+
+# Bump when the meaning of stored digests changes (e.g. partial hash size)
+_SCHEMA_VERSION = 2
+
+
+def default_cache_path() -> Path:
+    """
+    Location of the hash cache in the per-user cache directory.
+
+    Uses %LOCALAPPDATA% on Windows, ~/Library/Caches on macOS and
+    $XDG_CACHE_HOME (default ~/.cache) elsewhere.
+    """
+    system = platform.system()
+    if system == 'Windows':
+        base = Path(os.environ.get('LOCALAPPDATA') or Path.home() / 'AppData' / 'Local')
+    elif system == 'Darwin':
+        base = Path.home() / 'Library' / 'Caches'
+    else:
+        base = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache')
+    return base / 'duplicate-finder' / 'hashes.sqlite3'
+
+
+def _to_sqlite_int(value: int) -> int:
+    """Map an unsigned 64-bit value (inode, device) into SQLite's signed range."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _as_current_digest(digest: Digest) -> Digest:
+    """Convert a stored digest to the representation currently in use."""
+    if binary_digests_enabled():
+        return bytes.fromhex(digest) if isinstance(digest, str) else digest
+    return digest.hex() if isinstance(digest, bytes) else digest
+
+
+class HashCache:
+    """
+    SQLite-backed cache of partial and full digests.
+
+    Entries are keyed by (st_dev, st_ino, kind), where kind names the hash
+    algorithm and partial/full, and stamped with size, mtime_ns and
+    ctime_ns. A lookup only hits when all five match the current FileRecord,
+    so any change to the file invalidates its entry automatically; the stale
+    row is overwritten on the next store.
+    
+    Digests are stored as given (hex text, or raw bytes from binary digest
+    mode) and converted on lookup if the representation in use differs.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            db_path: Database file (None for the default user cache location)
+        """
+        self.db_path = Path(db_path) if db_path else default_cache_path()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self._pending: List[Tuple] = []
+        self.hits = 0
+        self.misses = 0
+        self._init_schema()
+
+    def _init_schema(self) -> None:
+        """Create tables, discarding entries written by an older schema."""
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+            if row is None or int(row[0]) != _SCHEMA_VERSION:
+                self._conn.execute("DROP TABLE IF EXISTS file_hashes")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)",
+                    (str(_SCHEMA_VERSION),)
+                )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS file_hashes ("
+                " st_dev INTEGER NOT NULL,"
+                " st_ino INTEGER NOT NULL,"
+                " kind TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " ctime_ns INTEGER NOT NULL,"
+                " digest TEXT NOT NULL,"
+                " PRIMARY KEY (st_dev, st_ino, kind))"
+            )
+
+    @staticmethod
+    def is_cacheable(record: FileRecord) -> bool:
+        """Records without a real inode number (e.g. Windows scandir) can't be keyed."""
+        return record.st_ino != 0
+
+    @staticmethod
+    def _kind(partial: bool) -> str:
+        # Digests of different algorithms are stored side by side
+        return f"{'partial' if partial else 'full'}:{get_hash_algorithm().name}"
+
+    def get(self, record: FileRecord, partial: bool = False) -> Optional[Digest]:
+        """
+        Look up a digest for a file.
+
+        Args:
+            record: Current stat data for the file
+            partial: Look up the partial (first 4KB) digest instead of the full one
+
+        Returns:
+            Cached digest, or None on a miss or stale entry
+        """
+        if not self.is_cacheable(record):
+            self.misses += 1
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, ctime_ns, digest FROM file_hashes"
+                " WHERE st_dev = ? AND st_ino = ? AND kind = ?",
+                (_to_sqlite_int(record.st_dev), _to_sqlite_int(record.st_ino), self._kind(partial))
+            ).fetchone()
+        if row is not None and row[:3] == (record.size, record.mtime_ns, record.ctime_ns):
+            self.hits += 1
+            return _as_current_digest(row[3])
+        self.misses += 1
+        return None
+
+    def put(self, record: FileRecord, digest: Digest, partial: bool = False) -> None:
+        """Queue a digest for storage; written on the next flush()."""
+        if not self.is_cacheable(record):
+            return
+        with self._lock:
+            self._pending.append((
+                _to_sqlite_int(record.st_dev),
+                _to_sqlite_int(record.st_ino),
+                self._kind(partial),
+                record.size,
+                record.mtime_ns,
+                record.ctime_ns,
+                digest
+            ))
+
+    def flush(self) -> None:
+        """Write queued digests to disk in a single transaction."""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO file_hashes"
+                        " (st_dev, st_ino, kind, size, mtime_ns, ctime_ns, digest)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        pending
+                    )
+            except sqlite3.Error as e:
+                print(f"⚠️  Could not update hash cache {self.db_path}: {e}", file=sys.stderr)
+
+    def close(self) -> None:
+        """Flush pending writes and close the database."""
+        self.flush()
+        self._conn.close()
+
+    def get_stats(self) -> Dict[str, float]:
+        """Get cache statistics."""
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total * 100) if total > 0 else 0
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': hit_rate
+        }
+
+
+def open_hash_cache(db_path: Optional[Path] = None) -> Optional[HashCache]:
+    """
+    Open the hash cache, returning None (and warning) if it is unusable.
+
+    A read-only home directory or corrupt database should not stop a scan.
+    """
+    try:
+        return HashCache(db_path)
+    except (OSError, sqlite3.Error) as e:
+        location = db_path or default_cache_path()
+        print(f"⚠️  Hash cache disabled, cannot open {location}: {e}", file=sys.stderr)
+        return None
@@ -3,9 +3,16 @@ File hashing utilities for duplicate detection.
 """
 
 import hashlib
+import mmap
+import os
 import sys
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from .adaptive_optimizer import detect_disk_type
 
 # Global warning counter to avoid spam
 _warning_counts = {
@@ -17,31 +24,270 @@ _warning_counts = {
 
 _MAX_WARNINGS_PER_TYPE = 5
 
+# Bytes read by a partial hash
+PARTIAL_HASH_SIZE = 4096
+
+DEFAULT_HASH_ALGORITHM = 'sha256'
+
+# Read size per device type: HDDs favour long sequential reads
+DEFAULT_CHUNK_SIZE = 65536
+_CHUNK_SIZES = {
+    'hdd': 1024 * 1024,
+    'ssd': 256 * 1024,
+}
+
+# Files with at least this many bytes left to hash are mapped instead of read
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+_device_chunk_sizes: Dict[int, int] = {}
+_device_lock = threading.Lock()
+_thread_local = threading.local()
+
+
+@dataclass(frozen=True)
+class HashAlgorithm:
+    """A registered content hash."""
+    name: str
+    factory: Callable[[], Any]
+    # Non-cryptographic hashes can be made to collide; groups found with
+    # them can be confirmed byte-for-byte (see byte_compare)
+    cryptographic: bool
+
+
+_HASH_ALGORITHMS: Dict[str, HashAlgorithm] = {}
+
+
+def register_hash_algorithm(name: str, factory: Callable[[], Any], cryptographic: bool) -> None:
+    """
+    Make a hash available to --hash-algo.
+    
+    ``factory`` returns a fresh hashlib-style object (update/copy/digest/hexdigest).
+    """
+    _HASH_ALGORITHMS[name] = HashAlgorithm(name, factory, cryptographic)
+
+
+register_hash_algorithm('sha256', hashlib.sha256, cryptographic=True)
+register_hash_algorithm('blake2b', hashlib.blake2b, cryptographic=True)
+register_hash_algorithm('sha1', hashlib.sha1, cryptographic=True)
+
+try:
+    import xxhash
+    register_hash_algorithm('xxh3_128', xxhash.xxh3_128, cryptographic=False)
+    register_hash_algorithm('xxh64', xxhash.xxh64, cryptographic=False)
+except ImportError:
+    pass
+
+try:
+    import blake3
+    register_hash_algorithm('blake3', blake3.blake3, cryptographic=True)
+except ImportError:
+    pass
+
+_current_algorithm = _HASH_ALGORITHMS[DEFAULT_HASH_ALGORITHM]
+
+
+def available_hash_algorithms() -> List[str]:
+    """Names of the hash algorithms usable in this environment."""
+    return list(_HASH_ALGORITHMS)
+
+
+def set_hash_algorithm(name: str) -> None:
+    """
+    Select the algorithm used by all subsequent file hashing.
+    
+    Raises:
+        ValueError: If the algorithm is unknown or its module is not installed
+    """
+    global _current_algorithm
+    if name not in _HASH_ALGORITHMS:
+        raise ValueError(
+            f"Unknown hash algorithm '{name}' (available: {', '.join(available_hash_algorithms())})"
+        )
+    _current_algorithm = _HASH_ALGORITHMS[name]
+
 
-def calculate_file_hash(file_path: Path, partial: bool = False) -> Optional[str]:
+def get_hash_algorithm() -> HashAlgorithm:
+    """The algorithm currently used for file hashing."""
+    return _current_algorithm
+
+
+def new_hash():
+    """Create a fresh hash object for the current algorithm."""
+    return _current_algorithm.factory()
+
+
+# A file digest: hex string by default, raw bytes in binary mode. Groups
+# split by byte verification are keyed (digest, n) in binary mode.
+Digest = Union[str, bytes]
+DigestKey = Union[Digest, Tuple[bytes, int]]
+
+_binary_digests = False
+
+
+@contextmanager
+def binary_digests(enabled: bool = True) -> Iterator[None]:
+    """
+    Produce raw ``bytes`` digests instead of hex strings within the block.
+    
+    Binary digests take half the memory and need no per-file string
+    formatting; formatters convert them with digest_hex() for display.
+    """
+    global _binary_digests
+    previous, _binary_digests = _binary_digests, enabled
+    try:
+        yield
+    finally:
+        _binary_digests = previous
+
+
+def binary_digests_enabled() -> bool:
+    """Whether hashing currently produces bytes digests."""
+    return _binary_digests
+
+
+def finish_digest(file_hash) -> Digest:
+    """Final digest of a hash object in the current representation."""
+    return file_hash.digest() if _binary_digests else file_hash.hexdigest()
+
+
+def digest_hex(digest: DigestKey) -> str:
+    """Hex form of a digest or split-group key, for output."""
+    if isinstance(digest, bytes):
+        return digest.hex()
+    if isinstance(digest, tuple):
+        return f"{digest[0].hex()}#{digest[1]}"
+    return digest
+
+
+def digest_bytes(digest: DigestKey) -> bytes:
+    """Byte form of a digest or split-group key, for feeding into other hashes."""
+    if isinstance(digest, bytes):
+        return digest
+    return digest_hex(digest).encode('ascii')
+
+
+@dataclass
+class PartialHashState:
     """
-    Calculate SHA256 hash of a file with robust error handling.
+    A partial hash that full hashing can resume from.
+    
+    ``state`` is the hash object after the first ``offset`` bytes, so the
+    full digest only needs the rest of the file.
+    """
+    digest: Digest
+    state: Any
+    offset: int
+
+
+def get_chunk_size(st_dev: int, file_path: Path) -> int:
+    """
+    Read size for files on a device, detected once per device.
+    
+    Args:
+        st_dev: Device number of the file
+        file_path: A file on that device, used for disk type detection
+        
+    Returns:
+        Chunk size in bytes
+    """
+    chunk_size = _device_chunk_sizes.get(st_dev)
+    if chunk_size is None:
+        with _device_lock:
+            chunk_size = _device_chunk_sizes.get(st_dev)
+            if chunk_size is None:
+                chunk_size = _CHUNK_SIZES.get(detect_disk_type(Path(file_path)), DEFAULT_CHUNK_SIZE)
+                _device_chunk_sizes[st_dev] = chunk_size
+    return chunk_size
+
+
+def _get_read_buffer(size: int) -> bytearray:
+    """Per-thread reusable read buffer of at least ``size`` bytes."""
+    buffer = getattr(_thread_local, 'buffer', None)
+    if buffer is None or len(buffer) < size:
+        buffer = bytearray(size)
+        _thread_local.buffer = buffer
+    return buffer
+
+
+def hash_stream(f: BinaryIO, file_hash, chunk_size: int = DEFAULT_CHUNK_SIZE, length: Optional[int] = None) -> int:
+    """
+    Feed an open file into a hash object without allocating per chunk.
+    
+    Data is read with readinto() into this thread's reusable buffer and
+    passed on as memoryview slices.
+    
+    Args:
+        f: File opened in binary mode, positioned at the first byte to hash
+        file_hash: hashlib-style object to update
+        chunk_size: Bytes per read
+        length: Stop after this many bytes (None to read to end of file)
+        
+    Returns:
+        Number of bytes hashed
+    """
+    total = 0
+    with memoryview(_get_read_buffer(chunk_size)) as view:
+        while length is None or total < length:
+            wanted = chunk_size if length is None else min(chunk_size, length - total)
+            count = f.readinto(view[:wanted])
+            if not count:
+                break
+            file_hash.update(view[:count])
+            total += count
+    return total
+
+
+def _hash_rest_of_file(f: BinaryIO, file_hash, offset: int = 0) -> None:
+    """
+    Feed everything from ``offset`` to the end of an open file into a hash.
+    
+    Large files are hashed straight from an mmap; everything else (and any
+    file that cannot be mapped) goes through hash_stream.
+    """
+    stat_result = os.fstat(f.fileno())
+    chunk_size = get_chunk_size(stat_result.st_dev, f.name)
+    
+    mapped = None
+    if stat_result.st_size - offset >= MMAP_THRESHOLD:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Filesystems without mmap support fall back to reads
+            mapped = None
+    
+    if mapped is None:
+        f.seek(offset)
+        hash_stream(f, file_hash, chunk_size)
+        return
+    
+    with mapped, memoryview(mapped) as view:
+        # Slices keep each update short so other threads get the GIL back
+        for start in range(offset, len(view), chunk_size):
+            file_hash.update(view[start:start + chunk_size])
+
+
+def calculate_file_hash(file_path: Path, partial: bool = False) -> Optional[Digest]:
+    """
+    Hash a file with the current algorithm (SHA-256 by default).
     
     Args:
         file_path: Path to the file
         partial: If True, only hash first 4KB for quick comparison
         
     Returns:
-        Hex string of hash or None if error
+        Hex string of hash (bytes in binary mode) or None if error
     """
-    sha256_hash = hashlib.sha256()
+    file_hash = new_hash()
     try:
         with open(file_path, "rb") as f:
             if partial:
                 # Read only first 4KB for partial hash
-                data = f.read(4096)
+                data = f.read(PARTIAL_HASH_SIZE)
                 if data:
-                    sha256_hash.update(data)
+                    file_hash.update(data)
             else:
-                # Read entire file in chunks
-                for chunk in iter(lambda: f.read(65536), b""):
-                    sha256_hash.update(chunk)
-        return sha256_hash.hexdigest()
+                _hash_rest_of_file(f, file_hash)
+        return finish_digest(file_hash)
     
     except PermissionError as e:
         _log_warning('permission_denied', f"Permission denied reading {file_path}: {e}")
@@ -60,6 +306,67 @@ def calculate_file_hash(file_path: Path, partial: bool = False) -> Optional[str]
         return None
 
 
+def calculate_partial_hash_state(file_path: Path) -> Optional[PartialHashState]:
+    """
+    Hash the first 4KB of a file and keep the hash state for resuming.
+    
+    The digest equals calculate_file_hash(file_path, partial=True).
+    
+    Args:
+        file_path: Path to the file
+        
+    Returns:
+        PartialHashState or None if error
+    """
+    file_hash = new_hash()
+    try:
+        with open(file_path, "rb") as f:
+            data = f.read(PARTIAL_HASH_SIZE)
+        file_hash.update(data)
+        return PartialHashState(finish_digest(file_hash), file_hash, len(data))
+    except Exception as e:
+        _log_read_error(file_path, e)
+        return None
+
+
+def resume_file_hash(file_path: Path, partial_state: PartialHashState) -> Optional[Digest]:
+    """
+    Finish a full hash from a partial hash state.
+    
+    Only the bytes after the partial prefix are read. The result equals
+    calculate_file_hash(file_path, partial=False).
+    
+    Args:
+        file_path: Path to the file
+        partial_state: State returned by calculate_partial_hash_state
+        
+    Returns:
+        Hex string of hash (bytes in binary mode) or None if error
+    """
+    file_hash = partial_state.state.copy()
+    try:
+        with open(file_path, "rb") as f:
+            _hash_rest_of_file(f, file_hash, partial_state.offset)
+        return finish_digest(file_hash)
+    except Exception as e:
+        _log_read_error(file_path, e)
+        return None
+
+
+def _log_read_error(file_path: Path, error: Exception) -> None:
+    """Log a read failure under the same warning types as calculate_file_hash."""
+    if isinstance(error, PermissionError):
+        _log_warning('permission_denied', f"Permission denied reading {file_path}: {error}")
+    elif isinstance(error, FileNotFoundError):
+        _log_warning('file_not_found', f"File not found {file_path}: {error}")
+    elif isinstance(error, IsADirectoryError):
+        pass
+    elif isinstance(error, (OSError, IOError)):
+        _log_warning('io_errors', f"I/O error reading {file_path}: {error}")
+    else:
+        _log_warning('other_errors', f"Unexpected error reading {file_path}: {error}")
+
+
 def get_file_size(file_path: Path) -> int:
     """
     Get file size in bytes with robust error handling.
@@ -0,0 +1,340 @@
+"""
+Header probing of photos and videos for media-aware fast-mode matching.
+"""
+
+import struct
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from .fast_detector import DEFAULT_READ_WORKERS, DuplicateGroup, FileCategory, FileMetadata, read_files_concurrently
+from .hasher import _log_read_error
+
+# Bytes read from the start of each file; EXIF and the ISO BMFF 'meta' box
+# sit near the start
+DEFAULT_PROBE_SIZE = 16384
+
+DEFAULT_PROBE_WORKERS = DEFAULT_READ_WORKERS
+
+MATCH_MEDIA = 'media_match'
+
+MEDIA_CATEGORIES = (FileCategory.PHOTO, FileCategory.VIDEO)
+
+# EXIF tags that tell shots apart
+_TAG_MODEL = 0x0110
+_TAG_EXIF_IFD = 0x8769
+_TAG_DATETIME_ORIGINAL = 0x9003
+_TAG_SUBSEC_ORIGINAL = 0x9291
+_TAG_BODY_SERIAL = 0xA431
+_TAG_CAMERA_SERIAL = 0xC62F  # DNG, in IFD0
+_EXIF_TAGS = (_TAG_DATETIME_ORIGINAL, _TAG_SUBSEC_ORIGINAL, _TAG_MODEL, _TAG_BODY_SERIAL, _TAG_CAMERA_SERIAL)
+
+_TIFF_ASCII = 2
+_TIFF_LONG = 4
+_MAX_IFD_ENTRIES = 1024
+# Boxes looked at per level before giving up
+_MAX_BOXES = 64
+
+# Returned for files that cannot be read
+_UNREADABLE = object()
+
+
+class _Header:
+    """Reads from a file, served from the already-read head when possible."""
+
+    def __init__(self, f: BinaryIO, head: bytes):
+        self._f = f
+        self.head = head
+
+    def read(self, offset: int, size: int) -> bytes:
+        if offset + size <= len(self.head):
+            return self.head[offset:offset + size]
+        self._f.seek(offset)
+        return self._f.read(size)
+
+
+def _ifd_fields(tiff: bytes, ifd_offset: int, endian: str, fields: Dict[int, object]) -> Optional[int]:
+    """
+    Collect wanted ASCII tags of one IFD into ``fields``.
+
+    Returns:
+        Offset of the Exif sub-IFD if the IFD points to one, else None
+    """
+    if ifd_offset + 2 > len(tiff):
+        return None
+    (count,) = struct.unpack_from(endian + "H", tiff, ifd_offset)
+    exif_ifd = None
+    for index in range(min(count, _MAX_IFD_ENTRIES)):
+        entry = ifd_offset + 2 + 12 * index
+        if entry + 12 > len(tiff):
+            break
+        tag, value_type, value_count = struct.unpack_from(endian + "HHI", tiff, entry)
+        if tag == _TAG_EXIF_IFD and value_type == _TIFF_LONG:
+            (exif_ifd,) = struct.unpack_from(endian + "I", tiff, entry + 8)
+        elif tag in _EXIF_TAGS and value_type == _TIFF_ASCII:
+            if value_count <= 4:
+                start = entry + 8
+            else:
+                (start,) = struct.unpack_from(endian + "I", tiff, entry + 8)
+            value = tiff[start:start + value_count]
+            if len(value) == value_count:
+                fields[tag] = value.rstrip(b"\0 ").decode("ascii", "replace")
+    return exif_ifd
+
+
+def parse_exif(tiff: bytes) -> Optional[Tuple]:
+    """
+    Shot fields from TIFF-structured EXIF data (as in JPEG APP1, TIFF and raw files).
+
+    Fields whose data lies past the end of ``tiff`` are left out, so the
+    result depends only on the bytes given.
+
+    Returns:
+        ('exif', DateTimeOriginal, SubSecTimeOriginal, Model, serial number),
+        missing fields as None, or None if no field was found
+    """
+    if tiff[:4] == b"II*\0":
+        endian = "<"
+    elif tiff[:4] == b"MM\0*":
+        endian = ">"
+    else:
+        return None
+    fields: Dict[int, object] = {}
+    (ifd0,) = struct.unpack_from(endian + "I", tiff, 4)
+    exif_ifd = _ifd_fields(tiff, ifd0, endian, fields)
+    if exif_ifd is not None:
+        _ifd_fields(tiff, exif_ifd, endian, fields)
+    if not fields:
+        return None
+    return (
+        'exif',
+        fields.get(_TAG_DATETIME_ORIGINAL),
+        fields.get(_TAG_SUBSEC_ORIGINAL),
+        fields.get(_TAG_MODEL),
+        fields.get(_TAG_BODY_SERIAL, fields.get(_TAG_CAMERA_SERIAL))
+    )
+
+
+def _jpeg_exif(head: bytes) -> Optional[Tuple]:
+    """EXIF fields from the APP1 segment of a JPEG head."""
+    offset = 2
+    while offset + 4 <= len(head) and head[offset] == 0xFF:
+        marker = head[offset + 1]
+        if marker == 0xDA:
+            # Start of scan: no metadata after this
+            break
+        (length,) = struct.unpack_from(">H", head, offset + 2)
+        segment = offset + 4
+        if marker == 0xE1 and head[segment:segment + 6] == b"Exif\0\0":
+            return parse_exif(head[segment + 6:offset + 2 + length])
+        offset += 2 + length
+    return None
+
+
+def _boxes(header: _Header, start: int, end: Optional[int]):
+    """Yield (type, payload offset, box end) of the ISO BMFF boxes in a range."""
+    offset = start
+    for _ in range(_MAX_BOXES):
+        if end is not None and offset + 8 > end:
+            return
+        box = header.read(offset, 16)
+        if len(box) < 8:
+            return
+        size, box_type = struct.unpack_from(">I4s", box)
+        payload = offset + 8
+        if size == 1:
+            if len(box) < 16:
+                return
+            (size,) = struct.unpack_from(">Q", box, 8)
+            payload += 8
+        elif size == 0:
+            # Box runs to the end of the file
+            yield box_type, payload, end
+            return
+        if size < payload - offset:
+            return
+        yield box_type, payload, offset + size
+        offset += size
+
+
+def _read_uint(data: bytes, offset: int, size: int) -> int:
+    return int.from_bytes(data[offset:offset + size], "big") if size else 0
+
+
+def _heif_exif(header: _Header, meta: bytes, probe_size: int) -> Optional[Tuple]:
+    """EXIF fields of a HEIF/HEIC file, located through the 'meta' box."""
+    exif_item = None
+    locations: Dict[int, Tuple[int, int]] = {}
+    # meta is a full box: version and flags come first
+    offset = 4
+    for _ in range(_MAX_BOXES):
+        if offset + 8 > len(meta):
+            break
+        size, box_type = struct.unpack_from(">I4s", meta, offset)
+        if size < 8:
+            break
+        box = meta[offset + 8:offset + size]
+        offset += size
+        if box_type == b"iinf" and len(box) >= 6:
+            version = box[0]
+            entries = box[6:] if version == 0 else box[8:]
+            entry = 0
+            while entry + 8 <= len(entries):
+                (entry_size,) = struct.unpack_from(">I", entries, entry)
+                infe = entries[entry + 8:entry + entry_size]
+                if entry_size < 8:
+                    break
+                entry += entry_size
+                if infe[:1] == b"\x02" and infe[8:12] == b"Exif":
+                    exif_item = _read_uint(infe, 4, 2)
+                elif infe[:1] == b"\x03" and infe[10:14] == b"Exif":
+                    exif_item = _read_uint(infe, 4, 4)
+        elif box_type == b"iloc" and len(box) >= 8:
+            version = box[0]
+            offset_size, length_size = box[4] >> 4, box[4] & 0x0F
+            base_offset_size, index_size = box[5] >> 4, (box[5] & 0x0F if version in (1, 2) else 0)
+            id_size = 2 if version < 2 else 4
+            item_count = _read_uint(box, 6, id_size)
+            position = 6 + id_size
+            for _ in range(item_count):
+                item_id = _read_uint(box, position, id_size)
+                position += id_size
+                if version in (1, 2):
+                    position += 2  # construction_method
+                position += 2  # data_reference_index
+                base_offset = _read_uint(box, position, base_offset_size)
+                position += base_offset_size
+                extent_count = _read_uint(box, position, 2)
+                position += 2
+                for extent in range(extent_count):
+                    position += index_size
+                    extent_offset = _read_uint(box, position, offset_size)
+                    extent_length = _read_uint(box, position + offset_size, length_size)
+                    position += offset_size + length_size
+                    if extent == 0:
+                        locations[item_id] = (base_offset + extent_offset, extent_length)
+                if position > len(box):
+                    break
+    if exif_item not in locations:
+        return None
+    item_offset, item_length = locations[exif_item]
+    item = header.read(item_offset, min(item_length or probe_size, probe_size))
+    if len(item) < 4:
+        return None
+    # The item starts with the offset of the TIFF header ("Exif\0\0" before it)
+    tiff_start = 4 + _read_uint(item, 0, 4)
+    return parse_exif(item[tiff_start:])
+
+
+def _mvhd_fields(mvhd: bytes) -> Optional[Tuple]:
+    """Creation time, timescale and duration from an 'mvhd' payload."""
+    if mvhd[:1] == b"\x01" and len(mvhd) >= 32:
+        creation, _, timescale, duration = struct.unpack_from(">QQIQ", mvhd, 4)
+    elif mvhd[:1] == b"\x00" and len(mvhd) >= 20:
+        creation, _, timescale, duration = struct.unpack_from(">IIII", mvhd, 4)
+    else:
+        return None
+    return ('mvhd', creation, timescale, duration)
+
+
+def _bmff_fields(header: _Header, probe_size: int) -> Optional[Tuple]:
+    """Probe an ISO BMFF (MP4, MOV, HEIC) file: mvhd for movies, EXIF for images."""
+    for box_type, payload, box_end in _boxes(header, 0, None):
+        if box_type == b"moov":
+            for child_type, child_payload, _ in _boxes(header, payload, box_end):
+                if child_type == b"mvhd":
+                    return _mvhd_fields(header.read(child_payload, 32))
+            return None
+        if box_type == b"meta" and box_end is not None:
+            return _heif_exif(header, header.read(payload, min(box_end - payload, probe_size)), probe_size)
+    return None
+
+
+def probe_media(file_path: Path, probe_size: int = DEFAULT_PROBE_SIZE):
+    """
+    Read the fields that identify a photo or video from its header.
+
+    JPEG and TIFF-based files (including most raw formats) give EXIF
+    DateTimeOriginal, SubSecTimeOriginal, camera model and serial number;
+    HEIC gives the same through its EXIF item; MP4 and MOV give the 'mvhd'
+    creation time, timescale and duration. Reads are bounded: the first
+    ``probe_size`` bytes, plus a few box headers and at most one more
+    ``probe_size`` read for files whose metadata is further in.
+
+    Identical files always give equal results.
+
+    Returns:
+        Tuple of fields, or None if the format is not recognized or has no
+        such fields
+    """
+    try:
+        with open(file_path, "rb") as f:
+            head = f.read(probe_size)
+            if head[:2] == b"\xff\xd8":
+                return _jpeg_exif(head)
+            if head[:4] in (b"II*\0", b"MM\0*"):
+                return parse_exif(head)
+            if head[4:8].isalpha():
+                return _bmff_fields(_Header(f, head), probe_size)
+            return None
+    except (struct.error, ValueError):
+        # Malformed header
+        return None
+    except Exception as e:
+        _log_read_error(file_path, e)
+        return _UNREADABLE
+
+
+def split_groups_by_media(
+    duplicate_groups: List[DuplicateGroup],
+    probe_size: int = DEFAULT_PROBE_SIZE,
+    max_workers: int = DEFAULT_PROBE_WORKERS,
+    quiet: bool = False
+) -> Tuple[List[DuplicateGroup], List[FileMetadata]]:
+    """
+    Add probed header fields to the grouping key of photos and videos.
+
+    Photo and video files in the groups are probed with probe_media and
+    each group is split by the result. Subgroups whose files share probed
+    fields become ``media_match`` groups; files without such fields keep
+    their group's match_type. Files left alone after the split, and
+    unreadable files, are returned as unique. Other files are not read.
+
+    Args:
+        duplicate_groups: Groups from find_metadata_duplicates
+        probe_size: Bytes read from the start of each file
+        max_workers: Files probed concurrently
+        quiet: Suppress progress output
+
+    Returns:
+        Tuple of (split groups, files that turned out to be unique)
+    """
+    media_files = [
+        file_meta for group in duplicate_groups for file_meta in group.files
+        if file_meta.category in MEDIA_CATEGORIES
+    ]
+    # In the order of ``media_files``, i.e. group by group
+    probes = iter(read_files_concurrently(
+        lambda path, size: probe_media(path, probe_size),
+        media_files, max_workers, "Probing media headers", quiet
+    ))
+
+    split = []
+    unique_files = []
+    for group in duplicate_groups:
+        by_fields: Dict[object, List[FileMetadata]] = {}
+        for file_meta in group.files:
+            fields = next(probes) if file_meta.category in MEDIA_CATEGORIES else None
+            if fields is _UNREADABLE:
+                unique_files.append(file_meta)
+            else:
+                by_fields.setdefault(fields, []).append(file_meta)
+        for fields, matching_files in by_fields.items():
+            if len(matching_files) > 1:
+                split.append(DuplicateGroup(
+                    files=matching_files,
+                    match_type=group.match_type if fields is None else MATCH_MEDIA,
+                    category=matching_files[0].category
+                ))
+            else:
+                unique_files.extend(matching_files)
+    return split, unique_files
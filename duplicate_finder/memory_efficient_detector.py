@@ -3,69 +3,132 @@ Memory-efficient duplicate detection with streaming and batch processing.
 """
 
 import gc
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 from pathlib import Path
-from typing import Dict, List, Tuple, Iterator, Optional, Set
+from typing import Callable, Dict, Iterable, List, Tuple, Iterator, Optional, Union
 
 from tqdm import tqdm
 
-from .hasher import get_file_size
-from .parallel_hasher import parallel_hash_files, get_optimal_worker_count
-from .folder_detector import find_duplicate_folders, get_files_in_duplicate_folders
+from .scanner import FileRecord, to_file_record
+from .parallel_hasher import parallel_hash_files, iter_hash_files, get_optimal_worker_count
+from .folder_detector import find_duplicate_folders, get_files_in_duplicate_folders, select_files_for_folder_hashing
+from .hash_cache import HashCache
+from .byte_compare import verify_duplicate_groups
+from .external_grouping import SizeGrouper, FileSpool, DEFAULT_MAX_MEMORY
+from .file_table import FileTable, TablePaths
 
 
 class PartialHashCache:
-    """Cache for partial hashes to avoid redundant calculations."""
+    """
+    In-memory LRU cache of partial and full digests.
+    
+    Entries are keyed by inode identity (st_dev, st_ino) plus digest kind,
+    so hardlinks and renamed files share an entry, and are stamped with
+    size, mtime_ns and ctime_ns so a modified file misses. Files without a
+    real inode number fall back to their path. get() and put() are O(1);
+    the least recently used entry is evicted once ``max_size`` is reached.
+    
+    With a ``backing`` HashCache, misses fall through to the on-disk cache
+    and new digests are written through to it, so the cache persists across
+    runs. The class has the same get/put/flush interface as HashCache and
+    can be passed wherever a hash_cache is accepted.
+    """
     
-    def __init__(self, max_size: int = 10000):
+    def __init__(self, max_size: int = 10000, backing: Optional[HashCache] = None):
         """
         Initialize the cache with a maximum size.
         
         Args:
             max_size: Maximum number of entries to cache
+            backing: Persistent digest cache to read through and write through
         """
-        self.cache: Dict[Path, str] = {}
-        self.max_size = max_size
+        self.cache: OrderedDict = OrderedDict()
+        self.max_size = max(1, max_size)
+        self.backing = backing
         self.hits = 0
+        self.backing_hits = 0
         self.misses = 0
     
-    def get(self, file_path: Path) -> Optional[str]:
-        """Get a cached hash if available."""
-        if file_path in self.cache:
-            self.hits += 1
-            return self.cache[file_path]
+    @staticmethod
+    def _identify(file: Union[Path, FileRecord], partial: bool) -> Tuple[Tuple, Optional[Tuple], Optional[FileRecord]]:
+        """
+        Cache key, validity stamp and stat data for a file.
+        
+        Paths that cannot be stat'ed are keyed by path with no stamp.
+        """
+        record = to_file_record(file)
+        if record is None:
+            return (Path(file), partial), None, None
+        stamp = (record.size, record.mtime_ns, record.ctime_ns)
+        if record.st_ino:
+            return (record.st_dev, record.st_ino, partial), stamp, record
+        return (record.path, partial), stamp, record
+    
+    def get(self, file: Union[Path, FileRecord], partial: bool = True) -> Optional[str]:
+        """
+        Get a cached digest if available and still current.
+        
+        Args:
+            file: FileRecord (or path, which is stat'ed) to look up
+            partial: Look up the partial digest instead of the full one
+        """
+        key, stamp, record = self._identify(file, partial)
+        entry = self.cache.get(key)
+        if entry is not None:
+            if entry[0] == stamp:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self.cache[key]
+        
+        if self.backing is not None and record is not None:
+            digest = self.backing.get(record, partial)
+            if digest is not None:
+                self.backing_hits += 1
+                self._store(key, stamp, digest)
+                return digest
+        
         self.misses += 1
         return None
     
-    def put(self, file_path: Path, hash_value: str) -> None:
-        """Store a hash in the cache."""
-        if len(self.cache) >= self.max_size:
-            # Simple FIFO eviction - remove oldest entries
-            # In production, could use LRU
-            num_to_remove = max(1, self.max_size // 10)
-            to_remove = list(self.cache.keys())[:num_to_remove]
-            for key in to_remove:
-                del self.cache[key]
-        self.cache[file_path] = hash_value
+    def put(self, file: Union[Path, FileRecord], hash_value: str, partial: bool = True) -> None:
+        """Store a digest, writing it through to the backing cache."""
+        key, stamp, record = self._identify(file, partial)
+        self._store(key, stamp, hash_value)
+        if self.backing is not None and record is not None:
+            self.backing.put(record, hash_value, partial)
+    
+    def _store(self, key: Tuple, stamp: Optional[Tuple], digest: str) -> None:
+        self.cache[key] = (stamp, digest)
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+    
+    def flush(self) -> None:
+        """Write pending digests to the backing cache."""
+        if self.backing is not None:
+            self.backing.flush()
     
     def clear(self) -> None:
         """Clear the cache."""
+        self.flush()
         self.cache.clear()
         gc.collect()
     
-    def get_stats(self) -> Dict[str, int]:
-        """Get cache statistics."""
-        total = self.hits + self.misses
-        hit_rate = (self.hits / total * 100) if total > 0 else 0
+    def get_stats(self) -> Dict[str, float]:
+        """Get cache statistics; backing hits count as hits."""
+        total = self.hits + self.backing_hits + self.misses
+        hit_rate = ((self.hits + self.backing_hits) / total * 100) if total > 0 else 0
         return {
             'hits': self.hits,
+            'backing_hits': self.backing_hits,
             'misses': self.misses,
             'size': len(self.cache),
             'hit_rate': hit_rate
         }
 
 
-def batch_files_by_size(files: List[Path], batch_size: int = 1000) -> Iterator[List[Path]]:
+def batch_files_by_size(files: List, batch_size: int = 1000) -> Iterator[List]:
     """
     Stream files in batches for memory-efficient processing.
     
@@ -81,174 +144,175 @@ def batch_files_by_size(files: List[Path], batch_size: int = 1000) -> Iterator[L
 
 
 def process_size_groups_streaming(
-    files: List[Path],
+    files: Iterable[Union[Path, FileRecord]],
     batch_size: int = 1000,
-    quiet: bool = False
-) -> Tuple[Dict[int, List[Path]], List[Path]]:
+    quiet: bool = False,
+    max_memory: int = DEFAULT_MAX_MEMORY,
+    temp_dir: Optional[Path] = None,
+    keep_records: bool = False,
+    on_unique: Optional[Callable[[Union[Path, FileRecord]], None]] = None
+) -> Tuple[Dict[int, List[Union[Path, FileRecord]]], List[Path]]:
     """
-    Process files in batches to group by size with minimal memory usage.
+    Group files by size without holding every path in memory.
+    
+    (size, path) pairs are buffered up to ``max_memory`` bytes, then sorted
+    and spilled to temporary run files that are merge-joined at the end,
+    so only sizes shared by two or more files are materialized as groups.
+    Sizes are taken from FileRecords when available; bare paths are
+    stat'ed once. With ``keep_records`` the groups hold that stat data as
+    FileRecords, so digest caches never need to stat the files again.
     
     Args:
-        files: List of file paths
-        batch_size: Files per batch
+        files: FileRecords or file paths; any iterable, consumed once
+        batch_size: Files per progress update
         quiet: Suppress output
+        max_memory: Memory ceiling in bytes for buffered paths
+        temp_dir: Directory for spilled runs (None for the system default)
+        keep_records: Return grouped files as FileRecords instead of paths
+        on_unique: Called with each size-unique file (a FileRecord with
+            ``keep_records``) instead of collecting them into the returned list
         
     Returns:
         Tuple of (size_to_files dict, unique_files list)
     """
-    size_to_files = defaultdict(list)
-    unique_files = []
-    processed_sizes: Set[int] = set()
-    
-    total_batches = (len(files) + batch_size - 1) // batch_size
-    
-    for batch in tqdm(
-        batch_files_by_size(files, batch_size),
-        total=total_batches,
-        desc="Processing file batches",
-        unit=" batches",
-        disable=quiet,
-        leave=False
-    ):
-        # Process batch
-        for file_path in batch:
-            size = get_file_size(file_path)
-            if size >= 0:
-                size_to_files[size].append(file_path)
-        
-        # Early cleanup: identify and remove unique sizes
-        sizes_to_remove = []
-        for size, file_list in size_to_files.items():
-            if size not in processed_sizes:
-                if len(file_list) == 1:
-                    # Check if more files might come in future batches
-                    # For now, we'll mark it but not remove yet
-                    processed_sizes.add(size)
-    
-    # Final pass: separate unique files
-    final_size_groups = {}
-    for size, file_list in size_to_files.items():
-        if len(file_list) == 1:
-            unique_files.extend(file_list)
-        else:
-            final_size_groups[size] = file_list
-    
-    # Clear the temporary dict to free memory
-    size_to_files.clear()
+    grouper = SizeGrouper(max_memory, temp_dir, keep_records)
+    try:
+        with tqdm(desc="Grouping by size", unit=" files", disable=quiet, leave=False) as pbar:
+            for count, item in enumerate(files, 1):
+                record = to_file_record(item)
+                if record is not None:
+                    grouper.add_record(record)
+                if count % batch_size == 0:
+                    pbar.update(batch_size)
+    except BaseException:
+        grouper.close()
+        raise
+    
+    size_groups, unique_files = grouper.finish(on_unique)
+    if grouper.runs and not quiet:
+        print(f"  Spilled {grouper.files_added:,} paths to {len(grouper.runs)} sorted runs")
     gc.collect()
-    
-    return final_size_groups, unique_files
+    return size_groups, unique_files
 
 
 def find_duplicates_memory_efficient(
-    files: List[Path],
+    files: Iterable[Union[Path, FileRecord]],
     batch_size: int = 1000,
     cache_size: int = 10000,
     verbose: bool = False,
-    quiet: bool = False
-) -> Tuple[Dict[str, List[Path]], List[Path], List[List[Path]]]:
+    quiet: bool = False,
+    hash_cache: Optional[HashCache] = None,
+    verify: bool = False,
+    max_memory: int = DEFAULT_MAX_MEMORY
+) -> Tuple[Dict[str, List[Path]], FileSpool, List[List[Path]]]:
     """
     Find duplicates using memory-efficient streaming and caching.
     
     This version processes files in batches to maintain constant memory usage
-    regardless of directory size.
+    regardless of directory size. The input is consumed once: scan records
+    and unique files are spooled to temporary files instead of being held
+    in memory, and Stage 4 reads the records back from disk. Stage 4 still
+    holds one fingerprint per folder and the digests of hashed files.
     
     Args:
-        files: List of file paths to check
+        files: FileRecords or file paths to check; any iterable, consumed once
         batch_size: Number of files to process per batch
         cache_size: Maximum size of partial hash cache
         verbose: Enable verbose output
         quiet: Suppress non-error output
+        hash_cache: Persistent digest cache shared across runs
+        verify: Confirm duplicate groups byte-for-byte (for non-cryptographic hashes)
+        max_memory: Memory ceiling in bytes for Stage 1 size grouping;
+            beyond it paths are spilled to sorted runs on disk
         
     Returns:
-        Tuple of (duplicates_dict, unique_files, duplicate_folders)
+        Tuple of (duplicates_dict, unique_files, duplicate_folders);
+        duplicate groups are TablePaths and unique files a disk-backed
+        FileSpool of paths, both able to report sizes without a stat
     """
     if not quiet:
         print("\n=== Memory-Efficient Duplicate Detection ===")
-        print(f"  Processing {len(files)} files in batches of {batch_size}")
+        print(f"  Processing files in batches of {batch_size}")
     
-    # Initialize partial hash cache
-    partial_cache = PartialHashCache(max_size=cache_size)
+    # One digest cache for Stages 2-4, backed by the on-disk cache if enabled
+    digest_cache = PartialHashCache(max_size=cache_size, backing=hash_cache)
+    
+    # Every record is written out once for Stage 4; unique files go straight
+    # to their own spool as the size merge finds them, keeping their sizes
+    # for the report
+    all_files = FileSpool(keep_records=True)
+    unique_files = FileSpool()
+    
+    def spooled_records() -> Iterator[FileRecord]:
+        for item in files:
+            record = to_file_record(item)
+            if record is not None:
+                all_files.append(record)
+                yield record
     
     # Stage 1: Group by size with streaming
     if not quiet:
         print("\n=== Stage 1: Streaming size analysis ===")
     
-    size_to_files, unique_by_size = process_size_groups_streaming(
-        files, batch_size, quiet
+    # Groups keep their stat data so the digest cache is keyed without re-stat'ing
+    size_to_files, _ = process_size_groups_streaming(
+        spooled_records(), batch_size, quiet, max_memory,
+        keep_records=True, on_unique=unique_files.append
     )
     
     files_needing_hash = sum(len(group) for group in size_to_files.values())
     
     if not quiet:
         print(f"  Found {len(size_to_files)} groups with potential duplicates")
-        print(f"  {len(unique_by_size)} files are unique by size")
+        print(f"  {len(unique_files)} files are unique by size")
         print(f"  {files_needing_hash} files need content comparison")
     
     # Early exit if no potential duplicates
     if files_needing_hash == 0:
-        return {}, unique_by_size, []
+        all_files.close()
+        return {}, unique_files, []
     
     # Stage 2: Batch partial hashing with cache
     if not quiet:
         print("\n=== Stage 2: Cached partial hash comparison ===")
     
-    candidates_for_full_hash = []
-    files_to_partial_hash = []
-    
-    # Check cache first
-    for size, file_group in size_to_files.items():
-        for file_path in file_group:
-            cached_hash = partial_cache.get(file_path)
-            if cached_hash is None:
-                files_to_partial_hash.append(file_path)
-    
     if verbose and not quiet:
-        cache_stats = partial_cache.get_stats()
-        print(f"  Cache stats: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
-        print(f"  Need to hash {len(files_to_partial_hash)} files")
         print(f"  Using {get_optimal_worker_count()} parallel workers")
     
-    # Batch process partial hashing
-    for batch in batch_files_by_size(files_to_partial_hash, batch_size):
-        batch_hashes = parallel_hash_files(
-            batch,
-            partial=True,
-            desc="Partial hashing batch",
-            quiet=quiet
-        )
-        
-        # Update cache
-        for file_path, hash_val in batch_hashes.items():
-            if hash_val:
-                partial_cache.put(file_path, hash_val)
+    # Stream partial hashes into (size, partial hash) groups; only the
+    # records of files currently in flight are tracked
+    in_flight: Dict[Path, FileRecord] = {}
+    
+    def files_to_partial_hash() -> Iterator[FileRecord]:
+        for file_group in size_to_files.values():
+            for record in file_group:
+                in_flight[record.path] = record
+                yield record
     
-    # Group by size and partial hash
     size_partial_groups = defaultdict(list)
-    for size, file_group in size_to_files.items():
-        for file_path in file_group:
-            partial_hash = partial_cache.get(file_path)
-            if not partial_hash:
-                # Try to hash if not in cache
-                batch_hashes = parallel_hash_files(
-                    [file_path],
-                    partial=True,
-                    quiet=True
-                )
-                partial_hash = batch_hashes.get(file_path)
-            
-            if partial_hash:
-                key = f"{size}:{partial_hash}"
-                size_partial_groups[key].append(file_path)
-    
-    # Find candidates for full hashing and collect unique files
-    unique_by_partial = []
+    for file_path, partial_hash in tqdm(
+        iter_hash_files(files_to_partial_hash(), partial=True, hash_cache=digest_cache),
+        total=files_needing_hash,
+        desc="Partial hashing",
+        unit=" files",
+        disable=quiet,
+        leave=False
+    ):
+        record = in_flight.pop(file_path)
+        if partial_hash:
+            size_partial_groups[(record.size, partial_hash)].append(record)
+    
+    if verbose and not quiet:
+        _print_cache_stats(digest_cache, "after Stage 2")
+    
+    # Find candidates for full hashing and spool unique files
+    candidates_for_full_hash = []
     for group_key, group_files in size_partial_groups.items():
         if len(group_files) > 1:
             candidates_for_full_hash.extend(group_files)
         elif len(group_files) == 1:
             # File is unique by partial hash
-            unique_by_partial.extend(group_files)
+            unique_files.append(group_files[0])
     
     # Clear size groups to free memory
     size_to_files.clear()
@@ -264,34 +328,37 @@ def find_duplicates_memory_efficient(
     
     full_hash_to_files = defaultdict(list)
     
-    # Process full hashes in batches
-    for batch in batch_files_by_size(candidates_for_full_hash, batch_size):
-        batch_hashes = parallel_hash_files(
-            batch,
-            partial=False,
-            desc="Full hashing batch",
-            quiet=quiet
-        )
-        
-        for file_path, full_hash in batch_hashes.items():
-            if full_hash:
-                full_hash_to_files[full_hash].append(file_path)
+    # Stream full hashes straight into groups; only a bounded window of
+    # files is in flight, so no per-batch result dictionaries are built
+    for file_path, full_hash in tqdm(
+        iter_hash_files(candidates_for_full_hash, partial=False, hash_cache=digest_cache),
+        total=len(candidates_for_full_hash),
+        desc="Full hashing",
+        unit=" files",
+        disable=quiet,
+        leave=False
+    ):
+        if full_hash:
+            full_hash_to_files[full_hash].append(file_path)
     
-    # Clear candidates list to free memory
+    # Keep the candidates' records by path for the results; the digest
+    # cache is kept so Stage 4 does not re-hash files already seen
+    records_by_path = {record.path: record for record in candidates_for_full_hash}
     candidates_for_full_hash.clear()
-    partial_cache.clear()
     gc.collect()
     
     # Compile results
     duplicates = {}
-    unique_files = unique_by_size.copy()
-    unique_files.extend(unique_by_partial)  # Add files unique by partial hash
-    
     for full_hash, file_list in full_hash_to_files.items():
         if len(file_list) > 1:
             duplicates[full_hash] = file_list
         else:
-            unique_files.extend(file_list)
+            unique_files.extend(records_by_path[f] for f in file_list)
+    
+    mismatched = []
+    if verify and duplicates:
+        duplicates, mismatched = verify_duplicate_groups(duplicates, quiet)
+        unique_files.extend(records_by_path[f] for f in mismatched)
     
     if not quiet:
         print("  Batch processing complete!")
@@ -302,12 +369,21 @@ def find_duplicates_memory_efficient(
     for hash_val, file_list in full_hash_to_files.items():
         for file_path in file_list:
             all_file_hashes[file_path] = hash_val
-    
-    # Hash remaining unique files for folder detection
-    files_needing_folder_hash = []
-    for file_path in files:
-        if file_path not in all_file_hashes:
-            files_needing_folder_hash.append(file_path)
+    if verify:
+        # Files that only matched by hash collision must not make folders
+        # match; split groups are told apart by their suffixed keys
+        for file_path in mismatched:
+            del all_file_hashes[file_path]
+        for hash_val, file_list in duplicates.items():
+            for file_path in file_list:
+                all_file_hashes[file_path] = hash_val
+    
+    # Only hash files in structurally colliding folders; any folder holding
+    # a file already proven unique cannot be a duplicate. The spooled
+    # records carry sizes and cache keys, so nothing is stat'ed again.
+    files_needing_folder_hash = select_files_for_folder_hashing(
+        all_files, all_file_hashes, known_unique=unique_files
+    )
     
     if files_needing_folder_hash:
         # Process in batches
@@ -316,19 +392,20 @@ def find_duplicates_memory_efficient(
                 batch,
                 partial=False,
                 desc="Folder detection hashing",
-                quiet=quiet
+                quiet=quiet,
+                hash_cache=digest_cache
             )
             all_file_hashes.update(batch_hashes)
     
     # Find duplicate folders
-    duplicate_folders = find_duplicate_folders(files, all_file_hashes)
+    duplicate_folders = find_duplicate_folders(all_files, all_file_hashes)
     
     if duplicate_folders:
         if not quiet:
             print(f"  Found {len(duplicate_folders)} groups of duplicate folders")
         
         # Filter out files in duplicate folders
-        files_in_duplicate_folders = get_files_in_duplicate_folders(duplicate_folders, files)
+        files_in_duplicate_folders = get_files_in_duplicate_folders(duplicate_folders, all_files)
         
         filtered_duplicates = {}
         for hash_val, file_list in duplicates.items():
@@ -336,19 +413,50 @@ def find_duplicates_memory_efficient(
             if len(filtered_files) > 1:
                 filtered_duplicates[hash_val] = filtered_files
             elif len(filtered_files) == 1:
-                unique_files.extend(filtered_files)
+                unique_files.extend(records_by_path[f] for f in filtered_files)
         
         duplicates = filtered_duplicates
-        unique_files = [f for f in unique_files if f not in files_in_duplicate_folders]
+        kept_unique = FileSpool()
+        kept_unique.extend(
+            record for record in unique_files.records()
+            if record.path not in files_in_duplicate_folders
+        )
+        unique_files.close()
+        unique_files = kept_unique
     else:
         if not quiet:
             print("  No duplicate folders found")
     
+    if verbose and not quiet:
+        _print_cache_stats(digest_cache, "after Stage 4")
+    
+    # Only the reported duplicates are loaded into a table, so the report
+    # reads their sizes without stat'ing them again
+    table = FileTable()
+    duplicates = {
+        hash_val: TablePaths(table, [table.add(records_by_path[f]) for f in file_list])
+        for hash_val, file_list in duplicates.items()
+    }
+    records_by_path.clear()
+    
     # Final garbage collection
+    digest_cache.clear()
+    total_files = len(all_files)
+    all_files.close()
     gc.collect()
     
     if verbose and not quiet:
         print(f"\n  Memory-efficient processing complete")
-        print(f"  Processed {len(files)} files with constant memory usage")
+        print(f"  Processed {total_files} files with constant memory usage")
     
-    return duplicates, unique_files, duplicate_folders
\ No newline at end of file
+    return duplicates, unique_files, duplicate_folders
+
+
+def _print_cache_stats(digest_cache: PartialHashCache, when: str) -> None:
+    """Report digest cache effectiveness in verbose mode."""
+    stats = digest_cache.get_stats()
+    line = f"  Digest cache {when}: {stats['hits']} memory hits"
+    if digest_cache.backing is not None:
+        line += f", {stats['backing_hits']} disk hits"
+    line += f", {stats['misses']} misses ({stats['hit_rate']:.1f}% hit rate, {stats['size']} entries)"
+    print(line)
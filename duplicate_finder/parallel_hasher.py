@@ -5,15 +5,20 @@ Parallel file hashing utilities for improved I/O performance.
 import os
 import sys
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, Optional, Union
 from collections import defaultdict
 
 from tqdm import tqdm
 
-from .hasher import calculate_file_hash, get_file_size
+from .hasher import calculate_file_hash, calculate_partial_hash_state, resume_file_hash, get_file_size, PartialHashState
 from .adaptive_optimizer import AdaptiveWorkerPool, get_adaptive_config
+from .hash_cache import HashCache
+from .scanner import FileRecord, get_file_record
+
+# Tasks kept in flight per worker by iter_hash_files
+DEFAULT_WINDOW_PER_WORKER = 4
 
 
 def get_optimal_worker_count(path: Optional[Path] = None, adaptive: bool = False) -> int:
@@ -37,62 +42,255 @@ def get_optimal_worker_count(path: Optional[Path] = None, adaptive: bool = False
     return optimal_workers
 
 
+def _cache_record(file_path: Path, records: Optional[Dict[Path, FileRecord]]) -> Optional[FileRecord]:
+    """Stat data to key the cache on, from ``records`` or a fresh stat."""
+    record = records.get(file_path) if records else None
+    if record is None:
+        record = get_file_record(file_path)
+    return record
+
+
+def _lookup_cached(
+    files: List[Path],
+    partial: bool,
+    hash_cache: HashCache,
+    records: Optional[Dict[Path, FileRecord]],
+    resolve: Optional[Callable[[Any], FileRecord]] = None
+) -> Tuple[Dict[Path, Optional[str]], List[Path], Dict[Path, FileRecord]]:
+    """
+    Split files into cache hits and files that still need hashing.
+    
+    Stat data comes from ``records`` when provided; other files are stat'ed.
+    With ``resolve``, files are opaque keys (e.g. file table IDs) and their
+    records come from resolve(key).
+    
+    Returns:
+        Tuple of (cached results, files to hash, records to store digests under)
+    """
+    cached = {}
+    to_hash = []
+    cache_keys = {}
+    for file_path in files:
+        record = resolve(file_path) if resolve is not None else _cache_record(file_path, records)
+        if record is None:
+            to_hash.append(file_path)
+            continue
+        digest = hash_cache.get(record, partial)
+        if digest is None:
+            to_hash.append(file_path)
+            cache_keys[file_path] = record
+        else:
+            cached[file_path] = digest
+    return cached, to_hash, cache_keys
+
+
+def _store_cached(
+    results: Dict[Path, Optional[str]],
+    cache_keys: Dict[Path, FileRecord],
+    partial: bool,
+    hash_cache: HashCache
+) -> None:
+    """Write freshly computed digests to the cache."""
+    for file_path, record in cache_keys.items():
+        digest = results.get(file_path)
+        if digest:
+            hash_cache.put(record, digest, partial)
+    hash_cache.flush()
+
+
+def _hash_one(
+    file_path: Path,
+    partial: bool,
+    partial_states: Optional[Dict[Any, PartialHashState]],
+    key: Any = None
+) -> Optional[str]:
+    """
+    Hash one file, recording or resuming partial hash state when requested.
+    
+    With partial=True the resumable state is stored in ``partial_states``
+    under ``key`` (the path by default); with partial=False a stored state
+    lets the full hash skip the prefix.
+    """
+    if partial_states is None:
+        return calculate_file_hash(file_path, partial)
+    if key is None:
+        key = file_path
+    if partial:
+        partial_state = calculate_partial_hash_state(file_path)
+        if partial_state is None:
+            return None
+        partial_states[key] = partial_state
+        return partial_state.digest
+    partial_state = partial_states.get(key)
+    if partial_state is None:
+        return calculate_file_hash(file_path, partial)
+    return resume_file_hash(file_path, partial_state)
+
+
+def _timed_hash_one(
+    file_path: Path,
+    partial: bool,
+    partial_states: Optional[Dict[Any, PartialHashState]],
+    key: Any = None
+) -> Tuple[Optional[str], float]:
+    """Run _hash_one and report how long it took."""
+    start_time = time.perf_counter()
+    digest = _hash_one(file_path, partial, partial_states, key)
+    return digest, time.perf_counter() - start_time
+
+
+def iter_hash_files(
+    files: Iterable[Union[Path, FileRecord]],
+    partial: bool = False,
+    max_workers: Optional[int] = None,
+    window_per_worker: int = DEFAULT_WINDOW_PER_WORKER,
+    hash_cache: Optional[HashCache] = None,
+    records: Optional[Dict[Path, FileRecord]] = None,
+    partial_states: Optional[Dict[Any, PartialHashState]] = None,
+    on_timing: Optional[Callable[[float], None]] = None,
+    resolve: Optional[Callable[[Any], FileRecord]] = None
+) -> Iterator[Tuple[Any, Optional[str]]]:
+    """
+    Hash files from any iterable, yielding (path, digest) as each finishes.
+    
+    Paths are pulled lazily and at most ``max_workers * window_per_worker``
+    tasks are in flight at once, so memory stays flat however many files
+    there are, and callers can group results while hashing continues.
+    Results arrive in completion order; unreadable files yield None.
+    
+    With ``resolve``, items are opaque keys such as file table IDs: each is
+    turned into a FileRecord only when it is submitted, and results and
+    partial states are keyed by the item rather than by path.
+    
+    Args:
+        files: Paths to hash, or FileRecords that carry their own cache
+            key; may be a generator
+        partial: If True, only hash first 4KB
+        max_workers: Maximum number of worker threads (None for auto)
+        window_per_worker: In-flight tasks allowed per worker
+        hash_cache: Persistent digest cache to consult and update; hits are
+            yielded without being submitted
+        records: Scan-time stat data used as cache keys
+        partial_states: Resumable partial hash states; filled in when
+            partial=True, resumed from when partial=False
+        on_timing: Called with the seconds each hash took
+        resolve: Maps each item to the FileRecord to hash
+        
+    Yields:
+        Tuples of (file path, or item with ``resolve``, digest or None)
+    """
+    if max_workers is None:
+        max_workers = get_optimal_worker_count()
+    window = max(1, max_workers * window_per_worker)
+    
+    pending = iter(files)
+    exhausted = False
+    in_flight = {}
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            while True:
+                # Top the window up before waiting on anything
+                while not exhausted and len(in_flight) < window:
+                    item = next(pending, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    key = item
+                    if resolve is not None:
+                        item = resolve(key)
+                    file_path = item.path if isinstance(item, FileRecord) else item
+                    if resolve is None:
+                        key = file_path
+                    record = None
+                    if hash_cache is not None:
+                        record = item if isinstance(item, FileRecord) else _cache_record(file_path, records)
+                        digest = hash_cache.get(record, partial) if record is not None else None
+                        if digest is not None:
+                            yield key, digest
+                            continue
+                    future = executor.submit(_timed_hash_one, file_path, partial, partial_states, key)
+                    in_flight[future] = (key, file_path, record)
+                
+                if not in_flight:
+                    break
+                
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, file_path, record = in_flight.pop(future)
+                    try:
+                        digest, elapsed = future.result()
+                        if on_timing is not None:
+                            on_timing(elapsed)
+                    except Exception as e:
+                        # Handle any unexpected errors
+                        print(f"Error hashing {file_path}: {e}", file=sys.stderr)
+                        digest = None
+                    if digest and record is not None:
+                        hash_cache.put(record, digest, partial)
+                    yield key, digest
+        finally:
+            # Consumer stopped early: drop queued work, let running tasks end
+            for future in in_flight:
+                future.cancel()
+            if hash_cache is not None:
+                hash_cache.flush()
+
+
 def parallel_hash_files(
-    files: List[Path], 
+    files: List[Union[Path, FileRecord]], 
     partial: bool = False,
     desc: str = "Hashing files",
     quiet: bool = False,
-    max_workers: Optional[int] = None
-) -> Dict[Path, Optional[str]]:
+    max_workers: Optional[int] = None,
+    hash_cache: Optional[HashCache] = None,
+    records: Optional[Dict[Path, FileRecord]] = None,
+    partial_states: Optional[Dict[Any, PartialHashState]] = None,
+    resolve: Optional[Callable[[Any], FileRecord]] = None
+) -> Dict[Any, Optional[str]]:
     """
     Hash multiple files in parallel using ThreadPoolExecutor.
     
+    Collects iter_hash_files into a dictionary; use iter_hash_files
+    directly to consume results as they arrive.
+    
     Args:
-        files: List of file paths to hash
+        files: List of file paths (or FileRecords) to hash
         partial: If True, only hash first 4KB
         desc: Description for progress bar
         quiet: Suppress progress output
         max_workers: Maximum number of worker threads (None for auto)
+        hash_cache: Persistent digest cache to consult and update
+        records: Scan-time stat data used as cache keys
+        partial_states: Resumable partial hash states; filled in when
+            partial=True, resumed from when partial=False
+        resolve: Maps each item to the FileRecord to hash (see iter_hash_files)
         
     Returns:
-        Dictionary mapping file paths to their hashes
+        Dictionary mapping file paths (or items) to their hashes
     """
     if not files:
         return {}
     
-    # Determine worker count
-    if max_workers is None:
-        max_workers = get_optimal_worker_count()
-    
     results = {}
-    
-    # Use ThreadPoolExecutor for parallel I/O
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submit all hashing tasks
-        future_to_file = {
-            executor.submit(calculate_file_hash, file_path, partial): file_path
-            for file_path in files
-        }
-        
-        # Process results as they complete with progress bar
-        with tqdm(
-            total=len(files), 
-            desc=desc, 
-            unit=" files", 
-            disable=quiet,
-            leave=False
-        ) as pbar:
-            for future in as_completed(future_to_file):
-                file_path = future_to_file[future]
-                try:
-                    hash_value = future.result()
-                    results[file_path] = hash_value
-                except Exception as e:
-                    # Handle any unexpected errors
-                    print(f"Error hashing {file_path}: {e}", file=sys.stderr)
-                    results[file_path] = None
-                finally:
-                    pbar.update(1)
+    with tqdm(
+        total=len(files), 
+        desc=desc, 
+        unit=" files", 
+        disable=quiet,
+        leave=False
+    ) as pbar:
+        for file_path, hash_value in iter_hash_files(
+            files,
+            partial=partial,
+            max_workers=max_workers,
+            hash_cache=hash_cache,
+            records=records,
+            partial_states=partial_states,
+            resolve=resolve
+        ):
+            results[file_path] = hash_value
+            pbar.update(1)
     
     return results
 
@@ -219,8 +417,12 @@ def parallel_hash_files_adaptive(
     partial: bool = False,
     desc: str = "Hashing files",
     quiet: bool = False,
-    path: Optional[Path] = None
-) -> Dict[Path, Optional[str]]:
+    path: Optional[Path] = None,
+    hash_cache: Optional[HashCache] = None,
+    records: Optional[Dict[Path, FileRecord]] = None,
+    partial_states: Optional[Dict[Any, PartialHashState]] = None,
+    resolve: Optional[Callable[[Any], FileRecord]] = None
+) -> Dict[Any, Optional[str]]:
     """
     Hash multiple files in parallel using adaptive optimization.
     
@@ -228,21 +430,27 @@ def parallel_hash_files_adaptive(
     resources and workload characteristics.
     
     Args:
-        files: List of file paths to hash
+        files: List of file paths (or FileRecords) to hash
         partial: If True, only hash first 4KB
         desc: Description for progress bar
         quiet: Suppress progress output
         path: Path for disk type detection
+        hash_cache: Persistent digest cache to consult and update
+        records: Scan-time stat data used as cache keys
+        partial_states: Resumable partial hash states; filled in when
+            partial=True, resumed from when partial=False
+        resolve: Maps each item to the FileRecord to hash (see iter_hash_files)
         
     Returns:
-        Dictionary mapping file paths to their hashes
+        Dictionary mapping file paths (or items) to their hashes
     """
     if not files:
         return {}
     
     # Get the path from first file if not provided
     if path is None and files:
-        path = files[0].parent
+        first = resolve(files[0]) if resolve is not None else files[0]
+        path = (first.path if isinstance(first, FileRecord) else first).parent
     
     # Create adaptive worker pool
     pool = AdaptiveWorkerPool(path)
@@ -257,40 +465,27 @@ def parallel_hash_files_adaptive(
     
     results = {}
     
-    # Use ThreadPoolExecutor with adaptive worker count
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        # Submit all hashing tasks
-        future_to_file = {}
-        for file_path in files:
-            future = executor.submit(calculate_file_hash, file_path, partial)
-            future_to_file[future] = (file_path, time.time())
-        
-        # Process results with performance tracking
-        with tqdm(
-            total=len(files),
-            desc=desc,
-            unit=" files",
-            disable=quiet,
-            leave=False
-        ) as pbar:
-            for future in as_completed(future_to_file):
-                file_path, start_time = future_to_file[future]
-                elapsed = time.time() - start_time
-                
-                try:
-                    hash_value = future.result()
-                    results[file_path] = hash_value
-                    
-                    # Record performance for adaptive adjustment
-                    if partial:
-                        pool.record_io_time(elapsed)
-                    else:
-                        pool.record_cpu_time(elapsed)
-                        
-                except Exception as e:
-                    print(f"Error hashing {file_path}: {e}", file=sys.stderr)
-                    results[file_path] = None
-                finally:
-                    pbar.update(1)
+    # Record performance for adaptive adjustment
+    on_timing = pool.record_io_time if partial else pool.record_cpu_time
     
-    return results
\ No newline at end of file
+    with tqdm(
+        total=len(files),
+        desc=desc,
+        unit=" files",
+        disable=quiet,
+        leave=False
+    ) as pbar:
+        for file_path, hash_value in iter_hash_files(
+            files,
+            partial=partial,
+            max_workers=workers,
+            hash_cache=hash_cache,
+            records=records,
+            partial_states=partial_states,
+            on_timing=on_timing,
+            resolve=resolve
+        ):
+            results[file_path] = hash_value
+            pbar.update(1)
+    
+    return results
@@ -0,0 +1,296 @@
+"""
+Pipelined execution of the hashing stages.
+"""
+
+import sys
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from tqdm import tqdm
+
+from .byte_compare import compare_and_hash, _compare_keyed_group, DIRECT_COMPARE_MAX_FILES
+from .hash_cache import HashCache
+from .hasher import PARTIAL_HASH_SIZE, PartialHashState, calculate_file_hash, calculate_partial_hash_state, resume_file_hash
+from .parallel_hasher import get_optimal_worker_count, DEFAULT_WINDOW_PER_WORKER, _cache_record, _lookup_cached
+from .scanner import FileRecord
+
+STAGE_PARTIAL = 'partial'
+STAGE_COMPARE = 'compare'
+STAGE_FULL = 'full'
+PIPELINE_STAGES = (STAGE_PARTIAL, STAGE_COMPARE, STAGE_FULL)
+
+
+@dataclass
+class StageOccupancy:
+    """Work done by one pipeline stage."""
+    tasks: int = 0
+    busy_seconds: float = 0.0
+    peak_in_flight: int = 0
+
+
+@dataclass
+class PipelineStats:
+    """Per-stage occupancy of a pipelined run."""
+    workers: int = 0
+    wall_seconds: float = 0.0
+    stages: Dict[str, StageOccupancy] = field(
+        default_factory=lambda: {stage: StageOccupancy() for stage in PIPELINE_STAGES}
+    )
+
+    def occupancy(self, stage: str) -> float:
+        """Fraction of available worker time spent in ``stage`` (0.0 - 1.0)."""
+        capacity = self.wall_seconds * self.workers
+        return self.stages[stage].busy_seconds / capacity if capacity > 0 else 0.0
+
+    def summary(self) -> List[str]:
+        """Human-readable report, one line per stage."""
+        lines = []
+        for stage in PIPELINE_STAGES:
+            occupancy = self.stages[stage]
+            lines.append(
+                f"{stage:<8} {occupancy.tasks:>7,} tasks  {occupancy.busy_seconds:>8.2f}s busy  "
+                f"{self.occupancy(stage) * 100:>5.1f}% of worker time  "
+                f"peak {occupancy.peak_in_flight} in flight"
+            )
+        return lines
+
+
+def _timed(func: Callable, *args):
+    """Run ``func`` and return (result, seconds taken)."""
+    start_time = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start_time
+
+
+def _full_hash(file_path: Path, partial_state: Optional[PartialHashState]) -> Optional[str]:
+    """Full digest, resuming after the prefix when its state is known."""
+    if partial_state is None:
+        return calculate_file_hash(file_path, partial=False)
+    return resume_file_hash(file_path, partial_state)
+
+
+def pipelined_hash_groups(
+    size_groups: Dict[int, List[Path]],
+    quiet: bool = False,
+    max_workers: Optional[int] = None,
+    window_per_worker: int = DEFAULT_WINDOW_PER_WORKER,
+    hash_cache: Optional[HashCache] = None,
+    records: Optional[Dict[Path, FileRecord]] = None,
+    resolve: Optional[Callable[[Any], FileRecord]] = None
+) -> Tuple[Dict[str, List[Path]], List[Path], PipelineStats]:
+    """
+    Run Stages 2 and 3 as a pipeline instead of two barriers.
+
+    Every size group moves on independently: as soon as all of its partial
+    hashes are in, it is split by partial digest and its candidates are
+    queued for direct comparison (groups of up to DIRECT_COMPARE_MAX_FILES)
+    or full hashing, while other groups are still being partially hashed.
+    One thread pool serves all stages; later stages are scheduled first so
+    groups finish, and release their hash states, as early as possible.
+    At most ``max_workers * window_per_worker`` tasks are in flight.
+
+    The results are the same as for the two-stage scheme.
+
+    Args:
+        size_groups: size -> files with that size (groups of 2+ files)
+        quiet: Suppress progress output
+        max_workers: Maximum number of worker threads (None for auto)
+        window_per_worker: In-flight tasks allowed per worker
+        hash_cache: Persistent digest cache to consult and update
+        records: Scan-time stat data used as cache keys
+        resolve: Maps opaque file keys (e.g. file table IDs) to their
+            records; queues and results then hold the keys, and paths are
+            only built when a task is submitted
+
+    Returns:
+        Tuple of (full_hash -> files, files that were full-hashed, stats)
+    """
+    if max_workers is None:
+        max_workers = get_optimal_worker_count()
+    window = max(1, max_workers * window_per_worker)
+    stats = PipelineStats(workers=max_workers)
+
+    full_hash_to_files: Dict[str, List[Path]] = defaultdict(list)
+    candidates: List[Path] = []
+    different: Set[Path] = set()
+
+    # Per size group: files still awaiting a partial hash, and digests so far
+    remaining: Dict[int, int] = {}
+    partial_digests: Dict[int, Dict[Path, str]] = defaultdict(dict)
+    # Hash states of files whose group is not yet resolved
+    partial_states: Dict[Path, PartialHashState] = {}
+    # Stat data to store fresh digests under, per (path, partial)
+    cache_keys: Dict[Tuple[Path, bool], FileRecord] = {}
+
+    queues: Dict[str, Deque] = {stage: deque() for stage in PIPELINE_STAGES}
+    for size, file_group in size_groups.items():
+        remaining[size] = len(file_group)
+        queues[STAGE_PARTIAL].extend((size, file_path) for file_path in file_group)
+
+    in_flight = {}
+    stage_in_flight = {stage: 0 for stage in PIPELINE_STAGES}
+    pbar = tqdm(
+        total=len(queues[STAGE_PARTIAL]),
+        desc="Pipelined hashing",
+        unit=" tasks",
+        disable=quiet,
+        leave=False
+    )
+
+    def enqueue(stage: str, item) -> None:
+        queues[stage].append(item)
+        pbar.total += 1
+        pbar.refresh()
+
+    def finish_partial(size: int, file_path: Path, digest: Optional[str]) -> None:
+        """Record a partial hash; once the size group is complete, split it."""
+        if digest:
+            partial_digests[size][file_path] = digest
+        remaining[size] -= 1
+        if remaining[size]:
+            return
+
+        by_partial = defaultdict(list)
+        for member, member_digest in partial_digests.pop(size, {}).items():
+            by_partial[member_digest].append(member)
+        for partial_digest, group in by_partial.items():
+            if len(group) < 2:
+                for member in group:
+                    partial_states.pop(member, None)
+                continue
+            candidates.extend(group)
+            if size <= PARTIAL_HASH_SIZE:
+                # The partial hash already covered the whole file
+                full_hash_to_files[partial_digest].extend(group)
+            elif len(group) <= DIRECT_COMPARE_MAX_FILES:
+                # Every member shares the prefix, so any member's state will do
+                enqueue(STAGE_COMPARE, (group, partial_states.get(group[0])))
+            else:
+                for member in group:
+                    enqueue(STAGE_FULL, (member, partial_states.get(member)))
+            for member in group:
+                partial_states.pop(member, None)
+
+    def path_of(file_path) -> Path:
+        return resolve(file_path).path if resolve is not None else file_path
+
+    def cached_digest(file_path: Path, partial: bool) -> Optional[str]:
+        """Cache lookup; on a miss, remember the key to store the digest under."""
+        record = resolve(file_path) if resolve is not None else _cache_record(file_path, records)
+        if record is None:
+            return None
+        digest = hash_cache.get(record, partial)
+        if digest is None:
+            cache_keys[(file_path, partial)] = record
+        return digest
+
+    def store(file_path: Path, digest: str, partial: bool) -> None:
+        record = cache_keys.pop((file_path, partial), None)
+        if record is not None:
+            hash_cache.put(record, digest, partial)
+
+    def submit_next() -> bool:
+        """Submit one task, preferring the latest stage. False if all queues are empty."""
+        for stage in reversed(PIPELINE_STAGES):
+            if not queues[stage]:
+                continue
+            item = queues[stage].popleft()
+            if stage == STAGE_PARTIAL:
+                size, file_path = item
+                digest = cached_digest(file_path, True) if hash_cache is not None else None
+                if digest is not None:
+                    pbar.update(1)
+                    finish_partial(size, file_path, digest)
+                    return True
+                future = executor.submit(_timed, calculate_partial_hash_state, path_of(file_path))
+            elif stage == STAGE_COMPARE:
+                group, partial_state = item
+                if hash_cache is not None:
+                    cached, to_hash, keys = _lookup_cached(group, False, hash_cache, records, resolve)
+                    if not to_hash:
+                        for file_path, digest in cached.items():
+                            full_hash_to_files[digest].append(file_path)
+                        pbar.update(1)
+                        return True
+                    cache_keys.update({(file_path, False): record for file_path, record in keys.items()})
+                if resolve is not None:
+                    future = executor.submit(_timed, _compare_keyed_group, group, partial_state, path_of)
+                else:
+                    future = executor.submit(_timed, compare_and_hash, group, partial_state)
+            else:
+                file_path, partial_state = item
+                digest = cached_digest(file_path, False) if hash_cache is not None else None
+                if digest is not None:
+                    full_hash_to_files[digest].append(file_path)
+                    pbar.update(1)
+                    return True
+                future = executor.submit(_timed, _full_hash, path_of(file_path), partial_state)
+            in_flight[future] = (stage, item)
+            stage_in_flight[stage] += 1
+            occupancy = stats.stages[stage]
+            occupancy.peak_in_flight = max(occupancy.peak_in_flight, stage_in_flight[stage])
+            return True
+        return False
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            while True:
+                while len(in_flight) < window and submit_next():
+                    pass
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, item = in_flight.pop(future)
+                    stage_in_flight[stage] -= 1
+                    try:
+                        result, elapsed = future.result()
+                    except Exception as e:
+                        print(f"Error in {stage} stage: {e}", file=sys.stderr)
+                        result, elapsed = None, 0.0
+                    occupancy = stats.stages[stage]
+                    occupancy.tasks += 1
+                    occupancy.busy_seconds += elapsed
+                    pbar.update(1)
+
+                    if stage == STAGE_PARTIAL:
+                        size, file_path = item
+                        digest = result.digest if result is not None else None
+                        if result is not None:
+                            partial_states[file_path] = result
+                            if hash_cache is not None:
+                                store(file_path, digest, True)
+                        finish_partial(size, file_path, digest)
+                    elif stage == STAGE_COMPARE:
+                        group, _ = item
+                        identical, group_different = result if result is not None else ({}, list(group))
+                        for digest, file_list in identical.items():
+                            full_hash_to_files[digest].extend(file_list)
+                            if hash_cache is not None:
+                                for file_path in file_list:
+                                    store(file_path, digest, False)
+                        # Files that differ from every other file were never fully hashed
+                        different.update(group_different)
+                    else:
+                        file_path, _ = item
+                        if result:
+                            full_hash_to_files[result].append(file_path)
+                            if hash_cache is not None:
+                                store(file_path, result, False)
+        finally:
+            for future in in_flight:
+                future.cancel()
+            pbar.close()
+            if hash_cache is not None:
+                hash_cache.flush()
+    stats.wall_seconds = time.perf_counter() - start_time
+
+    if different:
+        candidates = [f for f in candidates if f not in different]
+    return dict(full_hash_to_files), candidates, stats
@@ -0,0 +1,215 @@
+"""
+Progressive block hashing for candidate groups of same-size files.
+"""
+
+import os
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from .byte_compare import DIRECT_COMPARE_MAX_FILES
+from .hasher import _log_warning, new_hash, finish_digest, hash_stream, get_chunk_size
+from .hash_cache import HashCache
+from .parallel_hasher import get_optimal_worker_count, _lookup_cached, _store_cached
+from .scanner import FileRecord
+
+# First block matches the Stage 2 partial hash; each round reads 16x more
+FIRST_BLOCK_SIZE = 4096
+BLOCK_GROWTH_FACTOR = 16
+
+
+@dataclass
+class ProgressiveHashStats:
+    """I/O accounting for a progressive hashing run."""
+    rounds: int = 0
+    bytes_read: int = 0
+    # What Stage 2 (4KB partial) + Stage 3 (resumed past the prefix) would have read
+    baseline_bytes: int = 0
+    files_eliminated: int = 0
+    # Set when a directly compared group split, so Stage 3 would have stopped early
+    baseline_is_upper_bound: bool = False
+
+    @property
+    def bytes_saved(self) -> int:
+        """Bytes not read compared to the two-stage scheme."""
+        return max(self.baseline_bytes - self.bytes_read, 0)
+
+    def summary(self) -> str:
+        """One-line human-readable summary."""
+        saved_pct = (self.bytes_saved / self.baseline_bytes * 100) if self.baseline_bytes else 0
+        bound = "at most " if self.baseline_is_upper_bound else ""
+        saved = "up to " if self.baseline_is_upper_bound else ""
+        return (
+            f"Read {self.bytes_read:,} bytes in {self.rounds} rounds "
+            f"(two-stage scheme: {bound}{self.baseline_bytes:,} bytes, saved {saved}{saved_pct:.1f}%)"
+        )
+
+
+def block_schedule(first_block: int = FIRST_BLOCK_SIZE, growth: int = BLOCK_GROWTH_FACTOR) -> Iterator[int]:
+    """Yield geometrically growing block sizes: 4K, 64K, 1M, 16M, ..."""
+    block_size = first_block
+    while True:
+        yield block_size
+        block_size *= growth
+
+
+def _hash_block(file_path: Path, state, offset: int, length: int) -> Optional[int]:
+    """
+    Feed ``length`` bytes starting at ``offset`` into a running hash state.
+
+    Returns:
+        Number of bytes read, or None if the file could not be read
+    """
+    try:
+        with open(file_path, "rb") as f:
+            f.seek(offset)
+            return hash_stream(f, state, get_chunk_size(os.fstat(f.fileno()).st_dev, file_path), length)
+    except PermissionError as e:
+        _log_warning('permission_denied', f"Permission denied reading {file_path}: {e}")
+    except FileNotFoundError as e:
+        _log_warning('file_not_found', f"File not found {file_path}: {e}")
+    except (OSError, IOError) as e:
+        _log_warning('io_errors', f"I/O error reading {file_path}: {e}")
+    return None
+
+
+def progressive_hash_groups(
+    size_groups: Dict[int, List[Path]],
+    quiet: bool = False,
+    max_workers: Optional[int] = None,
+    hash_cache: Optional[HashCache] = None,
+    records: Optional[Dict[Path, FileRecord]] = None,
+    resolve: Optional[Callable[[Any], FileRecord]] = None
+) -> Tuple[Dict[str, List[Path]], List[Path], ProgressiveHashStats]:
+    """
+    Split same-size groups by hashing successively larger blocks.
+
+    Each file keeps a running hash state. After every round, files are
+    regrouped by (size, digest of the prefix read so far) and singletons are
+    dropped, so files that differ early are never read to the end. Once a
+    file is fully read its prefix digest is its full hash, identical to
+    calculate_file_hash(partial=False).
+
+    Args:
+        size_groups: size -> files with that size (groups of 2+ files)
+        quiet: Suppress progress output
+        max_workers: Maximum number of worker threads (None for auto)
+        hash_cache: Persistent digest cache; groups fully covered by cached
+            full digests are not read at all
+        records: Scan-time stat data used as cache keys
+        resolve: Maps opaque file keys (e.g. file table IDs) to their
+            records; groups and results then hold the keys, and paths are
+            only built while a block is read
+
+    Returns:
+        Tuple of (full_hash -> files, unique files, stats)
+    """
+    if max_workers is None:
+        max_workers = get_optimal_worker_count()
+
+    stats = ProgressiveHashStats()
+    full_hash_to_files: Dict[str, List[Path]] = defaultdict(list)
+    unique_files: List[Path] = []
+    cache_keys: Dict[Path, FileRecord] = {}
+    # Round-1 survivors Stage 3 would compare byte-for-byte instead of hashing
+    direct_groups: List[List[Path]] = []
+
+    # Live groups: (size, prefix digest) -> files; starts with plain size groups
+    groups: Dict[Tuple[int, str], List[Path]] = {}
+    for size, file_group in size_groups.items():
+        if hash_cache is not None:
+            cached, to_hash, keys = _lookup_cached(file_group, False, hash_cache, records, resolve)
+            if not to_hash:
+                for file_path, digest in cached.items():
+                    full_hash_to_files[digest].append(file_path)
+                continue
+            cache_keys.update(keys)
+        groups[(size, '')] = list(file_group)
+
+    states = {file_path: new_hash() for group in groups.values() for file_path in group}
+    offset = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for block_size in block_schedule():
+            if not groups:
+                break
+            stats.rounds += 1
+            pending = [
+                (size, file_path)
+                for (size, _), group in groups.items()
+                for file_path in group
+            ]
+
+            futures = {
+                executor.submit(
+                    _hash_block,
+                    resolve(file_path).path if resolve is not None else file_path,
+                    states[file_path], offset, min(block_size, size - offset)
+                ): (size, file_path)
+                for size, file_path in pending
+                if offset < size
+            }
+            failed = set()
+            with tqdm(
+                total=len(futures),
+                desc=f"Progressive hashing (round {stats.rounds})",
+                unit=" files",
+                disable=quiet,
+                leave=False
+            ) as pbar:
+                for future in as_completed(futures):
+                    size, file_path = futures[future]
+                    try:
+                        bytes_read = future.result()
+                    except Exception as e:
+                        print(f"Error hashing {file_path}: {e}", file=sys.stderr)
+                        bytes_read = None
+                    if bytes_read is None:
+                        failed.add(file_path)
+                    else:
+                        stats.bytes_read += bytes_read
+                        if stats.rounds == 1:
+                            stats.baseline_bytes += bytes_read
+                    pbar.update(1)
+
+            offset += block_size
+            next_groups: Dict[Tuple[int, str], List[Path]] = defaultdict(list)
+            for size, file_path in pending:
+                if file_path in failed:
+                    unique_files.append(file_path)
+                    continue
+                next_groups[(size, finish_digest(states[file_path]))].append(file_path)
+
+            groups = {}
+            for (size, digest), group in next_groups.items():
+                if len(group) < 2:
+                    unique_files.extend(group)
+                    stats.files_eliminated += len(group)
+                    continue
+                # Stage 3 resumes survivors of the 4KB round past the prefix
+                if stats.rounds == 1 and size > FIRST_BLOCK_SIZE:
+                    stats.baseline_bytes += (size - FIRST_BLOCK_SIZE) * len(group)
+                    if len(group) <= DIRECT_COMPARE_MAX_FILES:
+                        direct_groups.append(group)
+                if offset >= size:
+                    full_hash_to_files[digest].extend(group)
+                else:
+                    groups[(size, digest)] = group
+
+    finished = {file_path: digest for digest, group in full_hash_to_files.items() for file_path in group}
+    # A direct comparison stops at the first difference, so only groups that
+    # stayed identical to the end are read in full by Stage 3
+    stats.baseline_is_upper_bound = any(
+        len({finished.get(file_path) for file_path in group}) != 1 or group[0] not in finished
+        for group in direct_groups
+    )
+
+    if hash_cache is not None:
+        _store_cached(finished, cache_keys, False, hash_cache)
+
+    return dict(full_hash_to_files), unique_files, stats
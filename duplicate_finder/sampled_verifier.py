@@ -0,0 +1,103 @@
+"""
+Sampled content verification of fast-mode duplicate groups.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .fast_detector import DEFAULT_READ_WORKERS, DuplicateGroup, FileMetadata, read_files_concurrently
+from .hasher import _log_read_error, new_hash, finish_digest, Digest
+
+# Bytes read at each sample point
+DEFAULT_SAMPLE_SIZE = 4096
+
+DEFAULT_SAMPLE_WORKERS = DEFAULT_READ_WORKERS
+
+MATCH_SAMPLED = 'sampled_verified'
+
+
+def sample_offsets(size: int, sample_size: int = DEFAULT_SAMPLE_SIZE) -> List[int]:
+    """
+    Offsets of the head, middle and tail samples of a ``size``-byte file.
+
+    Files of up to three samples are read whole (a single offset of 0).
+    """
+    if size <= 3 * sample_size:
+        return [0]
+    return [0, (size - sample_size) // 2, size - sample_size]
+
+
+def sample_digest(file_path: Path, size: int, sample_size: int = DEFAULT_SAMPLE_SIZE) -> Optional[Digest]:
+    """
+    Digest of the size and the head, middle and tail samples of a file.
+
+    At most ``3 * sample_size`` bytes are read.
+
+    Returns:
+        Digest, or None if the file cannot be read
+    """
+    file_hash = new_hash()
+    file_hash.update(size.to_bytes(8, "big"))
+    read_size = size if size <= 3 * sample_size else sample_size
+    try:
+        with open(file_path, "rb") as f:
+            for offset in sample_offsets(size, sample_size):
+                f.seek(offset)
+                file_hash.update(f.read(read_size))
+    except Exception as e:
+        _log_read_error(file_path, e)
+        return None
+    return finish_digest(file_hash)
+
+
+def verify_groups_sampled(
+    duplicate_groups: List[DuplicateGroup],
+    sample_size: int = DEFAULT_SAMPLE_SIZE,
+    max_workers: int = DEFAULT_SAMPLE_WORKERS,
+    quiet: bool = False
+) -> Tuple[List[DuplicateGroup], List[FileMetadata]]:
+    """
+    Confirm metadata-matched groups by hashing a few samples of each file.
+
+    Every file gets a digest of its head, middle and tail samples. Each
+    group is split by that digest; subgroups of 2+ files become
+    ``sampled_verified`` groups and the rest, including unreadable files,
+    are returned as unique. Files that match on every sample are very
+    likely, but not proven, identical.
+
+    Args:
+        duplicate_groups: Groups from find_metadata_duplicates
+        sample_size: Bytes read at each sample point
+        max_workers: Files sampled concurrently
+        quiet: Suppress progress output
+
+    Returns:
+        Tuple of (verified groups, files that turned out to be unique)
+    """
+    files = [file_meta for group in duplicate_groups for file_meta in group.files]
+    # In the order of ``files``, i.e. group by group
+    digests = iter(read_files_concurrently(
+        lambda path, size: sample_digest(path, size, sample_size),
+        files, max_workers, "Sampling files", quiet
+    ))
+
+    verified = []
+    unique_files = []
+    for group in duplicate_groups:
+        by_digest: Dict[Digest, List[FileMetadata]] = {}
+        for file_meta in group.files:
+            digest = next(digests)
+            if digest is None:
+                unique_files.append(file_meta)
+            else:
+                by_digest.setdefault(digest, []).append(file_meta)
+        for matching_files in by_digest.values():
+            if len(matching_files) > 1:
+                verified.append(DuplicateGroup(
+                    files=matching_files,
+                    match_type=MATCH_SAMPLED,
+                    category=group.category
+                ))
+            else:
+                unique_files.extend(matching_files)
+    return verified, unique_files
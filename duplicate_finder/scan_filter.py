@@ -0,0 +1,212 @@
+"""
+Scan-time filters and traversal boundaries for pruning the directory walk.
+"""
+
+import fnmatch
+import os
+import re
+import stat
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Pattern, Sequence
+
+SYMLINKS_SKIP = 'skip'
+SYMLINKS_FILES = 'follow-files'
+SYMLINKS_WITHIN_ROOT = 'follow-within-root'
+SYMLINKS_ALL = 'follow-all'
+SYMLINK_POLICIES = (SYMLINKS_SKIP, SYMLINKS_FILES, SYMLINKS_WITHIN_ROOT, SYMLINKS_ALL)
+DEFAULT_SYMLINK_POLICY = SYMLINKS_FILES
+
+# ScanResult.filtered keys for entries a TraversalGuard turns away
+SKIP_SYMLINK = 'symlinks'
+SKIP_MOUNT_POINT = 'mount_points'
+SKIP_LOOP = 'loops'
+
+
+def _compile_globs(patterns: Sequence[str]) -> Optional[Pattern]:
+    """One regex matching any of ``patterns`` (case rules follow the OS)."""
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(os.path.normcase(pattern)) for pattern in patterns))
+
+
+def _glob_targets_path(patterns: Sequence[str]) -> bool:
+    return any("/" in pattern or os.sep in pattern for pattern in patterns)
+
+
+@dataclass
+class ScanFilter:
+    """
+    Which files and directories a scan keeps.
+
+    Glob patterns are matched against the entry name, or against the full
+    path when the pattern contains a path separator (``*/build/*.o``).
+    Name rules are checked from the directory listing, before any stat
+    call; size limits are checked on the stat result, before a file is
+    recorded. Excluded directories are never listed.
+
+    Attributes:
+        min_size: Smallest file size kept, in bytes (None for no limit)
+        max_size: Largest file size kept, in bytes (None for no limit)
+        include: If given, only files matching one of these globs are kept
+        exclude: Files matching any of these globs are dropped
+        exclude_dirs: Directories matching any of these globs are not descended
+    """
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+    include: Sequence[str] = field(default_factory=tuple)
+    exclude: Sequence[str] = field(default_factory=tuple)
+    exclude_dirs: Sequence[str] = field(default_factory=tuple)
+
+    def __post_init__(self):
+        self._include = _compile_globs(self.include)
+        self._exclude = _compile_globs(self.exclude)
+        self._exclude_dirs = _compile_globs(self.exclude_dirs)
+        self._file_paths = _glob_targets_path(self.include) or _glob_targets_path(self.exclude)
+        self._dir_paths = _glob_targets_path(self.exclude_dirs)
+
+    @property
+    def active(self) -> bool:
+        """True if any rule is set."""
+        return bool(
+            self.min_size is not None or self.max_size is not None
+            or self.include or self.exclude or self.exclude_dirs
+        )
+
+    def allows_dir(self, name: str, path: str) -> bool:
+        """Whether to descend into a directory."""
+        if self._exclude_dirs is None:
+            return True
+        name = os.path.normcase(name)
+        if self._exclude_dirs.match(name):
+            return False
+        return not (self._dir_paths and self._exclude_dirs.match(os.path.normcase(path)))
+
+    def allows_name(self, name: str, path: str) -> bool:
+        """Whether a file passes the include/exclude globs."""
+        if self._include is None and self._exclude is None:
+            return True
+        name = os.path.normcase(name)
+        full_path = os.path.normcase(path) if self._file_paths else None
+
+        def matches(regex: Pattern) -> bool:
+            return bool(regex.match(name) or (full_path is not None and regex.match(full_path)))
+
+        if self._exclude is not None and matches(self._exclude):
+            return False
+        return self._include is None or matches(self._include)
+
+    def allows_size(self, size: int) -> bool:
+        """Whether a file size is within the limits."""
+        if self.min_size is not None and size < self.min_size:
+            return False
+        return self.max_size is None or size <= self.max_size
+
+
+def _is_within(path: Path, root: Path) -> bool:
+    try:
+        path.relative_to(root)
+        return True
+    except ValueError:
+        return False
+
+
+class TraversalGuard:
+    """
+    Device and symlink boundaries of one scan, with loop detection.
+
+    Symlinks are handled per policy:
+
+    - ``skip``: every symlink is left out
+    - ``follow-files`` (default): links to files are kept wherever they
+      point; symlinked directories are not descended
+    - ``follow-within-root``: links whose target lies inside the scan root
+      are kept; symlinked directories are not descended, as their targets
+      are scanned under their real paths anyway
+    - ``follow-all``: every link is kept and symlinked directories outside
+      the root are descended
+
+    With ``one_file_system`` directories and link targets on a different
+    device (st_dev) than the root are left out, so mounts under the root
+    are never entered. In follow-all mode each descended directory's
+    (st_dev, st_ino) is recorded and a directory reached a second time,
+    through a link cycle or a bind mount, is skipped.
+
+    One guard may be shared by several listing threads. A directory reached
+    by several paths belongs to the smallest of them (compared by parts),
+    which is the one a sorted depth-first walk reaches first; a path found
+    later that is smaller takes the directory over and the walk's earlier
+    path is listed in ``superseded``, so the result does not depend on
+    thread timing.
+    """
+
+    def __init__(self, root: Path, one_file_system: bool = False, symlinks: str = DEFAULT_SYMLINK_POLICY):
+        """
+        Args:
+            root: Directory the scan starts from
+            one_file_system: Stay on the root's device
+            symlinks: One of SYMLINK_POLICIES
+
+        Raises:
+            ValueError: If ``symlinks`` is not a known policy
+        """
+        if symlinks not in SYMLINK_POLICIES:
+            raise ValueError(f"Unknown symlink policy: {symlinks!r} (choose from {', '.join(SYMLINK_POLICIES)})")
+        self.root = Path(root).resolve()
+        self.one_file_system = one_file_system
+        self.symlinks = symlinks
+        # (st_dev, st_ino) -> path the directory is scanned under
+        self._visited = {}
+        self.superseded: List[Path] = []
+        self._lock = threading.Lock()
+        try:
+            root_stat = os.stat(self.root)
+        except OSError:
+            # Reported by the scan itself when it lists the root
+            self.root_dev = None
+        else:
+            self.root_dev = root_stat.st_dev
+            self._visited[(root_stat.st_dev, root_stat.st_ino)] = Path(root)
+
+    @property
+    def checks_directories(self) -> bool:
+        """True if enter_directory() needs the stat result of every directory."""
+        return self.one_file_system or self.symlinks == SYMLINKS_ALL
+
+    def enter_directory(self, stat_result: os.stat_result, path: Optional[str] = None) -> Optional[str]:
+        """
+        Check a directory before descending into it.
+
+        Args:
+            stat_result: The directory's stat data
+            path: Path the directory would be scanned under (None if unknown;
+                such a directory never takes over one already visited)
+
+        Returns:
+            None to descend, or the reason to skip it (SKIP_MOUNT_POINT, SKIP_LOOP)
+        """
+        if self.one_file_system and stat_result.st_dev != self.root_dev:
+            return SKIP_MOUNT_POINT
+        if self.symlinks == SYMLINKS_ALL:
+            identity = (stat_result.st_dev, stat_result.st_ino)
+            candidate = Path(path) if path is not None else None
+            with self._lock:
+                if identity in self._visited:
+                    owner = self._visited[identity]
+                    if candidate is None or owner is None or not candidate < owner:
+                        return SKIP_LOOP
+                    self.superseded.append(owner)
+                self._visited[identity] = candidate
+        return None
+
+    def follows_link(self, target: Path, target_stat: os.stat_result) -> bool:
+        """Whether to keep a symlink that resolves to ``target``."""
+        if self.symlinks == SYMLINKS_SKIP:
+            return False
+        if self.one_file_system and target_stat.st_dev != self.root_dev:
+            return False
+        inside = _is_within(target, self.root)
+        if stat.S_ISDIR(target_stat.st_mode):
+            return self.symlinks == SYMLINKS_ALL and not inside
+        return inside or self.symlinks in (SYMLINKS_FILES, SYMLINKS_ALL)
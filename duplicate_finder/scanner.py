@@ -2,18 +2,46 @@
 Directory scanning functionality.
 """
 
+import os
+import stat
 import sys
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Set, Union
 
 from tqdm import tqdm
 
+from .parallel_walker import walk_parallel
+from .scan_filter import ScanFilter, TraversalGuard, DEFAULT_SYMLINK_POLICY, SYMLINKS_SKIP, SKIP_SYMLINK, SKIP_LOOP
+
+
+@dataclass
+class FileRecord:
+    """
+    Stat data for a single file, captured once at scan time.
+    
+    Detection stages read size and identity from the record instead of
+    re-stating the file.
+    """
+    path: Path
+    size: int
+    mtime_ns: int
+    st_dev: int
+    st_ino: int
+    ctime_ns: int = 0
+
 
 class ScanResult:
     """Container for scan results and warnings."""
     
     def __init__(self):
         self.files: List[Path] = []
+        self.records: List[FileRecord] = []
+        # Canonical path -> other paths to the same physical file (hardlinks)
+        self.linked: Dict[Path, List[Path]] = {}
+        # Canonical path -> size, so linked files are reported without a stat
+        self.linked_sizes: Dict[Path, int] = {}
         self.warnings: List[str] = []
         self.errors: List[str] = []
         self.skipped_items: Dict[str, int] = {
@@ -22,9 +50,17 @@ class ScanResult:
             'unreadable_files': 0,
             'other_errors': 0
         }
+        # Entries pruned by a ScanFilter (not errors)
+        self.filtered: Dict[str, int] = {
+            'files': 0,
+            'directories': 0,
+            'symlinks': 0,
+            'mount_points': 0,
+            'loops': 0
+        }
 
 
-def scan_directory(directory: Path, verbose: bool = False, quiet: bool = False) -> List[Path]:
+def scan_directory(directory: Path, verbose: bool = False, quiet: bool = False, max_workers: Optional[int] = None, scan_filter: Optional[ScanFilter] = None, one_file_system: bool = False, symlinks: str = DEFAULT_SYMLINK_POLICY) -> List[Path]:
     """
     Recursively scan directory for all files using streaming approach.
     
@@ -36,12 +72,45 @@ def scan_directory(directory: Path, verbose: bool = False, quiet: bool = False)
         directory: Path to directory to scan
         verbose: Enable verbose output
         quiet: Suppress non-error output
+        max_workers: List directories on this many threads (None for single-threaded)
+        scan_filter: Size limits and globs applied during traversal (optional)
+        one_file_system: Do not descend into directories on other devices
+        symlinks: Symlink policy: 'skip', 'follow-files', 'follow-within-root' or 'follow-all'
         
     Returns:
         List of Path objects for all files found
     """
-    result = scan_directory_detailed(directory, verbose=verbose, quiet=quiet)
+    result = scan_directory_detailed(directory, verbose=verbose, quiet=quiet, max_workers=max_workers, scan_filter=scan_filter, one_file_system=one_file_system, symlinks=symlinks)
+    report_scan_result(result, quiet)
+    return result.files
+
+
+def scan_file_records(directory: Path, verbose: bool = False, quiet: bool = False, max_workers: Optional[int] = None, scan_filter: Optional[ScanFilter] = None, one_file_system: bool = False, symlinks: str = DEFAULT_SYMLINK_POLICY) -> List[FileRecord]:
+    """
+    Recursively scan directory and return one FileRecord per file.
     
+    Same traversal and reporting as scan_directory, but keeps the stat data
+    gathered during the walk so later stages never stat the files again.
+    
+    Args:
+        directory: Path to directory to scan
+        verbose: Enable verbose output
+        quiet: Suppress non-error output
+        max_workers: List directories on this many threads (None for single-threaded)
+        scan_filter: Size limits and globs applied during traversal (optional)
+        one_file_system: Do not descend into directories on other devices
+        symlinks: Symlink policy: 'skip', 'follow-files', 'follow-within-root' or 'follow-all'
+        
+    Returns:
+        List of FileRecord objects for all files found
+    """
+    result = scan_directory_detailed(directory, verbose=verbose, quiet=quiet, max_workers=max_workers, scan_filter=scan_filter, one_file_system=one_file_system, symlinks=symlinks)
+    report_scan_result(result, quiet)
+    return result.records
+
+
+def report_scan_result(result: ScanResult, quiet: bool) -> None:
+    """Print scan warnings and skipped item counts to stderr."""
     # Print warnings if any (unless quiet mode)
     if not quiet and result.warnings:
         print(f"\n⚠️  Scan completed with {len(result.warnings)} warnings:", file=sys.stderr)
@@ -58,38 +127,65 @@ def scan_directory(directory: Path, verbose: bool = False, quiet: bool = False)
             if count > 0:
                 item_name = item_type.replace('_', ' ').title()
                 print(f"  • {item_name}: {count}", file=sys.stderr)
-    
-    return result.files
 
 
-def scan_directory_detailed(directory: Path, verbose: bool = False, quiet: bool = False) -> ScanResult:
+def scan_directory_detailed(directory: Path, verbose: bool = False, quiet: bool = False, max_workers: Optional[int] = None, scan_filter: Optional[ScanFilter] = None, one_file_system: bool = False, symlinks: str = DEFAULT_SYMLINK_POLICY) -> ScanResult:
     """
     Recursively scan directory with detailed error tracking and robust error handling.
     
+    Uses os.scandir so entry types come from the directory listing (d_type)
+    and each regular file is stat'ed exactly once. Paths that lead to the
+    same physical file (hardlinks, symlinks to scanned files) are collapsed
+    to one record; extra names are kept in ScanResult.linked.
+    
+    A ``scan_filter`` prunes during the walk: excluded directories are
+    never listed, name globs are checked before stat and size limits
+    before a file is recorded. Mount points and symlinks are handled by a
+    TraversalGuard (see scan_filter); by default symlinks to files are
+    followed and symlinked directories are not descended.
+    
     Args:
         directory: Path to directory to scan
         verbose: Enable verbose output
         quiet: Suppress non-error output
+        max_workers: List directories on this many threads (None for single-threaded)
+        scan_filter: Size limits and globs applied during traversal (optional)
+        one_file_system: Do not descend into directories on other devices
+        symlinks: Symlink policy: 'skip', 'follow-files', 'follow-within-root' or 'follow-all'
         
     Returns:
-        ScanResult containing files, warnings, and error statistics
+        ScanResult containing files, records, warnings, and error statistics
     """
+    if scan_filter is not None and not scan_filter.active:
+        scan_filter = None
+    guard = TraversalGuard(directory, one_file_system, symlinks)
+    if max_workers is not None and max_workers > 1:
+        return _scan_directory_parallel(directory, verbose, quiet, max_workers, scan_filter, guard)
+    
     result = ScanResult()
     if not quiet:
         print("Scanning for files...")
     
+    start_time = time.time()
     try:
         items_processed = 0
         # Only show progress bar if not quiet
         progress_bar = tqdm(desc="Scanning", unit=" items", leave=False, disable=quiet)
         with progress_bar as pbar:
-            try:
-                for item in directory.rglob("*"):
+            # Depth-first pre-order with entries sorted by name, as in the
+            # parallel walk, so results do not depend on the worker count
+            pending_dirs = [str(directory)]
+            while pending_dirs:
+                current_dir = pending_dirs.pop()
+                subdirs = []
+                for entry in sorted(_list_directory(current_dir, result), key=lambda e: e.name):
                     items_processed += 1
                     pbar.update(1)
                     
-                    # Process this item with error handling
-                    _process_item(item, result)
+                    # Process this entry with error handling
+                    subdir = _process_entry(entry, result, scan_filter, guard)
+                    if subdir is not None:
+                        subdirs.append(subdir)
                     
                     # Update progress display
                     if items_processed % 1000 == 0 or len(result.files) % 500 == 0:
@@ -102,59 +198,263 @@ def scan_directory_detailed(directory: Path, verbose: bool = False, quiet: bool
                     # Handle very large directories by periodic refresh
                     if items_processed % 10000 == 0:
                         pbar.refresh()
-                        
-            except PermissionError as e:
-                result.errors.append(f"Permission denied accessing directory: {e}")
-                result.skipped_items['permission_denied'] += 1
-            except OSError as e:
-                result.errors.append(f"OS error during directory traversal: {e}")
-                result.skipped_items['other_errors'] += 1
+                
+                # Popped in name order
+                pending_dirs.extend(reversed(subdirs))
                     
     except KeyboardInterrupt:
         print(f"\nScan interrupted. Found {len(result.files)} files so far.", file=sys.stderr)
         raise
     
+    if verbose and not quiet:
+        elapsed = time.time() - start_time
+        rate = len(result.files) / elapsed if elapsed > 0 else 0.0
+        print(f"  Scanned {len(result.files):,} files in {elapsed:.2f}s ({rate:,.0f} files/sec, 1 worker)")
+        _report_filtered(result)
+    
+    _collapse_links(result, verbose and not quiet)
     return result
 
 
-def _process_item(item: Path, result: ScanResult) -> None:
-    """Process a single directory item with comprehensive error handling."""
+def _scan_directory_parallel(directory: Path, verbose: bool, quiet: bool, max_workers: int, scan_filter: Optional[ScanFilter] = None, guard: Optional[TraversalGuard] = None) -> ScanResult:
+    """
+    Scan with directories listed concurrently on a work-stealing thread pool.
+    
+    Produces the same files and records as the single-threaded walk, ordered
+    depth-first with entries sorted by name so repeated runs match.
+    Directories the guard handed to a smaller path after they were listed
+    (follow-all) are dropped along with everything under them.
+    """
+    if not quiet:
+        print(f"Scanning for files ({max_workers} parallel listers)...")
+    
+    progress_bar = tqdm(desc="Scanning", unit=" dirs", leave=False, disable=quiet)
+    
+    def visit(current_dir: str):
+        local = ScanResult()
+        subdirs = []
+        for entry in sorted(_list_directory(current_dir, local), key=lambda e: e.name):
+            subdir = _process_entry(entry, local, scan_filter, guard)
+            if subdir is not None:
+                subdirs.append(subdir)
+        progress_bar.update(1)
+        return (current_dir, local), subdirs
+    
+    result = ScanResult()
+    try:
+        with progress_bar:
+            partials, stats = walk_parallel(str(directory), visit, max_workers)
+    except KeyboardInterrupt:
+        print("\nScan interrupted.", file=sys.stderr)
+        raise
+    
+    superseded = {str(path) for path in guard.superseded} if guard is not None else set()
+    for current_dir, local in partials:
+        if superseded and _is_under_any(current_dir, superseded):
+            continue
+        result.files.extend(local.files)
+        result.records.extend(local.records)
+        result.warnings.extend(local.warnings)
+        result.errors.extend(local.errors)
+        for item_type, count in local.skipped_items.items():
+            result.skipped_items[item_type] += count
+        for item_type, count in local.filtered.items():
+            result.filtered[item_type] += count
+    # A superseded path counts as the loop a sequential walk would have skipped
+    result.filtered[SKIP_LOOP] += sum(
+        1 for path in superseded if not _is_under_any(os.path.dirname(path), superseded)
+    )
+    
+    stats.files = len(result.files)
+    if verbose and not quiet:
+        print(f"  {stats.summary()}")
+        _report_filtered(result)
+    
+    _collapse_links(result, verbose and not quiet)
+    return result
+
+
+def _is_under_any(directory: str, roots: Set[str]) -> bool:
+    """Whether ``directory`` is one of ``roots`` or lies below one."""
+    path = Path(directory)
+    return str(path) in roots or any(str(parent) in roots for parent in path.parents)
+
+
+def _report_filtered(result: ScanResult) -> None:
+    """Print how many entries the scan filter and traversal boundaries pruned."""
+    if result.filtered['files'] or result.filtered['directories']:
+        print(f"  Filtered out {result.filtered['files']:,} files and "
+              f"{result.filtered['directories']:,} directories")
+    if result.filtered['symlinks']:
+        print(f"  Left out {result.filtered['symlinks']:,} symlinks")
+    if result.filtered['mount_points']:
+        print(f"  Did not cross {result.filtered['mount_points']:,} mount points")
+    if result.filtered['loops']:
+        print(f"  Skipped {result.filtered['loops']:,} directories already scanned (symlink loops)")
+
+
+def _collapse_links(result: ScanResult, verbose: bool = False) -> None:
+    """
+    Keep one record per physical file, identified by (st_dev, st_ino).
+    
+    The first path seen stays in files/records. Later hardlinks are moved to
+    result.linked; later paths that resolve to the same location (a symlink
+    to a file that was also scanned directly) are dropped.
+    Records without a real inode number (st_ino == 0) are never merged.
+    """
+    first_seen: Dict[tuple, FileRecord] = {}
+    kept = []
+    for record in result.records:
+        if record.st_ino == 0:
+            kept.append(record)
+            continue
+        identity = (record.st_dev, record.st_ino)
+        canonical = first_seen.get(identity)
+        if canonical is None:
+            first_seen[identity] = record
+            kept.append(record)
+        elif record.path.resolve() != canonical.path.resolve():
+            result.linked.setdefault(canonical.path, []).append(record.path)
+            result.linked_sizes[canonical.path] = canonical.size
+    
+    if len(kept) == len(result.records):
+        return
+    
+    result.records = kept
+    result.files = [record.path for record in kept]
+    if verbose:
+        linked_count = sum(len(paths) for paths in result.linked.values())
+        print(f"  {linked_count:,} hardlinked paths share storage with another scanned file")
+
+
+def _list_directory(directory: str, result: ScanResult) -> List[os.DirEntry]:
+    """List a directory's entries, recording (not raising) listing errors."""
+    try:
+        with os.scandir(directory) as it:
+            return list(it)
+    except PermissionError as e:
+        result.errors.append(f"Permission denied accessing directory: {e}")
+        result.skipped_items['permission_denied'] += 1
+    except OSError as e:
+        result.errors.append(f"OS error during directory traversal: {e}")
+        result.skipped_items['other_errors'] += 1
+    return []
+
+
+def _process_entry(entry: os.DirEntry, result: ScanResult, scan_filter: Optional[ScanFilter] = None, guard: Optional[TraversalGuard] = None) -> Optional[str]:
+    """
+    Process a single directory entry from os.scandir.
+    
+    Returns:
+        The entry's path if it is a directory to descend into, else None
+    """
+    try:
+        if entry.is_dir(follow_symlinks=False):
+            if scan_filter is not None and not scan_filter.allows_dir(entry.name, entry.path):
+                result.filtered['directories'] += 1
+                return None
+            if guard is not None and guard.checks_directories:
+                reason = guard.enter_directory(entry.stat(follow_symlinks=False), entry.path)
+                if reason is not None:
+                    result.filtered[reason] += 1
+                    return None
+            return entry.path
+        
+        if scan_filter is not None and not scan_filter.allows_name(entry.name, entry.path):
+            result.filtered['files'] += 1
+            return None
+        
+        if entry.is_symlink():
+            # Symlinks need resolving; keep the Path-based handling for them
+            return _process_item(Path(entry.path), result, scan_filter, guard)
+        
+        if entry.is_file(follow_symlinks=False):
+            try:
+                stat_result = entry.stat(follow_symlinks=False)
+            except (PermissionError, OSError) as e:
+                result.warnings.append(f"Cannot access file {entry.path}: {e}")
+                result.skipped_items['permission_denied'] += 1
+                return None
+            _add_file(Path(entry.path), stat_result, result, scan_filter)
+        
+        # Sockets, FIFOs and device files are ignored
+        
+    except PermissionError as e:
+        result.warnings.append(f"Permission denied: {entry.path} ({e})")
+        result.skipped_items['permission_denied'] += 1
+    except OSError as e:
+        result.warnings.append(f"OS error processing {entry.path}: {e}")
+        result.skipped_items['other_errors'] += 1
+    return None
+
+
+def _add_file(file_path: Path, stat_result: os.stat_result, result: ScanResult, scan_filter: Optional[ScanFilter] = None) -> None:
+    """Record a readable file and its stat data in the scan result."""
+    if scan_filter is not None and not scan_filter.allows_size(stat_result.st_size):
+        result.filtered['files'] += 1
+    elif stat_result.st_size >= 0:  # Basic sanity check
+        result.files.append(file_path)
+        result.records.append(file_record_from_stat(file_path, stat_result))
+    else:
+        result.warnings.append(f"Invalid file size for: {file_path}")
+        result.skipped_items['unreadable_files'] += 1
+
+
+def _process_item(item: Path, result: ScanResult, scan_filter: Optional[ScanFilter] = None, guard: Optional[TraversalGuard] = None) -> Optional[str]:
+    """
+    Process a single directory item with comprehensive error handling.
+    
+    Without a ``guard`` symlinks to files are followed and symlinked
+    directories are not.
+    
+    Returns:
+        The item's path if it is a symlinked directory to descend into, else None
+    """
     try:
         # Check if it's a symlink first
         if item.is_symlink():
+            if guard is not None and guard.symlinks == SYMLINKS_SKIP:
+                result.filtered[SKIP_SYMLINK] += 1
+                return None
             try:
                 # Try to resolve the symlink
                 resolved = item.resolve()
                 if not resolved.exists():
                     result.warnings.append(f"Broken symlink: {item}")
                     result.skipped_items['broken_symlinks'] += 1
-                    return
-                elif resolved.is_file():
+                    return None
+                target_stat = resolved.stat()
+                if guard is not None:
+                    if not guard.follows_link(resolved, target_stat):
+                        result.filtered[SKIP_SYMLINK] += 1
+                        return None
+                    if stat.S_ISDIR(target_stat.st_mode):
+                        reason = guard.enter_directory(target_stat, str(item))
+                        if reason is not None:
+                            result.filtered[reason] += 1
+                            return None
+                        # Descend through the link so paths stay under the root
+                        return str(item)
+                if stat.S_ISREG(target_stat.st_mode):
                     # Use the resolved path for consistency
-                    result.files.append(resolved)
-                # If it resolves to a directory, we'll encounter it during traversal anyway
+                    _add_file(resolved, target_stat, result, scan_filter)
             except (OSError, RuntimeError) as e:
                 # Handle circular symlinks and other symlink issues
                 result.warnings.append(f"Symlink error {item}: {e}")
                 result.skipped_items['broken_symlinks'] += 1
-                return
+                return None
         
         # Check if it's a regular file (this also handles resolved symlinks)
         elif item.is_file():
             # Test if we can actually read the file
             try:
                 # Quick readability test - try to stat the file
-                stat_result = item.stat()
-                if stat_result.st_size >= 0:  # Basic sanity check
-                    result.files.append(item)
-                else:
-                    result.warnings.append(f"Invalid file size for: {item}")
-                    result.skipped_items['unreadable_files'] += 1
+                _add_file(item, item.stat(), result, scan_filter)
             except (PermissionError, OSError) as e:
                 result.warnings.append(f"Cannot access file {item}: {e}")
                 result.skipped_items['permission_denied'] += 1
         
-        # We ignore directories (they're traversed by rglob) and other special files
+        # Directories and other special files are ignored here
         
     except PermissionError as e:
         result.warnings.append(f"Permission denied: {item} ({e})")
@@ -165,4 +465,47 @@ def _process_item(item: Path, result: ScanResult) -> None:
     except Exception as e:
         # Catch-all for unexpected errors
         result.warnings.append(f"Unexpected error processing {item}: {e}")
-        result.skipped_items['other_errors'] += 1
\ No newline at end of file
+        result.skipped_items['other_errors'] += 1
+
+
+def file_record_from_stat(file_path: Path, stat_result: os.stat_result) -> FileRecord:
+    """Build a FileRecord from an existing stat result."""
+    return FileRecord(
+        path=file_path,
+        size=stat_result.st_size,
+        mtime_ns=stat_result.st_mtime_ns,
+        st_dev=stat_result.st_dev,
+        st_ino=stat_result.st_ino,
+        ctime_ns=stat_result.st_ctime_ns
+    )
+
+
+def get_file_record(file_path: Path) -> Optional[FileRecord]:
+    """
+    Stat a file once and wrap the result in a FileRecord.
+    
+    Args:
+        file_path: Path to the file
+        
+    Returns:
+        FileRecord, or None if the file cannot be stat'ed
+    """
+    try:
+        return file_record_from_stat(file_path, file_path.stat())
+    except (OSError, IOError):
+        return None
+
+
+def to_file_record(item: Union[Path, FileRecord]) -> Optional[FileRecord]:
+    """
+    Normalize a path or record to a FileRecord.
+    
+    Records are passed through untouched so their stat data is reused;
+    bare paths are stat'ed once.
+    
+    Returns:
+        FileRecord, or None if a bare path cannot be stat'ed
+    """
+    if isinstance(item, FileRecord):
+        return item
+    return get_file_record(item)
@@ -12,10 +12,20 @@ import os
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from duplicate_finder import cli, hasher, scanner, detector, formatter, folder_detector, parallel_hasher, memory_efficient_detector, adaptive_optimizer, fast_detector
+from duplicate_finder import cli, hasher, scanner, detector, formatter, folder_detector, parallel_hasher, memory_efficient_detector, adaptive_optimizer, fast_detector, parallel_walker, hash_cache, progressive_hasher, byte_compare, pipeline, external_grouping, file_table, scan_filter, sampled_verifier, media_probe
 import pytest
 
 
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    """Keep the default hash cache (used by cli.main()) out of the real user cache."""
+    cache_home = tmp_path / "cache-home"
+    monkeypatch.setenv('XDG_CACHE_HOME', str(cache_home))
+    monkeypatch.setenv('LOCALAPPDATA', str(cache_home))
+    monkeypatch.setenv('HOME', str(cache_home))
+    return cache_home
+
+
 class TestFileHashing:
     """Test file hashing functionality."""
     
@@ -97,6 +107,61 @@ class TestFileHashing:
         
         assert partial1 == partial2  # Same partial hash
         assert full1 != full2  # Different full hash
+    
+    def test_resume_file_hash_matches_full_hash(self, tmp_path):
+        """Test that resuming from a partial state gives the full hash."""
+        test_file = tmp_path / "file.bin"
+        test_file.write_bytes(b"A" * 4096 + b"tail" * 5000)
+        
+        state = hasher.calculate_partial_hash_state(test_file)
+        
+        assert state.digest == hasher.calculate_file_hash(test_file, partial=True)
+        assert state.offset == 4096
+        assert hasher.resume_file_hash(test_file, state) == hasher.calculate_file_hash(test_file)
+        # The stored state is not consumed by resuming
+        assert hasher.resume_file_hash(test_file, state) == hasher.calculate_file_hash(test_file)
+    
+    def test_hash_stream_reuses_buffer(self, tmp_path):
+        """Test that readinto hashing matches hashlib and reuses one buffer."""
+        content = os.urandom(300000)
+        test_file = tmp_path / "file.bin"
+        test_file.write_bytes(content)
+        
+        with open(test_file, "rb") as f:
+            file_hash = hashlib.sha256()
+            assert hasher.hash_stream(f, file_hash, chunk_size=4096) == len(content)
+        buffer = hasher._get_read_buffer(4096)
+        with open(test_file, "rb") as f:
+            partial = hashlib.sha256()
+            assert hasher.hash_stream(f, partial, chunk_size=4096, length=5000) == 5000
+        
+        assert file_hash.hexdigest() == hashlib.sha256(content).hexdigest()
+        assert partial.hexdigest() == hashlib.sha256(content[:5000]).hexdigest()
+        assert hasher._get_read_buffer(4096) is buffer
+    
+    def test_mmap_path_matches_read_path(self, tmp_path):
+        """Test that hashing through mmap gives the same digest."""
+        content = os.urandom(200000)
+        test_file = tmp_path / "file.bin"
+        test_file.write_bytes(content)
+        
+        with patch('duplicate_finder.hasher.MMAP_THRESHOLD', 1024):
+            with patch('duplicate_finder.hasher.mmap.mmap', wraps=hasher.mmap.mmap) as mock_mmap:
+                digest = hasher.calculate_file_hash(test_file)
+                state = hasher.calculate_partial_hash_state(test_file)
+                resumed = hasher.resume_file_hash(test_file, state)
+        
+        assert mock_mmap.call_count == 2
+        assert digest == resumed == hashlib.sha256(content).hexdigest()
+    
+    def test_chunk_size_detected_once_per_device(self, tmp_path):
+        """Test that the disk type is probed once per device."""
+        with patch.dict(hasher._device_chunk_sizes, clear=True):
+            with patch('duplicate_finder.hasher.detect_disk_type', return_value='hdd') as mock_detect:
+                assert hasher.get_chunk_size(42, tmp_path) == 1024 * 1024
+                assert hasher.get_chunk_size(42, tmp_path) == 1024 * 1024
+        
+        mock_detect.assert_called_once()
 
 
 class TestDirectoryScanning:
@@ -210,6 +275,49 @@ class TestDirectoryScanning:
                 with pytest.raises(KeyboardInterrupt):
                     scanner.scan_directory(tmp_path)
 
+    def test_scan_file_records(self, tmp_path):
+        """Test that scanning yields stat records for each file."""
+        (tmp_path / "subdir").mkdir()
+        file1 = tmp_path / "file1.txt"
+        file2 = tmp_path / "subdir" / "file2.txt"
+        file1.write_bytes(b"abc")
+        file2.write_bytes(b"hello")
+        
+        records = scanner.scan_file_records(tmp_path, quiet=True)
+        
+        by_path = {r.path: r for r in records}
+        assert set(by_path) == {file1, file2}
+        stat1 = file1.stat()
+        assert by_path[file1].size == 3
+        assert by_path[file1].mtime_ns == stat1.st_mtime_ns
+        assert by_path[file1].st_ino == stat1.st_ino
+        assert by_path[file1].st_dev == stat1.st_dev
+        assert by_path[file2].size == 5
+    
+    def test_scan_collapses_hardlinks(self, tmp_path):
+        """Test that hardlinked paths yield one record and a linked entry."""
+        original = tmp_path / "a.txt"
+        original.write_text("content")
+        os.link(original, tmp_path / "b.txt")
+        
+        result = scanner.scan_directory_detailed(tmp_path, quiet=True)
+        
+        assert result.files == [result.records[0].path]
+        assert len(result.files) == 1
+        linked_names = {result.files[0]} | set(result.linked[result.files[0]])
+        assert linked_names == {original, tmp_path / "b.txt"}
+    
+    def test_scan_drops_symlink_to_scanned_file(self, tmp_path):
+        """Test that a symlink to a file in the tree is not a second copy."""
+        target = tmp_path / "target.txt"
+        target.write_text("content")
+        (tmp_path / "link.txt").symlink_to(target)
+        
+        result = scanner.scan_directory_detailed(tmp_path, quiet=True)
+        
+        assert [f.resolve() for f in result.files] == [target.resolve()]
+        assert result.linked == {}
+
 
 class TestDuplicateFinding:
     """Test duplicate finding logic."""
@@ -314,6 +422,25 @@ class TestDuplicateFinding:
         assert len(duplicates) == 2
         assert len(unique_files) == 1
         assert file3 in unique_files
+    
+    @patch('duplicate_finder.detector.tqdm')
+    @patch('builtins.print')
+    def test_find_duplicates_uses_record_sizes(self, mock_print, mock_tqdm, tmp_path):
+        """Test that sizes are taken from scan records instead of re-stating."""
+        mock_tqdm.side_effect = lambda x, **kwargs: x
+        file1 = tmp_path / "file1.txt"
+        file2 = tmp_path / "file2.txt"
+        file1.write_bytes(b"Same content")
+        file2.write_bytes(b"Same content")
+        
+        records = scanner.scan_file_records(tmp_path, quiet=True)
+        
+        with patch('duplicate_finder.scanner.get_file_record') as mock_stat:
+            duplicates, unique_files, duplicate_folders = detector.find_duplicates(records)
+        
+        mock_stat.assert_not_called()
+        assert len(duplicates) == 1
+        assert set(list(duplicates.values())[0]) == {file1, file2}
 
 
 class TestMainFunction:
@@ -587,6 +714,69 @@ class TestOutputFormatting:
         assert "Unique files: 1" in captured.out
         assert "Potential space savings" in captured.out
     
+    def test_savings_stat_first_file_only(self, tmp_path):
+        """Test that savings only stat the first file of each group."""
+        file1 = tmp_path / "dup1.txt"
+        file1.write_bytes(b"x" * 100)
+        
+        # Hardlinks are collapsed at scan time, so the other paths are not re-checked
+        duplicates = {"hash123": [file1, tmp_path / "gone1.txt", tmp_path / "gone2.txt"]}
+        
+        assert formatter._calculate_space_savings(duplicates) == (300, 200)
+    
+    @pytest.mark.parametrize("memory_efficient", [False, True])
+    def test_detector_results_formatted_without_stat(self, tmp_path, capsys, memory_efficient):
+        """Test that reported sizes come from the scan records, not from stat'ing again."""
+        import json
+        
+        (tmp_path / "dup1.txt").write_bytes(b"x" * 100)
+        (tmp_path / "dup2.txt").write_bytes(b"x" * 100)
+        (tmp_path / "unique.txt").write_bytes(b"y" * 7)
+        (tmp_path / "a").mkdir()
+        (tmp_path / "b").mkdir()
+        for folder in ("a", "b"):
+            (tmp_path / folder / "f1.txt").write_bytes(b"folder" * 5)
+            (tmp_path / folder / "f2.txt").write_bytes(b"other")
+        records = scanner.scan_file_records(tmp_path, quiet=True)
+        if memory_efficient:
+            duplicates, unique_files, duplicate_folders = memory_efficient_detector.find_duplicates_memory_efficient(records, quiet=True)
+        else:
+            duplicates, unique_files, duplicate_folders = detector.find_duplicates(records, quiet=True)
+        
+        with patch.object(Path, 'stat', side_effect=AssertionError("stat called")):
+            formatter.format_json_output(duplicates, unique_files, duplicate_folders)
+            output = json.loads(capsys.readouterr().out)
+            formatter.format_output(duplicates, unique_files, duplicate_folders)
+        
+        assert [f["size"] for f in output["duplicate_files"][0]["files"]] == [100, 100]
+        assert output["unique_files"][0]["size"] == 7
+        assert output["duplicate_folders"][0]["folders"][0]["size"] == 35
+        assert output["duplicate_folders"][0]["folders"][0]["file_count"] == 2
+        assert output["statistics"]["potential_file_savings"] == 100
+        assert output["statistics"]["potential_folder_savings"] == 35
+        assert "Size per folder: 35 bytes" in capsys.readouterr().out
+    
+    def test_format_output_linked_files(self, tmp_path, capsys):
+        """Test that hardlinks are reported in their own section."""
+        import json
+        
+        file1 = tmp_path / "a.txt"
+        file1.write_text("content")
+        link = tmp_path / "b.txt"
+        os.link(file1, link)
+        
+        formatter.format_output({}, [file1], linked_files={file1: [link]})
+        captured = capsys.readouterr()
+        
+        assert "ALREADY LINKED FILES" in captured.out
+        assert "2 paths to one file" in captured.out
+        assert str(link) in captured.out
+        
+        formatter.format_json_output({}, [file1], [], linked_files={file1: [link]})
+        output = json.loads(capsys.readouterr().out)
+        assert output["linked_files"][0]["paths"] == [str(file1), str(link)]
+        assert output["statistics"]["linked_files_count"] == 1
+    
     def test_format_output_no_duplicates(self, tmp_path, capsys):
         """Test output formatting with no duplicates."""
         # Create unique files
@@ -797,6 +987,86 @@ class TestFolderDuplicateDetection:
         
         assert len(duplicate_folders) == 0
     
+    def test_find_duplicate_folders_nested(self, tmp_path):
+        """Test that identical subtrees are matched at every level."""
+        for top in ("a", "b"):
+            for sub, content in (("x", "one"), ("y", "two")):
+                folder = tmp_path / top / sub
+                folder.mkdir(parents=True)
+                (folder / "file.txt").write_text(content)
+        
+        all_files = list(tmp_path.rglob("*.txt"))
+        file_hashes = {f: hashlib.sha256(f.read_bytes()).hexdigest() for f in all_files}
+        
+        duplicate_folders = folder_detector.find_duplicate_folders(all_files, file_hashes)
+        
+        assert [tmp_path / "a", tmp_path / "b"] in duplicate_folders
+        assert [tmp_path / "a" / "x", tmp_path / "b" / "x"] in duplicate_folders
+        assert [tmp_path / "a" / "y", tmp_path / "b" / "y"] in duplicate_folders
+        assert len(duplicate_folders) == 3
+    
+    def test_find_duplicate_folders_uses_known_sizes(self):
+        """Test that supplied sizes and hashes avoid all filesystem calls."""
+        root = Path("/nonexistent/root")
+        all_files = [
+            root / "one" / "a.txt", root / "one" / "sub" / "b.txt",
+            root / "two" / "a.txt", root / "two" / "sub" / "b.txt",
+            root / "three" / "a.txt",
+        ]
+        file_sizes = {f: 10 for f in all_files}
+        file_hashes = {f: f"hash-{f.name}" for f in all_files}
+        
+        with patch('pathlib.Path.stat', side_effect=AssertionError("stat called")):
+            duplicate_folders = folder_detector.find_duplicate_folders(all_files, file_hashes, file_sizes)
+        
+        assert duplicate_folders == [
+            [root / "one", root / "two"],
+            [root / "one" / "sub", root / "two" / "sub"],
+        ]
+    
+    def test_find_duplicate_folders_missing_hash(self):
+        """Test that a folder with an unhashed file is never matched."""
+        root = Path("/nonexistent/root")
+        all_files = [root / "one" / "a.txt", root / "two" / "a.txt"]
+        file_sizes = {f: 10 for f in all_files}
+        file_hashes = {all_files[0]: "hash"}
+        
+        assert folder_detector.find_duplicate_folders(all_files, file_hashes, file_sizes) == []
+    
+    def test_select_files_for_folder_hashing(self):
+        """Test that only unhashed files in colliding folders are selected."""
+        root = Path("/nonexistent/root")
+        all_files = [
+            root / "one" / "a.txt", root / "two" / "a.txt",
+            root / "three" / "b.txt", root / "four" / "b.txt",
+            root / "five" / "c.txt",
+        ]
+        file_sizes = {f: 10 for f in all_files}
+        file_hashes = {all_files[0]: "hash"}
+        known_unique = {root / "four" / "b.txt"}
+        
+        with patch('pathlib.Path.stat', side_effect=AssertionError("stat called")):
+            selected = folder_detector.select_files_for_folder_hashing(
+                all_files, file_hashes, file_sizes, known_unique
+            )
+        
+        # "three" only collided with "four", which holds a unique file
+        assert selected == [root / "two" / "a.txt"]
+    
+    def test_folder_detection_skips_unique_files(self, tmp_path):
+        """Test that Stage 4 does not hash files already proven unique."""
+        for folder, content in (("a", "same"), ("b", "same"), ("c", "unique!")):
+            (tmp_path / folder).mkdir()
+            (tmp_path / folder / "file.txt").write_text(content)
+        files = list(tmp_path.rglob("*.txt"))
+        
+        with patch('duplicate_finder.detector.parallel_hash_files', wraps=parallel_hasher.parallel_hash_files) as mock_hash:
+            duplicates, unique_files, duplicate_folders = detector.find_duplicates(files, quiet=True, adaptive=False)
+        
+        descs = [call.kwargs.get('desc') for call in mock_hash.call_args_list]
+        assert "Hashing for folder detection" not in descs
+        assert duplicate_folders == [[tmp_path / "a", tmp_path / "b"]]
+    
     def test_get_files_in_duplicate_folders(self, tmp_path):
         """Test getting all files contained in duplicate folders."""
         folder1 = tmp_path / "folder1"
@@ -1526,6 +1796,1196 @@ class TestParallelProcessing:
         assert len(list(duplicates.values())[0]) == 6  # 6 duplicate files
         assert len(unique_files) == 1
 
+    def test_iter_hash_files_accepts_generator(self, tmp_path):
+        """Test streaming hashing from a lazy iterator matches batch hashing."""
+        files = []
+        for i in range(20):
+            file_path = tmp_path / f"stream_{i}.txt"
+            file_path.write_text(f"Streaming content {i % 5}")
+            files.append(file_path)
+
+        streamed = dict(parallel_hasher.iter_hash_files(
+            (f for f in files), max_workers=2, window_per_worker=1
+        ))
+
+        assert streamed == parallel_hasher.parallel_hash_files(files, quiet=True, max_workers=2)
+
+    def test_iter_hash_files_bounds_in_flight_tasks(self, tmp_path):
+        """Test that only workers x window tasks are pulled ahead of results."""
+        files = []
+        for i in range(30):
+            file_path = tmp_path / f"window_{i}.txt"
+            file_path.write_text(f"Window content {i}")
+            files.append(file_path)
+
+        pulled = 0
+
+        def source():
+            nonlocal pulled
+            for file_path in files:
+                pulled += 1
+                yield file_path
+
+        results = parallel_hasher.iter_hash_files(source(), max_workers=2, window_per_worker=3)
+        next(results)
+        # The window is filled before the first result is yielded
+        assert pulled == 6
+
+        received = 1 + sum(1 for _ in results)
+        assert received == 30
+
+    def test_iter_hash_files_reports_errors_as_none(self, tmp_path):
+        """Test that unreadable files stream through with a None digest."""
+        good = tmp_path / "good.txt"
+        good.write_text("content")
+        missing = tmp_path / "missing.txt"
+
+        results = dict(parallel_hasher.iter_hash_files([good, missing], max_workers=2))
+
+        assert results[good] is not None
+        assert results[missing] is None
+
+
+class TestParallelTraversal:
+    """Test parallel directory traversal."""
+    
+    def test_walk_parallel_visits_every_directory(self, tmp_path):
+        """Test that the engine visits each directory once in pre-order."""
+        for i in range(4):
+            for j in range(3):
+                (tmp_path / f"dir{i}" / f"sub{j}").mkdir(parents=True)
+                for k in range(2):
+                    (tmp_path / f"dir{i}" / f"sub{j}" / f"file{k}.txt").write_text(f"{i}-{j}-{k}")
+        (tmp_path / "top.txt").write_text("top")
+        
+        def visit(directory):
+            subdirs = [e.path for e in os.scandir(directory) if e.is_dir()]
+            return directory, subdirs
+        
+        visited, stats = parallel_walker.walk_parallel(str(tmp_path), visit, max_workers=4)
+        
+        assert visited[0] == str(tmp_path)
+        assert len(visited) == len(set(visited)) == 17
+        assert stats.directories == 17
+        assert stats.workers == 4
+        # Parents always precede their children
+        for index, directory in enumerate(visited[1:], 1):
+            assert os.path.dirname(directory) in visited[:index]
+    
+    def test_parallel_scan_matches_sequential(self, tmp_path):
+        """Test that parallel and sequential scans find the same files."""
+        for i in range(4):
+            for j in range(3):
+                (tmp_path / f"dir{i}" / f"sub{j}").mkdir(parents=True)
+                for k in range(2):
+                    (tmp_path / f"dir{i}" / f"sub{j}" / f"file{k}.txt").write_text(f"{i}-{j}-{k}")
+        (tmp_path / "top.txt").write_text("top")
+        expected = set(tmp_path.rglob("*.txt"))
+        
+        sequential = scanner.scan_directory_detailed(tmp_path, quiet=True)
+        parallel = scanner.scan_directory_detailed(tmp_path, quiet=True, max_workers=4)
+        
+        assert set(parallel.files) == set(sequential.files) == expected
+        assert {r.path: r.size for r in parallel.records} == {r.path: r.size for r in sequential.records}
+    
+    def test_parallel_scan_is_deterministic(self, tmp_path):
+        """Test that parallel scan ordering does not depend on scheduling."""
+        for i in range(4):
+            for j in range(3):
+                (tmp_path / f"dir{i}" / f"sub{j}").mkdir(parents=True)
+                for k in range(2):
+                    (tmp_path / f"dir{i}" / f"sub{j}" / f"file{k}.txt").write_text(f"{i}-{j}-{k}")
+        (tmp_path / "top.txt").write_text("top")
+        
+        first = scanner.scan_directory_detailed(tmp_path, quiet=True, max_workers=8)
+        second = scanner.scan_directory_detailed(tmp_path, quiet=True, max_workers=3)
+        
+        assert first.files == second.files
+        # Files of a directory come before its subdirectories, sorted by name
+        assert first.files[0] == tmp_path / "top.txt"
+        assert first.files[1:3] == [tmp_path / "dir0" / "sub0" / "file0.txt", tmp_path / "dir0" / "sub0" / "file1.txt"]
+    
+    def test_scan_order_does_not_depend_on_workers(self, tmp_path):
+        """Test that both walkers return the same order and keep the same hardlink."""
+        for i in range(4):
+            for j in range(3):
+                (tmp_path / f"dir{i}" / f"sub{j}").mkdir(parents=True)
+                for k in range(2):
+                    (tmp_path / f"dir{i}" / f"sub{j}" / f"file{k}.txt").write_text(f"{i}-{j}-{k}")
+        (tmp_path / "top.txt").write_text("top")
+        (tmp_path / "c").mkdir()
+        (tmp_path / "c" / "w_link.bin").write_bytes(b"linked")
+        os.link(tmp_path / "c" / "w_link.bin", tmp_path / "c" / "w.bin")
+        
+        sequential = scanner.scan_directory_detailed(tmp_path, quiet=True)
+        parallel = scanner.scan_directory_detailed(tmp_path, quiet=True, max_workers=4)
+        
+        assert sequential.files == parallel.files
+        assert tmp_path / "c" / "w.bin" in sequential.files
+        assert sequential.linked == parallel.linked == {tmp_path / "c" / "w.bin": [tmp_path / "c" / "w_link.bin"]}
+        
+        fast_sequential = fast_detector.scan_files_metadata(tmp_path)
+        fast_parallel = fast_detector.scan_files_metadata(tmp_path, max_workers=4)
+        assert [f.path for f in fast_sequential] == [f.path for f in fast_parallel]
+    
+    def test_parallel_metadata_scan_matches_sequential(self, tmp_path):
+        """Test that fast-mode parallel metadata scan matches os.walk scan."""
+        for i in range(4):
+            for j in range(3):
+                (tmp_path / f"dir{i}" / f"sub{j}").mkdir(parents=True)
+                for k in range(2):
+                    (tmp_path / f"dir{i}" / f"sub{j}" / f"file{k}.txt").write_text(f"{i}-{j}-{k}")
+        (tmp_path / "top.txt").write_text("top")
+        
+        sequential = fast_detector.scan_files_metadata(tmp_path)
+        parallel = fast_detector.scan_files_metadata(tmp_path, max_workers=4)
+        
+        assert {(f.path, f.size) for f in parallel} == {(f.path, f.size) for f in sequential}
+        assert [f.path for f in parallel] == [f.path for f in fast_detector.scan_files_metadata(tmp_path, max_workers=2)]
+    
+    def test_traversal_stats_rate(self):
+        """Test files/sec reporting."""
+        stats = parallel_walker.TraversalStats(directories=2, files=500, elapsed=2.0, workers=4)
+        assert stats.files_per_second == 250
+        assert "250 files/sec" in stats.summary()
+        assert parallel_walker.TraversalStats().files_per_second == 0.0
+
+
+class TestScanFilter:
+    """Test scan-time size limits and include/exclude globs."""
+    
+    def test_filter_rules(self):
+        """Test name, path and size rules."""
+        rules = scan_filter.ScanFilter(
+            min_size=100, max_size=1000, include=["*.jpg", "*.bin"], exclude=["*/cache/*"], exclude_dirs=["node_modules"]
+        )
+        assert rules.active
+        assert rules.allows_name("a.jpg", "/data/a.jpg")
+        assert not rules.allows_name("a.txt", "/data/a.txt")
+        assert not rules.allows_name("a.jpg", "/data/cache/a.jpg")
+        assert not rules.allows_dir("node_modules", "/data/node_modules")
+        assert rules.allows_dir("src", "/data/src")
+        assert [rules.allows_size(size) for size in (99, 100, 1000, 1001)] == [False, True, True, False]
+        assert not scan_filter.ScanFilter().active
+    
+    def test_scan_prunes_during_traversal(self, tmp_path):
+        """Test that excluded directories are never listed and filters match in every scanner."""
+        (tmp_path / "node_modules" / "pkg").mkdir(parents=True)
+        (tmp_path / "node_modules" / "pkg" / "index.js").write_bytes(b"x" * 2048)
+        (tmp_path / ".git").mkdir()
+        (tmp_path / ".git" / "HEAD").write_bytes(b"x" * 2048)
+        (tmp_path / "src").mkdir()
+        (tmp_path / "src" / "big.bin").write_bytes(b"x" * 4096)
+        (tmp_path / "src" / "small.bin").write_bytes(b"x" * 10)
+        (tmp_path / "src" / "scratch.tmp").write_bytes(b"x" * 2048)
+        (tmp_path / "src" / "huge.bin").write_bytes(b"x" * 100000)
+        (tmp_path / "photo.jpg").write_bytes(b"x" * 3000)
+        rules = scan_filter.ScanFilter(
+            min_size=1024, max_size=50000, exclude=["*.tmp"], exclude_dirs=["node_modules", ".git"]
+        )
+        expected = {tmp_path / "src" / "big.bin", tmp_path / "photo.jpg"}
+        
+        listed = []
+        real_scandir = os.scandir
+        
+        def spy_scandir(path):
+            listed.append(Path(path))
+            return real_scandir(path)
+        
+        with patch('duplicate_finder.scanner.os.scandir', side_effect=spy_scandir):
+            result = scanner.scan_directory_detailed(tmp_path, quiet=True, scan_filter=rules)
+        assert set(result.files) == expected
+        assert not any("node_modules" in p.parts or ".git" in p.parts for p in listed)
+        assert (result.filtered['files'], result.filtered['directories']) == (3, 2)
+        assert sum(result.skipped_items.values()) == 0
+        
+        parallel = scanner.scan_directory_detailed(tmp_path, quiet=True, max_workers=3, scan_filter=rules)
+        assert set(parallel.files) == expected
+        assert parallel.filtered == result.filtered
+        
+        for workers in (None, 2):
+            metadata = fast_detector.scan_files_metadata(tmp_path, max_workers=workers, scan_filter=rules)
+            assert {f.path for f in metadata} == expected
+    
+    def test_include_globs(self, tmp_path):
+        """Test that --include keeps only matching files."""
+        (tmp_path / "node_modules" / "pkg").mkdir(parents=True)
+        (tmp_path / "node_modules" / "pkg" / "index.js").write_bytes(b"x" * 2048)
+        (tmp_path / ".git").mkdir()
+        (tmp_path / ".git" / "HEAD").write_bytes(b"x" * 2048)
+        (tmp_path / "src").mkdir()
+        (tmp_path / "src" / "big.bin").write_bytes(b"x" * 4096)
+        (tmp_path / "src" / "small.bin").write_bytes(b"x" * 10)
+        (tmp_path / "src" / "scratch.tmp").write_bytes(b"x" * 2048)
+        (tmp_path / "src" / "huge.bin").write_bytes(b"x" * 100000)
+        (tmp_path / "photo.jpg").write_bytes(b"x" * 3000)
+        rules = scan_filter.ScanFilter(include=["*.jpg"])
+        
+        result = scanner.scan_directory_detailed(tmp_path, quiet=True, scan_filter=rules)
+        
+        assert result.files == [tmp_path / "photo.jpg"]
+    
+    def test_cli_filter_flags(self):
+        """Test filter flag parsing."""
+        with patch('sys.argv', ['duplicate_finder.py', '/path', '--min-size', '1M', '--max-size', '2G',
+                                '--exclude', '*.tmp', '--exclude', '*.bak', '--exclude-dir', '.git', '--include', '*.jpg']):
+            args = cli.parse_arguments()
+        assert (args.min_size, args.max_size) == (1024 ** 2, 2 * 1024 ** 3)
+        assert args.exclude == ['*.tmp', '*.bak']
+        assert args.exclude_dir == ['.git']
+        assert args.include == ['*.jpg']
+        
+        with patch('sys.argv', ['duplicate_finder.py', '/path']):
+            args = cli.parse_arguments()
+        assert (args.min_size, args.exclude, args.include, args.exclude_dir) == (None, [], [], [])
+
+
+class TestTraversalBoundaries:
+    """Test --one-file-system and symlink policies."""
+    
+    def test_symlink_policies(self, tmp_path):
+        """Test which links each policy keeps, in both scanners."""
+        # A root with links inside and outside it, and a self-referencing outside directory
+        root = tmp_path / "root"
+        outside = tmp_path / "outside"
+        root.mkdir()
+        outside.mkdir()
+        (root / "a.txt").write_text("a")
+        (outside / "b.txt").write_text("b")
+        (outside / "c.txt").write_text("c")
+        try:
+            (root / "link_in.txt").symlink_to(root / "a.txt")
+            (root / "link_out.txt").symlink_to(outside / "b.txt")
+            (root / "dir_out").symlink_to(outside, target_is_directory=True)
+            (outside / "self").symlink_to(outside, target_is_directory=True)
+        except (OSError, NotImplementedError):
+            pytest.skip("Symlinks not supported")
+        expected = {
+            scan_filter.SYMLINKS_SKIP: {root / "a.txt"},
+            scan_filter.SYMLINKS_FILES: {root / "a.txt", outside / "b.txt"},
+            scan_filter.SYMLINKS_WITHIN_ROOT: {root / "a.txt"},
+            scan_filter.SYMLINKS_ALL: {root / "a.txt", outside / "b.txt", outside / "c.txt"},
+        }
+        for policy, files in expected.items():
+            for workers in (None, 2):
+                result = scanner.scan_directory_detailed(root, quiet=True, max_workers=workers, symlinks=policy)
+                assert {f.resolve() for f in result.files} == {f.resolve() for f in files}, policy
+        
+        skipped = scanner.scan_directory_detailed(root, quiet=True, symlinks=scan_filter.SYMLINKS_SKIP)
+        assert skipped.filtered['symlinks'] == 3
+        within = scanner.scan_directory_detailed(root, quiet=True, symlinks=scan_filter.SYMLINKS_WITHIN_ROOT)
+        # The outside file and directory links are turned away
+        assert within.filtered['symlinks'] == 2
+        # By default only the directory link is
+        assert scanner.scan_directory_detailed(root, quiet=True).filtered['symlinks'] == 1
+    
+    def test_follow_all_detects_loops(self, tmp_path):
+        """Test that a directory reached twice through links is scanned once."""
+        # A root with links inside and outside it, and a self-referencing outside directory
+        root = tmp_path / "root"
+        outside = tmp_path / "outside"
+        root.mkdir()
+        outside.mkdir()
+        (root / "a.txt").write_text("a")
+        (outside / "b.txt").write_text("b")
+        (outside / "c.txt").write_text("c")
+        try:
+            (root / "link_in.txt").symlink_to(root / "a.txt")
+            (root / "link_out.txt").symlink_to(outside / "b.txt")
+            (root / "dir_out").symlink_to(outside, target_is_directory=True)
+            (outside / "self").symlink_to(outside, target_is_directory=True)
+        except (OSError, NotImplementedError):
+            pytest.skip("Symlinks not supported")
+        
+        result = scanner.scan_directory_detailed(root, quiet=True, symlinks=scan_filter.SYMLINKS_ALL)
+        
+        # Files of the outside directory are reached through the directory link
+        assert root / "dir_out" / "c.txt" in result.files
+        assert result.filtered['loops'] == 1
+        assert not any("self" in f.parts for f in result.files)
+    
+    def test_follow_all_parallel_matches_sequential(self, tmp_path):
+        """Test that the smallest path owns a directory reached twice, whatever the timing."""
+        # A root with links inside and outside it, and a self-referencing outside directory
+        root = tmp_path / "root"
+        outside = tmp_path / "outside"
+        root.mkdir()
+        outside.mkdir()
+        (root / "a.txt").write_text("a")
+        (outside / "b.txt").write_text("b")
+        (outside / "c.txt").write_text("c")
+        try:
+            (root / "link_in.txt").symlink_to(root / "a.txt")
+            (root / "link_out.txt").symlink_to(outside / "b.txt")
+            (root / "dir_out").symlink_to(outside, target_is_directory=True)
+            (outside / "self").symlink_to(outside, target_is_directory=True)
+        except (OSError, NotImplementedError):
+            pytest.skip("Symlinks not supported")
+        (root / "z_dir_out").symlink_to(outside, target_is_directory=True)
+        sequential = scanner.scan_directory_detailed(root, quiet=True, symlinks=scan_filter.SYMLINKS_ALL)
+        
+        guard = scan_filter.TraversalGuard(root, symlinks=scan_filter.SYMLINKS_ALL)
+        outside_stat = os.stat(outside)
+        # The later path reaches the directory first, then loses it
+        assert guard.enter_directory(outside_stat, str(root / "z_dir_out")) is None
+        assert guard.enter_directory(outside_stat, str(root / "dir_out")) is None
+        assert guard.enter_directory(outside_stat, str(root / "z_dir_out")) == 'loops'
+        assert guard.superseded == [root / "z_dir_out"]
+        
+        for _ in range(5):
+            parallel = scanner.scan_directory_detailed(root, quiet=True, max_workers=4, symlinks=scan_filter.SYMLINKS_ALL)
+            assert parallel.files == sequential.files
+            assert parallel.filtered['loops'] == sequential.filtered['loops']
+        assert root / "dir_out" / "c.txt" in sequential.files
+    
+    def test_guard_device_boundary(self, tmp_path):
+        """Test that directories and link targets on another device are refused."""
+        guard = scan_filter.TraversalGuard(tmp_path, one_file_system=True)
+        same_device = os.stat(tmp_path)
+        other_device = os.stat_result((same_device.st_mode, 1, guard.root_dev + 1) + tuple(same_device)[3:10])
+        
+        assert guard.enter_directory(same_device) is None
+        assert guard.enter_directory(other_device) == 'mount_points'
+        assert not guard.follows_link(tmp_path / "x", other_device)
+        assert scan_filter.TraversalGuard(tmp_path).enter_directory(other_device) is None
+        with pytest.raises(ValueError):
+            scan_filter.TraversalGuard(tmp_path, symlinks="sometimes")
+    
+    def test_one_file_system_scan(self, tmp_path):
+        """Test that a scan stays out of directories on another device."""
+        (tmp_path / "local").mkdir()
+        (tmp_path / "local" / "f.txt").write_text("f")
+        (tmp_path / "mnt").mkdir()
+        (tmp_path / "mnt" / "g.txt").write_text("g")
+        real_enter = scan_filter.TraversalGuard.enter_directory
+        mount = os.stat(tmp_path / "mnt")
+        
+        def enter_directory(guard, stat_result, path=None):
+            if (stat_result.st_dev, stat_result.st_ino) == (mount.st_dev, mount.st_ino):
+                return 'mount_points'
+            return real_enter(guard, stat_result, path)
+        
+        with patch.object(scan_filter.TraversalGuard, 'enter_directory', enter_directory):
+            result = scanner.scan_directory_detailed(tmp_path, quiet=True, one_file_system=True)
+            metadata = fast_detector.scan_files_metadata(tmp_path, one_file_system=True)
+        
+        assert result.files == [tmp_path / "local" / "f.txt"]
+        assert result.filtered['mount_points'] == 1
+        assert [f.path for f in metadata] == [tmp_path / "local" / "f.txt"]
+    
+    def test_fast_mode_symlink_policy(self, tmp_path):
+        """Test that fast mode applies the policy to symlinked files."""
+        # A root with links inside and outside it, and a self-referencing outside directory
+        root = tmp_path / "root"
+        outside = tmp_path / "outside"
+        root.mkdir()
+        outside.mkdir()
+        (root / "a.txt").write_text("a")
+        (outside / "b.txt").write_text("b")
+        (outside / "c.txt").write_text("c")
+        try:
+            (root / "link_in.txt").symlink_to(root / "a.txt")
+            (root / "link_out.txt").symlink_to(outside / "b.txt")
+            (root / "dir_out").symlink_to(outside, target_is_directory=True)
+            (outside / "self").symlink_to(outside, target_is_directory=True)
+        except (OSError, NotImplementedError):
+            pytest.skip("Symlinks not supported")
+        
+        default = fast_detector.scan_files_metadata(root)
+        within = fast_detector.scan_files_metadata(root, symlinks=scan_filter.SYMLINKS_WITHIN_ROOT)
+        skipped = fast_detector.scan_files_metadata(root, symlinks=scan_filter.SYMLINKS_SKIP)
+        
+        # link_in.txt and a.txt are one file; whichever is listed first is kept
+        assert {f.path.resolve().name for f in default} == {"a.txt", "b.txt"}
+        assert {f.path.resolve().name for f in within} == {"a.txt"}
+        assert [f.path.name for f in skipped] == ["a.txt"]
+        
+        # Symlinked directories are never descended in fast mode
+        with pytest.raises(ValueError):
+            fast_detector.scan_files_metadata(root, symlinks=scan_filter.SYMLINKS_ALL)
+        with patch('sys.argv', ['duplicate_finder.py', str(root), '--fast', '--symlinks', 'follow-all']):
+            with patch('sys.stderr'):
+                with pytest.raises(SystemExit):
+                    cli.main()
+    
+    def test_cli_flags(self):
+        """Test --one-file-system and --symlinks parsing."""
+        with patch('sys.argv', ['duplicate_finder.py', '/path', '--one-file-system', '--symlinks', 'follow-all']):
+            args = cli.parse_arguments()
+        assert args.one_file_system is True
+        assert args.symlinks == 'follow-all'
+        
+        with patch('sys.argv', ['duplicate_finder.py', '/path']):
+            args = cli.parse_arguments()
+        assert (args.one_file_system, args.symlinks) == (False, 'follow-files')
+
+
+class TestFileTable:
+    """Test the compact array-backed file table."""
+    
+    def test_paths_round_trip(self, tmp_path):
+        """Test that paths and stat data come back unchanged."""
+        paths = [
+            tmp_path / "a" / "one.txt",
+            tmp_path / "a" / "two.txt",
+            tmp_path / "a" / "b" / "three.txt",
+            Path("relative.txt"),
+        ]
+        records = [
+            scanner.FileRecord(path=p, size=i * 10, mtime_ns=-i, st_dev=2 ** 63 + i, st_ino=i, ctime_ns=i)
+            for i, p in enumerate(paths)
+        ]
+        table = file_table.FileTable()
+        ids = [table.add(record) for record in records]
+        
+        assert ids == [0, 1, 2, 3]
+        assert table.paths() == paths
+        assert [table.record(i) for i in ids] == records
+    
+    def test_directories_are_interned(self, tmp_path):
+        """Test that each directory is stored once however many files it holds."""
+        table = file_table.FileTable()
+        for i in range(100):
+            table.add(scanner.FileRecord(path=tmp_path / "dir" / f"f{i}", size=1, mtime_ns=0, st_dev=0, st_ino=0))
+        
+        # tmp_path's ancestors plus "dir"
+        assert len(table.dirs) == len(tmp_path.parts) + 1
+        assert len(set(table.dir_ids)) == 1
+    
+    def test_group_by_size(self):
+        """Test that IDs are grouped by size in scan order."""
+        table = file_table.FileTable()
+        for i, size in enumerate([5, 7, 5, 9, 5, 7]):
+            table.add(scanner.FileRecord(path=Path(f"/d/f{i}"), size=size, mtime_ns=0, st_dev=0, st_ino=0))
+        
+        groups, unique = table.group_by_size()
+        
+        assert {size: list(ids) for size, ids in groups.items()} == {5: [0, 2, 4], 7: [1, 5]}
+        assert list(unique) == [3]
+    
+    def test_smaller_than_path_records(self, tmp_path):
+        """Test that the table is smaller than the paths it replaces."""
+        records = [
+            scanner.FileRecord(path=tmp_path / "photos" / f"IMG_{i:05d}.jpg", size=i, mtime_ns=i, st_dev=1, st_ino=i)
+            for i in range(2000)
+        ]
+        path_bytes = sum(sys.getsizeof(r.path) + sys.getsizeof(str(r.path)) for r in records)
+        
+        table = file_table.FileTable.from_items(records)
+        
+        assert len(table) == 2000
+        assert table.nbytes < path_bytes
+    
+    def test_find_duplicates_verbose_reports_table(self, tmp_path, capsys):
+        """Test that verbose mode reports the file table footprint."""
+        (tmp_path / "a.txt").write_text("same")
+        (tmp_path / "b.txt").write_text("same")
+        
+        duplicates, unique_files, _ = detector.find_duplicates(sorted(tmp_path.glob("*.txt")), verbose=True)
+        
+        assert len(duplicates) == 1
+        assert "File table:" in capsys.readouterr().out
+    
+    def test_digest_column(self):
+        """Test that hex and raw digests share one fixed-width column."""
+        column = file_table.DigestColumn(3, 4)
+        column[0] = "deadbeef"
+        column[2] = b"\x00\x01\x02\x03"
+        
+        assert column.get(0) == bytes.fromhex("deadbeef")
+        assert 1 not in column and column.get(1) is None
+        assert column.get(2) == b"\x00\x01\x02\x03"
+        with pytest.raises(ValueError):
+            column[1] = "ab"
+        
+        column.discard(0)
+        assert 0 not in column
+    
+    def test_table_paths_are_lazy(self):
+        """Test that TablePaths builds paths only when they are read."""
+        table = file_table.FileTable()
+        for i in range(4):
+            table.add(scanner.FileRecord(path=Path(f"/d/f{i}"), size=1, mtime_ns=0, st_dev=0, st_ino=0))
+        
+        with patch.object(table, 'path', wraps=table.path) as mock_path:
+            view = file_table.TablePaths(table, [3, 1])
+            assert len(view) == 2
+            assert mock_path.call_count == 0
+        
+            assert view == [Path("/d/f3"), Path("/d/f1")]
+            assert view[1:] == [Path("/d/f1")]
+    
+    def test_folder_detection_on_table_matches_paths(self):
+        """Test that a FileTable goes through the same folder detection as paths."""
+        records, hashes = [], {}
+        for folder in ("/r/a", "/r/b", "/r/c"):
+            for name, digest in (("x", "11"), ("y", "22" if folder != "/r/c" else "33")):
+                record = scanner.FileRecord(path=Path(folder) / name, size=5, mtime_ns=0, st_dev=0, st_ino=0)
+                records.append(record)
+                hashes[record.path] = digest * 32
+        table = file_table.FileTable.from_items(records)
+        digests = file_table.DigestColumn(len(table), 32)
+        for file_id, record in enumerate(records):
+            digests[file_id] = hashes[record.path]
+        
+        by_path = folder_detector.find_duplicate_folders(records, hashes)
+        by_id = folder_detector.find_duplicate_folders(table, digests)
+        
+        assert by_path == [[Path("/r/a"), Path("/r/b")]]
+        assert [[table.dirs.path(dir_id) for dir_id in group] for group in by_id] == by_path
+        assert folder_detector.get_files_in_duplicate_folders(by_id, table) == {0, 1, 2, 3}
+        assert folder_detector.select_files_for_folder_hashing(table, file_table.DigestColumn(len(table), 32)) == list(range(6))
+    
+    def test_find_duplicates_carries_ids_to_folder_detection(self, tmp_path):
+        """Test that folder detection runs on file IDs without materializing every path."""
+        for name in ("a", "b"):
+            (tmp_path / name).mkdir()
+            (tmp_path / name / "x.txt").write_text("same")
+        (tmp_path / "c.txt").write_text("other")
+        files = sorted(tmp_path.rglob("*.txt"))
+        
+        with patch.object(file_table.FileTable, 'paths', side_effect=AssertionError("paths() called")):
+            duplicates, unique_files, duplicate_folders = detector.find_duplicates(files, quiet=True)
+        
+        assert isinstance(unique_files, file_table.TablePaths)
+        assert duplicates == {}
+        assert unique_files == [tmp_path / "c.txt"]
+        assert duplicate_folders == [[tmp_path / "a", tmp_path / "b"]]
+
+
+class TestHashCache:
+    """Test the persistent hash cache."""
+    
+    def test_cache_hit_after_put(self, tmp_path):
+        """Test that a stored digest is returned for an unchanged file."""
+        test_file = tmp_path / "file.txt"
+        test_file.write_text("content")
+        record = scanner.get_file_record(test_file)
+        
+        cache = hash_cache.HashCache(tmp_path / "cache.sqlite3")
+        assert cache.get(record) is None
+        cache.put(record, "digest123")
+        cache.put(record, "partial123", partial=True)
+        cache.close()
+        
+        reopened = hash_cache.HashCache(tmp_path / "cache.sqlite3")
+        assert reopened.get(record) == "digest123"
+        assert reopened.get(record, partial=True) == "partial123"
+        assert reopened.get_stats()['hits'] == 2
+        reopened.close()
+    
+    def test_cache_invalidated_by_change(self, tmp_path):
+        """Test that changing size or timestamps misses the cache."""
+        test_file = tmp_path / "file.txt"
+        test_file.write_text("content")
+        record = scanner.get_file_record(test_file)
+        
+        cache = hash_cache.HashCache(tmp_path / "cache.sqlite3")
+        cache.put(record, "digest123")
+        cache.flush()
+        
+        os.utime(test_file, ns=(record.mtime_ns + 10**9, record.mtime_ns + 10**9))
+        changed = scanner.get_file_record(test_file)
+        
+        assert cache.get(changed) is None
+        assert cache.misses == 1
+        cache.close()
+    
+    def test_parallel_hash_files_uses_cache(self, tmp_path):
+        """Test that cached digests are used instead of rehashing."""
+        files = []
+        for i in range(3):
+            file_path = tmp_path / f"file_{i}.txt"
+            file_path.write_text(f"content {i}")
+            files.append(file_path)
+        
+        cache = hash_cache.HashCache(tmp_path / "cache.sqlite3")
+        first = parallel_hasher.parallel_hash_files(files, quiet=True, hash_cache=cache)
+        assert cache.misses == 3
+        
+        with patch('duplicate_finder.parallel_hasher.calculate_file_hash') as mock_hash:
+            second = parallel_hasher.parallel_hash_files(files, quiet=True, hash_cache=cache)
+            mock_hash.assert_not_called()
+        
+        assert second == first
+        assert cache.hits == 3
+        cache.close()
+    
+    def test_cli_cache_flags(self, tmp_path):
+        """Test --cache and --no-cache parsing."""
+        with patch('sys.argv', ['duplicate_finder.py', '/path', '--cache', str(tmp_path / "c.db")]):
+            args = cli.parse_arguments()
+            assert args.cache == tmp_path / "c.db"
+            assert args.no_cache is False
+        
+        with patch('sys.argv', ['duplicate_finder.py', '/path', '--no-cache']):
+            args = cli.parse_arguments()
+            assert args.no_cache is True
+        
+        with patch('sys.argv', ['duplicate_finder.py', str(tmp_path), '--cache', 'x', '--no-cache']):
+            with patch('sys.stderr'):
+                with pytest.raises(SystemExit):
+                    cli.main()
+    
+    def test_default_cache_is_isolated(self, isolated_cache_dir):
+        """Test that the suite never touches the real per-user cache."""
+        assert isolated_cache_dir in hash_cache.default_cache_path().parents
+    
+    def test_stats_reported_on_early_exit(self, tmp_path, capsys):
+        """Test that cache stats are printed even when no file needs hashing."""
+        (tmp_path / "a.txt").write_text("a")
+        (tmp_path / "b.txt").write_text("bb")
+        
+        cache = hash_cache.HashCache(tmp_path / "cache.sqlite3")
+        detector.find_duplicates(sorted(tmp_path.glob("*.txt")), verbose=True, hash_cache=cache)
+        cache.close()
+        
+        assert "Hash cache: 0 hits, 0 misses" in capsys.readouterr().out
+
+
+class _ConstantHash:
+    """Deliberately colliding hash for exercising byte verification."""
+    
+    def update(self, data):
+        pass
+    
+    def copy(self):
+        return self
+    
+    def hexdigest(self):
+        return "0" * 16
+
+
+class TestHashAlgorithms:
+    """Test the hash algorithm registry and byte verification."""
+    
+    @pytest.fixture(autouse=True)
+    def restore_algorithm(self, monkeypatch):
+        monkeypatch.setitem(hasher._HASH_ALGORITHMS, 'constant', hasher.HashAlgorithm('constant', _ConstantHash, False))
+        yield
+        hasher.set_hash_algorithm(hasher.DEFAULT_HASH_ALGORITHM)
+    
+    def test_default_is_sha256(self):
+        """Test that SHA-256 stays the default."""
+        assert hasher.get_hash_algorithm().name == 'sha256'
+        assert {'sha256', 'blake2b', 'sha1'} <= set(hasher.available_hash_algorithms())
+    
+    def test_set_hash_algorithm(self, tmp_path):
+        """Test that the selected algorithm is used for file hashes."""
+        test_file = tmp_path / "file.txt"
+        test_file.write_bytes(b"content")
+        
+        hasher.set_hash_algorithm('blake2b')
+        
+        assert hasher.calculate_file_hash(test_file) == hashlib.blake2b(b"content").hexdigest()
+        state = hasher.calculate_partial_hash_state(test_file)
+        assert hasher.resume_file_hash(test_file, state) == hashlib.blake2b(b"content").hexdigest()
+    
+    def test_unknown_algorithm(self):
+        """Test that an unknown algorithm is rejected."""
+        with pytest.raises(ValueError):
+            hasher.set_hash_algorithm('md4-turbo')
+    
+    def test_cache_separates_algorithms(self, tmp_path):
+        """Test that digests of one algorithm are not served for another."""
+        test_file = tmp_path / "file.txt"
+        test_file.write_text("content")
+        record = scanner.get_file_record(test_file)
+        cache = hash_cache.HashCache(tmp_path / "cache.sqlite3")
+        cache.put(record, "sha-digest")
+        cache.flush()
+        
+        hasher.set_hash_algorithm('sha1')
+        
+        assert cache.get(record) is None
+        cache.close()
+    
+    def test_split_identical(self, tmp_path):
+        """Test that files are partitioned by content."""
+        files = []
+        for name, content in (("a", b"x" * 100), ("b", b"x" * 100), ("c", b"x" * 99 + b"y")):
+            (tmp_path / name).write_bytes(content)
+            files.append(tmp_path / name)
+        
+        groups = byte_compare.split_identical(files, chunk_size=16)
+        
+        assert sorted(map(sorted, groups)) == [[files[0], files[1]], [files[2]]]
+    
+    def test_verify_catches_collisions(self, tmp_path):
+        """Test that --verify splits groups that only share a digest."""
+        for name, content in (("a.txt", "same"), ("b.txt", "same"), ("c.txt", "diff")):
+            (tmp_path / name).write_text(content)
+        files = sorted(tmp_path.glob("*.txt"))
+        
+        hasher.set_hash_algorithm('constant')
+        unverified, _, _ = detector.find_duplicates(files, quiet=True)
+        duplicates, unique_files, _ = detector.find_duplicates(files, quiet=True, verify=True)
+        
+        assert len(list(unverified.values())[0]) == 3
+        assert [sorted(group) for group in duplicates.values()] == [[files[0], files[1]]]
+        assert unique_files == [files[2]]
+    
+    def test_cli_hash_algo_flag(self):
+        """Test --hash-algo and --verify parsing."""
+        with patch('sys.argv', ['duplicate_finder.py', '/path', '--hash-algo', 'blake2b', '--verify']):
+            args = cli.parse_arguments()
+            assert args.hash_algo == 'blake2b'
+            assert args.verify is True
+        with patch('sys.argv', ['duplicate_finder.py', '/path']):
+            args = cli.parse_arguments()
+            assert args.hash_algo == 'sha256'
+            assert args.verify is False
+
+
+class TestBinaryDigests:
+    """Test the raw-bytes digest mode used internally by the CLI."""
+    
+    def test_binary_mode_returns_bytes(self, tmp_path):
+        """Test that hashing yields raw digests inside the block only."""
+        file_path = tmp_path / "data.bin"
+        file_path.write_bytes(b"payload")
+        
+        with hasher.binary_digests():
+            digest = hasher.calculate_file_hash(file_path)
+            partial = hasher.calculate_partial_hash_state(file_path)
+        
+        assert digest == hashlib.sha256(b"payload").digest()
+        assert partial.digest == digest
+        assert hasher.calculate_file_hash(file_path) == digest.hex()
+    
+    @pytest.mark.parametrize("mode", [{}, {'progressive': True}, {'pipelined': True}])
+    def test_find_duplicates_same_groups(self, tmp_path, mode):
+        """Test that binary mode finds the same groups under bytes keys."""
+        big = os.urandom(10000)
+        for name in ("a", "b", "c", "d", "e"):
+            (tmp_path / f"{name}.bin").write_bytes(big)
+        (tmp_path / "s1.txt").write_text("small")
+        (tmp_path / "s2.txt").write_text("small")
+        (tmp_path / "u.txt").write_text("unique")
+        files = sorted(tmp_path.iterdir())
+        
+        hex_result = detector.find_duplicates(files, quiet=True, **mode)
+        with hasher.binary_digests():
+            binary_result = detector.find_duplicates(files, quiet=True, **mode)
+        
+        assert all(isinstance(key, bytes) for key in binary_result[0])
+        assert {key.hex(): sorted(group) for key, group in binary_result[0].items()} == \
+            {key: sorted(group) for key, group in hex_result[0].items()}
+        assert sorted(binary_result[1]) == sorted(hex_result[1])
+    
+    def test_hash_cache_converts_between_modes(self, tmp_path):
+        """Test that digests cached in one representation serve the other."""
+        file_path = tmp_path / "cached.txt"
+        file_path.write_text("cached")
+        record = scanner.get_file_record(file_path)
+        digest = hashlib.sha256(b"cached").digest()
+        cache = hash_cache.HashCache(tmp_path / "cache.sqlite3")
+        try:
+            with hasher.binary_digests():
+                cache.put(record, digest)
+                cache.flush()
+                assert cache.get(record) == digest
+            assert cache.get(record) == digest.hex()
+        finally:
+            cache.close()
+    
+    def test_split_groups_get_tuple_keys(self, tmp_path):
+        """Test that verification splits bytes-keyed groups without string formatting."""
+        files = []
+        for i, content in enumerate([b"one", b"one", b"two", b"two"]):
+            file_path = tmp_path / f"f{i}"
+            file_path.write_bytes(content)
+            files.append(file_path)
+        digest = b"\x01" * 32
+        
+        verified, mismatched = byte_compare.verify_duplicate_groups({digest: files}, quiet=True)
+        
+        assert list(verified) == [digest, (digest, 1)]
+        assert mismatched == []
+        assert hasher.digest_hex((digest, 1)) == "01" * 32 + "#1"
+    
+    def test_json_output_converts_to_hex(self, tmp_path, capsys):
+        """Test that the JSON formatter prints binary digests as hex."""
+        import json
+        file1 = tmp_path / "a.txt"
+        file2 = tmp_path / "b.txt"
+        file1.write_text("same")
+        file2.write_text("same")
+        digest = hashlib.sha256(b"same").digest()
+        
+        formatter.format_json_output({digest: [file1, file2]}, [], [])
+        
+        output = json.loads(capsys.readouterr().out)
+        assert output["duplicate_files"][0]["hash"] == digest.hex()
+
+
+class TestDirectComparison:
+    """Test Stage 3 direct comparison of small candidate groups."""
+    
+    def test_compare_and_hash(self, tmp_path):
+        """Test that identical files get their full hash and others are split off."""
+        content = os.urandom(50000)
+        files = []
+        for name, data in (("a", content), ("b", content), ("c", content[:-1] + bytes([content[-1] ^ 1]))):
+            (tmp_path / name).write_bytes(data)
+            files.append(tmp_path / name)
+        state = hasher.calculate_partial_hash_state(files[0])
+        
+        identical, different = byte_compare.compare_and_hash(files, state, chunk_size=4096)
+        
+        assert identical == {hashlib.sha256(content).hexdigest(): files[:2]}
+        assert different == [files[2]]
+    
+    def test_stops_at_first_difference(self, tmp_path):
+        """Test that comparison stops reading once files differ."""
+        size = 1024 * 1024
+        (tmp_path / "a").write_bytes(b"a" * size)
+        (tmp_path / "b").write_bytes(b"b" * size)
+        files = [tmp_path / "a", tmp_path / "b"]
+        
+        reads = []
+        real_open = open
+        
+        def counting_open(*args, **kwargs):
+            handle = real_open(*args, **kwargs)
+            original_read = handle.read
+            handle.read = lambda n=-1: reads.append(n) or original_read(n)
+            return handle
+        
+        with patch('builtins.open', side_effect=counting_open):
+            identical, different = byte_compare.compare_and_hash(files, chunk_size=4096)
+        
+        assert identical == {}
+        assert sorted(different) == files
+        assert len(reads) == 2
+    
+    def test_small_groups_are_not_hashed(self, tmp_path):
+        """Test that two-file groups skip full hashing in find_duplicates."""
+        content = os.urandom(20000)
+        for name in ("a.bin", "b.bin"):
+            (tmp_path / name).write_bytes(content)
+        (tmp_path / "c.bin").write_bytes(content[:-1] + bytes([content[-1] ^ 1]))
+        files = sorted(tmp_path.glob("*.bin"))
+        
+        with patch('duplicate_finder.detector.parallel_hash_files', wraps=parallel_hasher.parallel_hash_files) as mock_hash:
+            duplicates, unique_files, _ = detector.find_duplicates(files, quiet=True)
+        
+        assert [call.kwargs.get('desc') for call in mock_hash.call_args_list] == ["Partial hashing"]
+        assert duplicates == {hashlib.sha256(content).hexdigest(): files[:2]}
+        assert unique_files == [files[2]]
+
+
+class TestResumableHashing:
+    """Test that Stage 3 reuses Stage 2 hash state."""
+    
+    def test_full_hash_resumes_after_prefix(self, tmp_path):
+        """Test that Stage 3 never hashes large candidates from byte 0."""
+        content = b"x" * 10000
+        files = []
+        # More files than the direct comparison handles, so Stage 3 hashes
+        for name in ("a.bin", "b.bin", "c.bin", "d.bin", "e.bin"):
+            (tmp_path / name).write_bytes(content)
+            files.append(tmp_path / name)
+        
+        with patch('duplicate_finder.parallel_hasher.calculate_file_hash') as mock_hash:
+            with patch('duplicate_finder.parallel_hasher.resume_file_hash', wraps=hasher.resume_file_hash) as mock_resume:
+                duplicates, unique_files, _ = detector.find_duplicates(files, quiet=True)
+        
+        mock_hash.assert_not_called()
+        assert mock_resume.call_count == 5
+        assert list(duplicates) == [hashlib.sha256(content).hexdigest()]
+    
+    def test_small_files_skip_full_hash(self, tmp_path):
+        """Test that files within the partial size are not hashed again."""
+        files = []
+        for name in ("a.txt", "b.txt"):
+            (tmp_path / name).write_text("small duplicate")
+            files.append(tmp_path / name)
+        
+        with patch('duplicate_finder.detector.parallel_hash_files', wraps=parallel_hasher.parallel_hash_files) as mock_hash:
+            duplicates, unique_files, _ = detector.find_duplicates(files, quiet=True)
+        
+        descs = [call.kwargs.get('desc') for call in mock_hash.call_args_list]
+        assert descs == ["Partial hashing"]
+        assert list(duplicates) == [hashlib.sha256(b"small duplicate").hexdigest()]
+
+
+class TestProgressiveHashing:
+    """Test progressive block-by-block comparison."""
+    
+    def test_block_schedule(self):
+        """Test that block sizes grow geometrically from 4KB."""
+        schedule = progressive_hasher.block_schedule()
+        assert [next(schedule) for _ in range(4)] == [4096, 65536, 1048576, 16777216]
+    
+    def test_matches_full_hash(self, tmp_path):
+        """Test that duplicates get the same digest as a full hash."""
+        content = os.urandom(100000)
+        file1 = tmp_path / "a.bin"
+        file2 = tmp_path / "b.bin"
+        file1.write_bytes(content)
+        file2.write_bytes(content)
+        
+        full_hashes, unique, stats = progressive_hasher.progressive_hash_groups(
+            {len(content): [file1, file2]}, quiet=True
+        )
+        
+        assert list(full_hashes) == [hasher.calculate_file_hash(file1)]
+        assert sorted(full_hashes[hasher.calculate_file_hash(file1)]) == [file1, file2]
+        assert unique == []
+        assert stats.rounds == 3
+        assert stats.bytes_read == 2 * len(content)
+        assert stats.baseline_bytes == 2 * len(content)
+        assert not stats.baseline_is_upper_bound
+    
+    def test_early_divergence_saves_io(self, tmp_path):
+        """Test that files differing after the first block are not read to the end."""
+        size = 2 * 1024 * 1024
+        prefix = b"x" * 4096
+        file1 = tmp_path / "a.bin"
+        file2 = tmp_path / "b.bin"
+        file1.write_bytes(prefix + b"a" * (size - 4096))
+        file2.write_bytes(prefix + b"b" * (size - 4096))
+        
+        full_hashes, unique, stats = progressive_hasher.progressive_hash_groups(
+            {size: [file1, file2]}, quiet=True
+        )
+        
+        assert full_hashes == {}
+        assert sorted(unique) == [file1, file2]
+        assert stats.rounds == 2
+        assert stats.bytes_read == 2 * (4096 + 65536)
+        # Stage 3 would resume past the 4KB prefix and stop at the first difference
+        assert stats.baseline_bytes == 2 * size
+        assert stats.baseline_is_upper_bound
+        assert "at most" in stats.summary()
+        assert stats.bytes_saved > 0
+    
+    def test_find_duplicates_progressive(self, tmp_path):
+        """Test that progressive mode finds the same duplicates as the default."""
+        (tmp_path / "a.txt").write_text("same content")
+        (tmp_path / "b.txt").write_text("same content")
+        (tmp_path / "c.txt").write_text("diff content")
+        (tmp_path / "d.txt").write_text("unique")
+        files = sorted(tmp_path.glob("*.txt"))
+        
+        default = detector.find_duplicates(files, quiet=True)
+        progressive = detector.find_duplicates(files, quiet=True, progressive=True)
+        
+        assert {k: sorted(v) for k, v in progressive[0].items()} == {k: sorted(v) for k, v in default[0].items()}
+        assert sorted(progressive[1]) == sorted(default[1])
+    
+    def test_cli_progressive_flag(self):
+        """Test --progressive parsing."""
+        with patch('sys.argv', ['duplicate_finder.py', '/path', '--progressive']):
+            assert cli.parse_arguments().progressive is True
+        with patch('sys.argv', ['duplicate_finder.py', '/path']):
+            assert cli.parse_arguments().progressive is False
+
+
+class TestPipelinedHashing:
+    """Test pipelined Stage 2/3 execution."""
+    
+    def test_matches_two_stage_results(self, tmp_path):
+        """Test that the pipeline finds exactly what the staged scheme finds."""
+        # Small files, a pair, a large group and a partial-hash mismatch
+        big = os.urandom(20000)
+        (tmp_path / "s1.txt").write_text("small")
+        (tmp_path / "s2.txt").write_text("small")
+        (tmp_path / "p1.bin").write_bytes(big)
+        (tmp_path / "p2.bin").write_bytes(big)
+        # Flip a bit so the last byte always differs, whatever urandom gave
+        (tmp_path / "p3.bin").write_bytes(big[:-1] + bytes([big[-1] ^ 1]))
+        for i in range(6):
+            (tmp_path / f"g{i}.dat").write_bytes(b"g" * 30000)
+        (tmp_path / "h1.dat").write_bytes(b"h" * 30000)
+        (tmp_path / "u.txt").write_text("unique")
+        files = sorted(tmp_path.iterdir())
+        
+        default = detector.find_duplicates(files, quiet=True)
+        pipelined = detector.find_duplicates(files, quiet=True, pipelined=True)
+        
+        assert {k: sorted(v) for k, v in pipelined[0].items()} == {k: sorted(v) for k, v in default[0].items()}
+        assert sorted(pipelined[1]) == sorted(default[1])
+        assert len(pipelined[0]) == 3
+    
+    def test_occupancy_report(self, tmp_path):
+        """Test that every stage's tasks are counted."""
+        # Small files, a pair, a large group and a partial-hash mismatch
+        big = os.urandom(20000)
+        (tmp_path / "s1.txt").write_text("small")
+        (tmp_path / "s2.txt").write_text("small")
+        (tmp_path / "p1.bin").write_bytes(big)
+        (tmp_path / "p2.bin").write_bytes(big)
+        # Flip a bit so the last byte always differs, whatever urandom gave
+        (tmp_path / "p3.bin").write_bytes(big[:-1] + bytes([big[-1] ^ 1]))
+        for i in range(6):
+            (tmp_path / f"g{i}.dat").write_bytes(b"g" * 30000)
+        (tmp_path / "h1.dat").write_bytes(b"h" * 30000)
+        (tmp_path / "u.txt").write_text("unique")
+        files = sorted(tmp_path.iterdir())
+        size_groups = {}
+        for f in files:
+            size_groups.setdefault(f.stat().st_size, []).append(f)
+        size_groups = {size: group for size, group in size_groups.items() if len(group) > 1}
+        
+        full_hashes, candidates, stats = pipeline.pipelined_hash_groups(size_groups, quiet=True, max_workers=2)
+        
+        assert stats.stages[pipeline.STAGE_PARTIAL].tasks == 12
+        # p1/p2/p3 share a size but p3 differs at the end: one direct comparison
+        assert stats.stages[pipeline.STAGE_COMPARE].tasks == 1
+        # h1 drops out on its partial hash; six files are too many to compare directly
+        assert stats.stages[pipeline.STAGE_FULL].tasks == 6
+        assert tmp_path / "p3.bin" not in candidates
+        assert all(0.0 <= stats.occupancy(stage) for stage in pipeline.PIPELINE_STAGES)
+        assert len(stats.summary()) == len(pipeline.PIPELINE_STAGES)
+    
+    def test_uses_hash_cache(self, tmp_path):
+        """Test that a second pipelined run is answered from the cache."""
+        tree = tmp_path / "tree"
+        tree.mkdir()
+        # Small files, a pair, a large group and a partial-hash mismatch
+        big = os.urandom(20000)
+        (tree / "s1.txt").write_text("small")
+        (tree / "s2.txt").write_text("small")
+        (tree / "p1.bin").write_bytes(big)
+        (tree / "p2.bin").write_bytes(big)
+        # Flip a bit so the last byte always differs, whatever urandom gave
+        (tree / "p3.bin").write_bytes(big[:-1] + bytes([big[-1] ^ 1]))
+        for i in range(6):
+            (tree / f"g{i}.dat").write_bytes(b"g" * 30000)
+        (tree / "h1.dat").write_bytes(b"h" * 30000)
+        (tree / "u.txt").write_text("unique")
+        files = sorted(tree.iterdir())
+        cache = hash_cache.HashCache(tmp_path / "cache.sqlite3")
+        try:
+            records = [scanner.get_file_record(f) for f in files]
+            first = detector.find_duplicates(records, quiet=True, pipelined=True, hash_cache=cache)
+            with patch('duplicate_finder.pipeline.calculate_partial_hash_state') as mock_partial, \
+                    patch('duplicate_finder.pipeline._full_hash') as mock_full:
+                second = detector.find_duplicates(records, quiet=True, pipelined=True, hash_cache=cache)
+            mock_partial.assert_not_called()
+            mock_full.assert_not_called()
+        finally:
+            cache.close()
+        
+        assert {k: sorted(v) for k, v in second[0].items()} == {k: sorted(v) for k, v in first[0].items()}
+    
+    def test_cli_pipeline_flag(self):
+        """Test --pipeline parsing."""
+        with patch('sys.argv', ['duplicate_finder.py', '/path', '--pipeline']):
+            assert cli.parse_arguments().pipeline is True
+        with patch('sys.argv', ['duplicate_finder.py', '/path']):
+            assert cli.parse_arguments().pipeline is False
+        
+        with patch('sys.argv', ['duplicate_finder.py', '/path', '--pipeline', '--progressive']):
+            with pytest.raises(SystemExit) as exc_info:
+                cli.main()
+        assert exc_info.value.code == 1
+
+
+class TestBudgetedDetection:
+    """Test --top / --time-budget runs that check the largest savings first."""
+    
+    def test_top_stops_after_confirmed_groups(self, tmp_path):
+        """Test that --top checks groups by savings and reports only the largest."""
+        # Four groups of four identical files, savings largest for 'a'
+        for name, size in (("a", 10000), ("b", 5000), ("c", 300), ("d", 100)):
+            for i in range(4):
+                (tmp_path / f"{name}{i}.bin").write_bytes(name.encode() * size)
+        (tmp_path / "u.txt").write_text("unique")
+        files = sorted(tmp_path.iterdir())
+        coverage = detector.Coverage()
+        
+        # One worker: eight files per batch, so the first batch holds 'a' and 'b'
+        duplicates, unique_files, folders = detector.find_duplicates(
+            files, quiet=True, manual_workers=1, top=1, coverage=coverage
+        )
+        
+        assert [sorted(group) for group in duplicates.values()] == [[tmp_path / f"a{i}.bin" for i in range(4)]]
+        assert unique_files == [tmp_path / "u.txt"]
+        assert folders == []
+        assert coverage.stop_reason == detector.STOP_TOP
+        assert not coverage.complete
+        assert (coverage.groups_checked, coverage.groups_total) == (2, 4)
+        assert coverage.groups_found == 2
+        assert coverage.bytes_unverified == 4 * 300 + 4 * 100
+    
+    def test_time_budget_exhausted(self, tmp_path):
+        """Test that a spent budget leaves every candidate unverified."""
+        # Four groups of four identical files, savings largest for 'a'
+        for name, size in (("a", 10000), ("b", 5000), ("c", 300), ("d", 100)):
+            for i in range(4):
+                (tmp_path / f"{name}{i}.bin").write_bytes(name.encode() * size)
+        (tmp_path / "u.txt").write_text("unique")
+        files = sorted(tmp_path.iterdir())
+        coverage = detector.Coverage()
+        
+        duplicates, unique_files, _ = detector.find_duplicates(
+            files, quiet=True, time_budget=1e-9, coverage=coverage
+        )
+        
+        assert duplicates == {}
+        assert unique_files == [tmp_path / "u.txt"]
+        assert coverage.stop_reason == detector.STOP_TIME_BUDGET
+        assert coverage.groups_checked == 0
+        assert coverage.bytes_unverified == coverage.bytes_total == 4 * (10000 + 5000 + 300 + 100)
+    
+    def test_generous_budget_matches_full_run(self, tmp_path):
+        """Test that a budget that is never reached finds everything."""
+        # Four groups of four identical files, savings largest for 'a'
+        for name, size in (("a", 10000), ("b", 5000), ("c", 300), ("d", 100)):
+            for i in range(4):
+                (tmp_path / f"{name}{i}.bin").write_bytes(name.encode() * size)
+        (tmp_path / "u.txt").write_text("unique")
+        files = sorted(tmp_path.iterdir())
+        coverage = detector.Coverage()
+        
+        default = detector.find_duplicates(files, quiet=True)
+        budgeted = detector.find_duplicates(files, quiet=True, manual_workers=1, time_budget=3600, coverage=coverage)
+        
+        assert {k: sorted(v) for k, v in budgeted[0].items()} == {k: sorted(v) for k, v in default[0].items()}
+        assert sorted(budgeted[1]) == sorted(default[1])
+        assert coverage.complete
+        assert coverage.stop_reason is None
+        assert coverage.bytes_unverified == 0
+    
+    def test_coverage_in_output(self, tmp_path, capsys):
+        """Test the coverage section in text and JSON output."""
+        import json
+        # Four groups of four identical files, savings largest for 'a'
+        for name, size in (("a", 10000), ("b", 5000), ("c", 300), ("d", 100)):
+            for i in range(4):
+                (tmp_path / f"{name}{i}.bin").write_bytes(name.encode() * size)
+        (tmp_path / "u.txt").write_text("unique")
+        files = sorted(tmp_path.iterdir())
+        coverage = detector.Coverage()
+        duplicates, unique_files, folders = detector.find_duplicates(
+            files, quiet=True, manual_workers=1, top=1, coverage=coverage
+        )
+        
+        formatter.format_output(duplicates, unique_files, folders, coverage=coverage)
+        text = capsys.readouterr().out
+        assert "COVERAGE" in text
+        assert "Stopped after confirming the top 1 duplicate groups" in text
+        assert "Candidate bytes left unverified: 1.6 KB" in text
+        
+        formatter.format_json_output(duplicates, unique_files, folders, coverage=coverage)
+        output = json.loads(capsys.readouterr().out)
+        assert output["coverage"]["stop_reason"] == "top"
+        assert output["coverage"]["candidate_bytes_unverified"] == 1600
+        assert output["coverage"]["complete"] is False
+    
+    def test_cli_flags(self):
+        """Test --top / --time-budget parsing and conflicts."""
+        with patch('sys.argv', ['duplicate_finder.py', '/path', '--top', '10', '--time-budget', '2.5']):
+            args = cli.parse_arguments()
+        assert (args.top, args.time_budget) == (10, 2.5)
+        
+        with patch('sys.argv', ['duplicate_finder.py', '/path', '--top', '10', '--fast']):
+            with pytest.raises(SystemExit):
+                cli.main()
+
 
 class TestMemoryEfficientProcessing:
     """Test memory-efficient duplicate detection."""
@@ -1558,6 +3018,110 @@ class TestMemoryEfficientProcessing:
         # Cache should have evicted some entries
         assert len(cache.cache) <= 3
     
+    def test_cache_evicts_least_recently_used(self, tmp_path):
+        """Test that a lookup protects an entry from eviction."""
+        files = []
+        for i in range(3):
+            file_path = tmp_path / f"lru{i}.txt"
+            file_path.write_text(f"content {i}")
+            files.append(scanner.get_file_record(file_path))
+        cache = memory_efficient_detector.PartialHashCache(max_size=2)
+        
+        cache.put(files[0], "h0")
+        cache.put(files[1], "h1")
+        assert cache.get(files[0]) == "h0"
+        cache.put(files[2], "h2")
+        
+        assert cache.get(files[1]) is None
+        assert cache.get(files[0]) == "h0"
+        assert cache.get(files[2]) == "h2"
+        assert cache.get_stats()['size'] == 2
+    
+    def test_cache_keyed_by_inode_and_kind(self, tmp_path):
+        """Test that hardlinks share entries and partial/full digests are separate."""
+        original = tmp_path / "original.txt"
+        original.write_text("linked content")
+        link = tmp_path / "link.txt"
+        os.link(original, link)
+        cache = memory_efficient_detector.PartialHashCache()
+        
+        cache.put(original, "partial-digest")
+        cache.put(original, "full-digest", partial=False)
+        
+        assert cache.get(link) == "partial-digest"
+        assert cache.get(scanner.get_file_record(link), partial=False) == "full-digest"
+        
+        # A modified file no longer matches its stamp
+        original.write_text("changed content!")
+        assert cache.get(original) is None
+    
+    def test_cache_reads_and_writes_through_backing(self, tmp_path):
+        """Test persistence through the on-disk hash cache."""
+        file_path = tmp_path / "persist.txt"
+        file_path.write_text("persisted")
+        record = scanner.get_file_record(file_path)
+        backing = hash_cache.HashCache(tmp_path / "cache.sqlite3")
+        try:
+            first = memory_efficient_detector.PartialHashCache(backing=backing)
+            first.put(record, "abc", partial=False)
+            first.flush()
+            
+            second = memory_efficient_detector.PartialHashCache(backing=backing)
+            assert second.get(record, partial=False) == "abc"
+            assert second.get(record, partial=False) == "abc"
+            stats = second.get_stats()
+            assert (stats['backing_hits'], stats['hits'], stats['misses']) == (1, 1, 0)
+            assert stats['hit_rate'] == 100
+        finally:
+            backing.close()
+    
+    def test_memory_efficient_hashes_each_file_once(self, tmp_path):
+        """Test that Stages 2-4 share digests instead of re-hashing."""
+        for folder in ("a", "b"):
+            (tmp_path / folder).mkdir()
+            (tmp_path / folder / "one.txt").write_text("first file")
+            (tmp_path / folder / "two.txt").write_text("second file!")
+        files = sorted(tmp_path.rglob("*.txt"))
+        
+        with patch('duplicate_finder.parallel_hasher.calculate_file_hash', wraps=hasher.calculate_file_hash) as mock_hash:
+            duplicates, unique_files, duplicate_folders = memory_efficient_detector.find_duplicates_memory_efficient(
+                files, quiet=True
+            )
+        
+        assert len(duplicate_folders) == 1
+        hashed = [(call.args[0], call.args[1]) for call in mock_hash.call_args_list]
+        assert len(hashed) == len(set(hashed))
+    
+    def test_memory_efficient_keys_cache_on_scan_records(self, tmp_path):
+        """Test that Stages 2-4 never stat a file the scan already recorded."""
+        for folder in ("a", "b"):
+            (tmp_path / folder).mkdir()
+            (tmp_path / folder / "one.txt").write_text("first file")
+            (tmp_path / folder / "two.txt").write_text("second file!")
+        records = [scanner.get_file_record(f) for f in sorted(tmp_path.rglob("*.txt"))]
+        
+        with patch('duplicate_finder.scanner.get_file_record') as mock_stat, \
+                patch('duplicate_finder.parallel_hasher.get_file_record') as mock_cache_stat:
+            duplicates, unique_files, duplicate_folders = memory_efficient_detector.find_duplicates_memory_efficient(
+                records, quiet=True
+            )
+        
+        mock_stat.assert_not_called()
+        mock_cache_stat.assert_not_called()
+        assert len(duplicate_folders) == 1
+    
+    def test_memory_efficient_verbose_cache_stats(self, tmp_path, capsys):
+        """Test that verbose mode reports digest cache hit rates."""
+        for i in range(3):
+            (tmp_path / f"d{i}.txt").write_text("duplicate")
+        files = sorted(tmp_path.glob("*.txt"))
+        
+        memory_efficient_detector.find_duplicates_memory_efficient(files, verbose=True)
+        
+        output = capsys.readouterr().out
+        assert "Digest cache after Stage 2: 0 memory hits, 3 misses" in output
+        assert "Digest cache after Stage 4" in output
+    
     def test_batch_files_by_size(self):
         """Test file batching generator."""
         files = [Path(f"/test/file{i}.txt") for i in range(10)]
@@ -1591,6 +3155,104 @@ class TestMemoryEfficientProcessing:
         assert len(unique_files) == 1
         assert len(list(size_groups.values())[0]) == 5
     
+    def test_size_grouper_spills_sorted_runs(self, tmp_path):
+        """Test that a tiny memory ceiling spills runs and still groups correctly."""
+        grouper = external_grouping.SizeGrouper(max_memory=1, temp_dir=tmp_path)
+        for i in range(10):
+            grouper.add(i % 3, Path(f"/data/file{i}.txt"))
+        grouper.add(99, Path("/data/lonely.txt"))
+        
+        size_groups, unique_files = grouper.finish()
+        
+        assert len(grouper.runs) == 11
+        assert {size: len(group) for size, group in size_groups.items()} == {0: 4, 1: 3, 2: 3}
+        assert sorted(size_groups[1]) == [Path("/data/file1.txt"), Path("/data/file4.txt"), Path("/data/file7.txt")]
+        assert unique_files == [Path("/data/lonely.txt")]
+        # Run files are removed once merged
+        assert list(tmp_path.iterdir()) == []
+    
+    def test_size_grouper_in_memory(self, tmp_path):
+        """Test that nothing touches disk under the ceiling."""
+        grouper = external_grouping.SizeGrouper(temp_dir=tmp_path)
+        grouper.add(5, Path("/a"))
+        grouper.add(5, Path("/b"))
+        
+        size_groups, unique_files = grouper.finish()
+        
+        assert grouper.runs == []
+        assert size_groups == {5: [Path("/a"), Path("/b")]}
+        assert unique_files == []
+    
+    def test_size_grouper_keeps_records(self, tmp_path):
+        """Test that stat data survives spilled runs when records are kept."""
+        grouper = external_grouping.SizeGrouper(max_memory=1, temp_dir=tmp_path, keep_records=True)
+        records = [scanner.FileRecord(Path(f"/data/r{i}"), 7, 100 + i, 1, 50 + i, 200 + i) for i in range(2)]
+        for record in records:
+            grouper.add_record(record)
+        grouper.add_record(scanner.FileRecord(Path("/data/lonely"), 9, 1, 1, 99, 1))
+        
+        size_groups, unique_files = grouper.finish()
+        
+        assert size_groups == {7: records}
+        assert unique_files == [Path("/data/lonely")]
+    
+    def test_file_spool(self, tmp_path):
+        """Test that spooled files read back in order, more than once."""
+        spool = external_grouping.FileSpool(keep_records=True, temp_dir=tmp_path)
+        record = scanner.FileRecord(Path("/data/r"), 7, 1, 2, 3, 4)
+        spool.append(record)
+        spool.extend([Path("/data/p")])
+        
+        assert len(spool) == 2
+        assert list(spool) == [record, scanner.FileRecord(Path("/data/p"), 0, 0, 0, 0, 0)]
+        assert list(spool)[0] == record
+        spool.close()
+    
+    def test_file_spool_reads_sequentially(self, tmp_path):
+        """Test that iteration only seeks when an append or another iterator moved the offset."""
+        spool = external_grouping.FileSpool(temp_dir=tmp_path)
+        spool.extend(Path(f"/data/f{i}") for i in range(5))
+        
+        with patch.object(spool._file, 'seek', wraps=spool._file.seek) as mock_seek:
+            assert list(spool) == [Path(f"/data/f{i}") for i in range(5)]
+        assert mock_seek.call_count == 1
+        
+        # Interleaved appends and nested iterators keep their own positions
+        outer = iter(spool)
+        assert next(outer) == Path("/data/f0")
+        spool.append(Path("/data/f5"))
+        assert [f.name for f in spool] == [f"f{i}" for i in range(6)]
+        assert [f.name for f in outer] == ["f1", "f2", "f3", "f4"]
+        spool.close()
+    
+    def test_streaming_size_groups_with_spilling(self, tmp_path):
+        """Test that spilled grouping matches in-memory grouping and takes a generator."""
+        files = []
+        for i in range(12):
+            file_path = tmp_path / f"f{i}.txt"
+            file_path.write_text("x" * (i % 4 + (10 if i == 11 else 0)))
+            files.append(file_path)
+        
+        spilled = memory_efficient_detector.process_size_groups_streaming(
+            (f for f in files), quiet=True, max_memory=200
+        )
+        in_memory = memory_efficient_detector.process_size_groups_streaming(files, quiet=True)
+        
+        assert {k: sorted(v) for k, v in spilled[0].items()} == {k: sorted(v) for k, v in in_memory[0].items()}
+        assert spilled[1] == in_memory[1] == [files[11]]
+    
+    def test_cli_max_memory(self):
+        """Test --max-memory size parsing."""
+        with patch('sys.argv', ['duplicate_finder.py', '/path', '--memory-efficient', '--max-memory', '512M']):
+            assert cli.parse_arguments().max_memory == 512 * 1024 * 1024
+        with patch('sys.argv', ['duplicate_finder.py', '/path']):
+            assert cli.parse_arguments().max_memory == external_grouping.DEFAULT_MAX_MEMORY
+        assert cli.parse_size("2g") == 2 * 1024 ** 3
+        assert cli.parse_size("1.5KB") == 1536
+        assert cli.parse_size("4096") == 4096
+        with pytest.raises(cli.argparse.ArgumentTypeError):
+            cli.parse_size("lots")
+    
     def test_find_duplicates_memory_efficient(self, tmp_path):
         """Test memory-efficient duplicate detection."""
         # Create duplicate files
@@ -1616,6 +3278,21 @@ class TestMemoryEfficientProcessing:
         assert len(list(duplicates.values())[0]) == 4
         assert len(unique_files) == 3
     
+    def test_memory_efficient_streams_input_and_unique_files(self, tmp_path):
+        """Test that the input is consumed once and unique files are spooled, not listed."""
+        for i in range(3):
+            (tmp_path / f"dup{i}.txt").write_text("duplicate")
+            (tmp_path / f"unique{i}.txt").write_text("unique" * (i + 2))
+        records = (scanner.get_file_record(f) for f in sorted(tmp_path.glob("*.txt")))
+        
+        duplicates, unique_files, duplicate_folders = memory_efficient_detector.find_duplicates_memory_efficient(
+            records, quiet=True
+        )
+        
+        assert isinstance(unique_files, external_grouping.FileSpool)
+        assert sorted(unique_files) == [tmp_path / f"unique{i}.txt" for i in range(3)]
+        assert [len(group) for group in duplicates.values()] == [3]
+    
     def test_memory_efficient_with_folders(self, tmp_path):
         """Test memory-efficient mode with folder duplicates."""
         # Create duplicate folders
@@ -1674,6 +3351,16 @@ class TestMemoryEfficientProcessing:
             assert args.memory_efficient is True
             assert args.batch_size == 500
     
+    @pytest.mark.parametrize("flag", [["--pipeline"], ["--progressive"], ["--adaptive"], ["--workers", "4"]])
+    def test_cli_rejects_ignored_flags(self, tmp_path, flag, capsys):
+        """Test that flags memory-efficient mode would ignore are rejected."""
+        with patch('sys.argv', ['duplicate_finder.py', str(tmp_path), '--memory-efficient'] + flag):
+            with pytest.raises(SystemExit) as exc_info:
+                cli.main()
+        
+        assert exc_info.value.code == 1
+        assert "--memory-efficient mode cannot be combined" in capsys.readouterr().err
+    
     def test_memory_efficient_large_dataset(self, tmp_path):
         """Test memory-efficient mode with many files."""
         # Create many files to test batching
@@ -1885,6 +3572,19 @@ class TestFastDetector:
         assert fast_detector.categorize_file(Path("test.exe")) == fast_detector.FileCategory.OTHER
         assert fast_detector.categorize_file(Path("test")) == fast_detector.FileCategory.OTHER
     
+    def test_scan_files_metadata_collapses_hardlinks(self, tmp_path):
+        """Test that hardlinks are scanned once in fast mode."""
+        (tmp_path / "a").mkdir()
+        (tmp_path / "b").mkdir()
+        (tmp_path / "a" / "photo.jpg").write_bytes(b"x" * 1000)
+        os.link(tmp_path / "a" / "photo.jpg", tmp_path / "b" / "photo.jpg")
+        
+        files = fast_detector.scan_files_metadata(tmp_path)
+        parallel_files = fast_detector.scan_files_metadata(tmp_path, max_workers=2)
+        
+        assert len(files) == 1
+        assert len(parallel_files) == 1
+    
     def test_scan_files_metadata(self, tmp_path):
         """Test metadata scanning of files."""
         # Create test files
@@ -1977,6 +3677,125 @@ class TestFastDetector:
         assert len(duplicates) == 0
         assert len(unique) == 2
     
+    def test_find_metadata_duplicates_groups_in_one_pass(self):
+        """Test name collisions are grouped by key, in first-seen order, without pairwise checks."""
+        def meta(path, size):
+            path = Path(path)
+            return fast_detector.FileMetadata(path=path, size=size, mtime=0.0, name=path.name, name_lower=path.name.lower())
+        
+        files = [
+            meta("/a/index.html", 10), meta("/b/README.md", 5), meta("/c/INDEX.html", 20),
+            meta("/d/index.html", 10), meta("/e/index.html", 30), meta("/f/index.html", 20),
+            meta("/g/readme.md", 6),
+        ]
+        files += [meta(f"/many/{i}/index.html", 1000 + i) for i in range(2000)]
+        
+        with patch('duplicate_finder.fast_detector.are_duplicates_by_category', side_effect=AssertionError):
+            duplicates, unique = fast_detector.find_metadata_duplicates(files)
+        
+        assert [[str(f.path) for f in group.files] for group in duplicates] == [
+            ["/a/index.html", "/d/index.html"],
+            ["/c/INDEX.html", "/f/index.html"],
+        ]
+        assert all(group.match_type == 'category_match' for group in duplicates)
+        assert [str(f.path) for f in unique[:2]] == ["/e/index.html", "/many/0/index.html"]
+        assert [str(f.path) for f in unique[-2:]] == ["/b/README.md", "/g/readme.md"]
+        assert len(unique) == len(files) - 4
+    
+    def test_compact_records(self, tmp_path):
+        """Test that fast-mode records are slotted and share directories and names."""
+        (tmp_path / "a").mkdir()
+        (tmp_path / "b").mkdir()
+        for directory in ("a", "b"):
+            (tmp_path / directory / "IMG_0001.JPG").write_bytes(b"x" * 10)
+            (tmp_path / directory / "clip.mp4").write_bytes(b"y" * 20)
+        
+        files = fast_detector.scan_files_metadata(tmp_path)
+        assert not hasattr(files[0], "__dict__")
+        by_path = {file_meta.path: file_meta for file_meta in files}
+        assert set(by_path) == {tmp_path.resolve() / d / n for d in ("a", "b") for n in ("IMG_0001.JPG", "clip.mp4")}
+        
+        first, second = (by_path[tmp_path.resolve() / d / "IMG_0001.JPG"] for d in ("a", "b"))
+        assert first.name is second.name
+        assert first.name_lower == "img_0001.jpg"
+        assert first.category == fast_detector.FileCategory.PHOTO
+        assert by_path[tmp_path.resolve() / "a" / "clip.mp4"].dir_id == first.dir_id != second.dir_id
+        
+        made = fast_detector.FileMetadata(path=Path("/x/notes.txt"), size=1, mtime=0.0, name="notes.txt",
+                                          name_lower="notes.txt", category=fast_detector.FileCategory.DOCUMENT)
+        assert made.path == Path("/x/notes.txt")
+        assert made.name_lower is made.name
+        assert made == fast_detector.FileMetadata(path=Path("/x/notes.txt"), size=1, mtime=0.0, name="notes.txt",
+                                                  name_lower="notes.txt", category=fast_detector.FileCategory.DOCUMENT)
+        # Records built one at a time share one table instead of one each
+        other = fast_detector.FileMetadata(path=Path("/x/other.txt"), size=1, mtime=0.0, name="other.txt",
+                                           name_lower="other.txt")
+        assert other._directories is made._directories
+        assert other.dir_id == made.dir_id
+        
+        made.category = fast_detector.FileCategory.OTHER
+        assert made.category == fast_detector.FileCategory.OTHER
+        group = fast_detector.DuplicateGroup(files=[made, other], match_type='exact')
+        group.category = fast_detector.FileCategory.PHOTO
+        assert group.category == fast_detector.FileCategory.PHOTO
+
+    @pytest.mark.parametrize("workers", [None, 4])
+    def test_each_scan_owns_its_directories(self, tmp_path, workers):
+        """Test that every scan interns directories in a table of its own."""
+        for directory in ("a", "b"):
+            (tmp_path / directory).mkdir()
+            (tmp_path / directory / "file.txt").write_text("x")
+        
+        first = fast_detector.scan_files_metadata(tmp_path, max_workers=workers)
+        second = fast_detector.scan_files_metadata(tmp_path / "b", max_workers=workers)
+        
+        first_table, second_table = first[0]._directories, second[0]._directories
+        assert all(file_meta._directories is first_table for file_meta in first)
+        assert second_table is not first_table
+        # The second scan only holds b and its ancestors
+        assert len(second_table) == len(tmp_path.resolve().parts) + 1
+        assert second == [file_meta for file_meta in first if file_meta.path.parent.name == "b"]
+    
+    def test_normalize_copy_name(self):
+        """Test that copy markers are stripped from filenames."""
+        for name in ("photo (1).jpg", "photo - copy.jpg", "photo - copy (2).jpg", "photo_copy2.jpg",
+                     "photo copy.jpg", "copy of photo.jpg", "photo (1) - copy.jpg"):
+            assert fast_detector.normalize_copy_name(name) == "photo.jpg", name
+        for name in ("photocopy.jpg", ".bashrc", "readme", "(1).jpg"):
+            assert fast_detector.normalize_copy_name(name) == name
+    
+    def test_match_strategies(self, tmp_path):
+        """Test that each strategy catches its kind of copy and is recorded in match_type."""
+        def meta(path, size, mtime=0.0):
+            path = Path(path)
+            return fast_detector.FileMetadata(path=path, size=size, mtime=mtime, name=path.name, name_lower=path.name.lower())
+        
+        files = [
+            meta("/a/photo.jpg", 100), meta("/b/photo.jpg", 100), meta("/c/photo (1).jpg", 100),
+            meta("/d/holiday.jpg", 100), meta("/e/report.pdf", 100, mtime=50.0),
+            meta("/f/report-final.docx", 100, mtime=50.0), meta("/g/other.txt", 7),
+        ]
+        
+        by_name, _ = fast_detector.find_metadata_duplicates(files)
+        assert [len(g.files) for g in by_name] == [2]
+        
+        groups, unique = fast_detector.find_metadata_duplicates(
+            files, strategies=["name", "normalized-name", "size-ext", "size-mtime"]
+        )
+        
+        assert [(g.match_type, [str(f.path) for f in g.files]) for g in groups] == [
+            # holiday.jpg only joins through photo (1).jpg's size and extension
+            ('size_ext', ["/a/photo.jpg", "/b/photo.jpg", "/c/photo (1).jpg", "/d/holiday.jpg"]),
+            ('size_mtime', ["/e/report.pdf", "/f/report-final.docx"]),
+        ]
+        assert [str(f.path) for f in unique] == ["/g/other.txt"]
+        
+        groups, _ = fast_detector.find_metadata_duplicates(files, strategies=["name", "normalized-name"])
+        assert [(g.match_type, len(g.files)) for g in groups] == [('normalized_name', 3)]
+        
+        with pytest.raises(ValueError):
+            fast_detector.find_metadata_duplicates(files, strategies=["checksum"])
+    
     def test_fast_find_duplicates_integration(self, tmp_path):
         """Test the main fast duplicate finder function."""
         import time
@@ -2205,4 +4024,233 @@ class TestFastDetector:
         
         # Should find duplicates despite case differences
         assert len(duplicates) == 1
-        assert len(duplicates[0].files) == 2
\ No newline at end of file
+        assert len(duplicates[0].files) == 2
+
+
+class TestSampledVerification:
+    """Test the sampled content tier for fast mode."""
+    
+    def test_sample_offsets(self):
+        """Test head/middle/tail placement and whole-file reads for small files."""
+        assert sampled_verifier.sample_offsets(100, 4096) == [0]
+        assert sampled_verifier.sample_offsets(3 * 4096, 4096) == [0]
+        assert sampled_verifier.sample_offsets(1000000, 4096) == [0, (1000000 - 4096) // 2, 1000000 - 4096]
+    
+    def test_groups_are_split_by_samples(self, tmp_path):
+        """Test that a group is split where samples differ and upgraded where they match."""
+        # Same name and size: two copies, one differing mid-file, one differing off-sample
+        content = os.urandom(100000)
+        paths = [tmp_path / name / "video.mp4" for name in ("a", "b", "c", "d")]
+        for path in paths:
+            path.parent.mkdir()
+        paths[0].write_bytes(content)
+        paths[1].write_bytes(content)
+        paths[2].write_bytes(content[:50000] + bytes([content[50000] ^ 0xFF]) + content[50001:])
+        paths[3].write_bytes(content[:25000] + bytes([content[25000] ^ 0xFF]) + content[25001:])
+        groups, unique = fast_detector.fast_find_duplicates(tmp_path, quiet=True)
+        assert len(groups) == 1 and groups[0].match_type == 'category_match'
+        
+        verified, mismatched = sampled_verifier.verify_groups_sampled(groups, quiet=True)
+        
+        assert len(verified) == 1
+        assert verified[0].match_type == 'sampled_verified'
+        # Sampling cannot see a difference between the samples
+        assert sorted(f.path for f in verified[0].files) == [paths[0], paths[1], paths[3]]
+        assert [f.path for f in mismatched] == [paths[2]]
+    
+    def test_unreadable_files_are_unique(self, tmp_path):
+        """Test that files that cannot be read are not confirmed."""
+        # Same name and size: two copies, one differing mid-file, one differing off-sample
+        content = os.urandom(100000)
+        paths = [tmp_path / name / "video.mp4" for name in ("a", "b", "c", "d")]
+        for path in paths:
+            path.parent.mkdir()
+        paths[0].write_bytes(content)
+        paths[1].write_bytes(content)
+        paths[2].write_bytes(content[:50000] + bytes([content[50000] ^ 0xFF]) + content[50001:])
+        paths[3].write_bytes(content[:25000] + bytes([content[25000] ^ 0xFF]) + content[25001:])
+        groups, _ = fast_detector.fast_find_duplicates(tmp_path, quiet=True)
+        paths[1].unlink()
+        
+        verified, mismatched = sampled_verifier.verify_groups_sampled(groups, quiet=True)
+        
+        assert sorted(f.path for f in verified[0].files) == [paths[0], paths[3]]
+        assert sorted(f.path for f in mismatched) == [paths[1], paths[2]]
+    
+    def test_cli_sample_verify(self, tmp_path, capsys):
+        """Test --fast --sample-verify end to end, and that it requires --fast."""
+        import json
+        # Same name and size: two copies, one differing mid-file, one differing off-sample
+        content = os.urandom(100000)
+        paths = [tmp_path / name / "video.mp4" for name in ("a", "b", "c", "d")]
+        for path in paths:
+            path.parent.mkdir()
+        paths[0].write_bytes(content)
+        paths[1].write_bytes(content)
+        paths[2].write_bytes(content[:50000] + bytes([content[50000] ^ 0xFF]) + content[50001:])
+        paths[3].write_bytes(content[:25000] + bytes([content[25000] ^ 0xFF]) + content[25001:])
+        
+        with patch('sys.argv', ['duplicate_finder.py', str(tmp_path), '--fast', '--sample-verify', '-o', 'json', '-q']):
+            with pytest.raises(SystemExit) as exc_info:
+                cli.main()
+        assert exc_info.value.code == 0
+        output = json.loads(capsys.readouterr().out)
+        assert [group["match_type"] for group in output["duplicate_files"]] == ['sampled_verified']
+        assert output["statistics"]["detection_method"] == "metadata_sampled"
+        assert len(output["unique_files"]) == 1
+        
+        with patch('sys.argv', ['duplicate_finder.py', str(tmp_path), '--sample-verify']):
+            with pytest.raises(SystemExit) as exc_info:
+                cli.main()
+        assert exc_info.value.code == 1
+    
+    def test_cli_fast_match(self, tmp_path, capsys):
+        """Test --fast-match parsing and its --fast requirement."""
+        import json
+        (tmp_path / "a").mkdir()
+        (tmp_path / "b").mkdir()
+        (tmp_path / "a" / "notes.txt").write_text("same words")
+        (tmp_path / "b" / "notes - Copy.txt").write_text("same words")
+        
+        with patch('sys.argv', ['duplicate_finder.py', str(tmp_path), '--fast', '--fast-match', 'name,normalized-name',
+                                '-o', 'json', '-q']):
+            with pytest.raises(SystemExit) as exc_info:
+                cli.main()
+        assert exc_info.value.code == 0
+        output = json.loads(capsys.readouterr().out)
+        assert [group["match_type"] for group in output["duplicate_files"]] == ['normalized_name']
+        
+        assert cli.parse_match_strategies("size-ext, size-mtime") == ["size-ext", "size-mtime"]
+        for text in ("checksum", ","):
+            with pytest.raises(cli.argparse.ArgumentTypeError):
+                cli.parse_match_strategies(text)
+        
+        with patch('sys.argv', ['duplicate_finder.py', str(tmp_path), '--fast-match', 'size-ext']):
+            with pytest.raises(SystemExit) as exc_info:
+                cli.main()
+        assert exc_info.value.code == 1
+
+
+class TestMediaProbe:
+    """Test header probing of photos and videos in fast mode."""
+    
+    @staticmethod
+    def _tiff(taken, model=b"Camera X", serial=b"SN123"):
+        """Little-endian TIFF with Model in IFD0 and DateTimeOriginal/serial in the Exif IFD."""
+        import struct
+        exif_offset = 8 + 2 + 2 * 12 + 4
+        data_offset = exif_offset + 2 + 2 * 12 + 4
+        values = bytearray()
+        
+        def ascii_entry(tag, value):
+            value += b"\0"
+            entry = struct.pack("<HHII", tag, 2, len(value), data_offset + len(values))
+            values.extend(value)
+            return entry
+        
+        ifd0 = struct.pack("<H", 2) + ascii_entry(0x0110, model) + struct.pack("<HHII", 0x8769, 4, 1, exif_offset) + b"\0" * 4
+        exif = struct.pack("<H", 2) + ascii_entry(0x9003, taken) + ascii_entry(0xA431, serial) + b"\0" * 4
+        return b"II*\0" + struct.pack("<I", 8) + ifd0 + exif + bytes(values)
+    
+    @classmethod
+    def _jpeg(cls, taken, pixels=b"\x00" * 500):
+        import struct
+        app1 = b"Exif\0\0" + cls._tiff(taken)
+        return b"\xff\xd8\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1 + b"\xff\xda" + pixels
+    
+    @staticmethod
+    def _box(box_type, payload):
+        import struct
+        return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+    
+    @classmethod
+    def _mp4(cls, created, duration, media_bytes=20000):
+        """Movie whose moov box lies past the probed head, as in non-faststart files."""
+        import struct
+        mvhd = b"\0\0\0\0" + struct.pack(">IIII", created, created, 1000, duration) + b"\0" * 80
+        return (cls._box(b"ftyp", b"isom\0\0\0\0") + cls._box(b"mdat", b"\0" * media_bytes)
+                + cls._box(b"moov", cls._box(b"mvhd", mvhd)))
+    
+    @classmethod
+    def _heic(cls, taken):
+        import struct
+        ftyp = cls._box(b"ftyp", b"heic\0\0\0\0mif1heic")
+        item = struct.pack(">I", 6) + b"Exif\0\0" + cls._tiff(taken)
+        iinf = cls._box(b"iinf", b"\0\0\0\0" + struct.pack(">H", 1)
+                        + cls._box(b"infe", b"\x02\0\0\0" + struct.pack(">HH", 1, 0) + b"Exif"))
+        
+        def meta(item_offset):
+            iloc = cls._box(b"iloc", b"\0\0\0\0" + bytes([0x44, 0x00]) + struct.pack(">HHHHII", 1, 1, 0, 1, item_offset, len(item)))
+            return cls._box(b"meta", b"\0\0\0\0" + iinf + iloc)
+        
+        # The item sits in mdat, right after the fixed-size ftyp and meta boxes
+        item_offset = len(ftyp) + len(meta(0)) + 8
+        return ftyp + meta(item_offset) + cls._box(b"mdat", item)
+    
+    def test_probe_formats(self, tmp_path):
+        """Test the fields read from JPEG, TIFF, HEIC and MP4 headers."""
+        shot = ('exif', "2023:07:01 12:00:00", None, "Camera X", "SN123")
+        samples = {
+            "a.jpg": self._jpeg(b"2023:07:01 12:00:00"),
+            "a.tif": self._tiff(b"2023:07:01 12:00:00"),
+            "a.heic": self._heic(b"2023:07:01 12:00:00"),
+            "a.mp4": self._mp4(1700000000, 90000),
+            "plain.jpg": b"\xff\xd8\xff\xda" + b"\0" * 100,
+            "notes.txt": b"just text",
+            "truncated.mp4": self._mp4(1700000000, 90000)[:40],
+        }
+        for name, data in samples.items():
+            (tmp_path / name).write_bytes(data)
+        
+        assert media_probe.probe_media(tmp_path / "a.jpg") == shot
+        assert media_probe.probe_media(tmp_path / "a.tif") == shot
+        assert media_probe.probe_media(tmp_path / "a.heic") == shot
+        assert media_probe.probe_media(tmp_path / "a.mp4") == ('mvhd', 1700000000, 1000, 90000)
+        for name in ("plain.jpg", "notes.txt", "truncated.mp4"):
+            assert media_probe.probe_media(tmp_path / name) is None
+    
+    def test_split_groups_by_media(self, tmp_path):
+        """Test that groups are split by probed fields and other files are not read."""
+        paths = {}
+        for directory in ("a", "b", "c"):
+            (tmp_path / directory).mkdir()
+        # Same name and size: a and b are one shot, c another
+        for directory, taken in (("a", b"2023:07:01 12:00:00"), ("b", b"2023:07:01 12:00:00"), ("c", b"2024:01:05 08:30:00")):
+            paths[directory] = tmp_path / directory / "IMG_0001.JPG"
+            paths[directory].write_bytes(self._jpeg(taken))
+        # Not media: kept as grouped, even though contents differ
+        for directory, text in (("a", b"one"), ("b", b"two")):
+            (tmp_path / directory / "notes.txt").write_bytes(text)
+        
+        files = fast_detector.scan_files_metadata(tmp_path)
+        groups, unique = fast_detector.find_metadata_duplicates(files)
+        assert sorted(len(g.files) for g in groups) == [2, 3]
+        
+        with patch('duplicate_finder.media_probe.probe_media', wraps=media_probe.probe_media) as probe:
+            split, split_unique = media_probe.split_groups_by_media(groups, quiet=True)
+        assert probe.call_count == 3
+        assert sorted((g.match_type, len(g.files)) for g in split) == [('category_match', 2), ('media_match', 2)]
+        media_group = next(g for g in split if g.match_type == 'media_match')
+        assert sorted(f.path.parent.name for f in media_group.files) == ["a", "b"]
+        assert [f.path.parent.name for f in split_unique] == ["c"]
+    
+    def test_cli_probe_media(self, tmp_path, capsys):
+        """Test --fast --probe-media end to end, and that it requires --fast."""
+        import json
+        for directory, created in (("a", 1700000000), ("b", 1700000000), ("c", 1700009999)):
+            (tmp_path / directory).mkdir()
+            (tmp_path / directory / "clip.mp4").write_bytes(self._mp4(created, 90000))
+        
+        with patch('sys.argv', ['duplicate_finder.py', str(tmp_path), '--fast', '--probe-media', '-o', 'json', '-q']):
+            with pytest.raises(SystemExit) as exc_info:
+                cli.main()
+        assert exc_info.value.code == 0
+        output = json.loads(capsys.readouterr().out)
+        assert [(group["match_type"], group["count"]) for group in output["duplicate_files"]] == [('media_match', 2)]
+        assert output["statistics"]["detection_method"] == "metadata_media"
+        assert len(output["unique_files"]) == 1
+        
+        with patch('sys.argv', ['duplicate_finder.py', str(tmp_path), '--probe-media']):
+            with pytest.raises(SystemExit) as exc_info:
+                cli.main()
+        assert exc_info.value.code == 1